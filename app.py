@@ -1,10 +1,22 @@
 import os
+import csv
+import io
+import json
+import atexit
 import logging
 import requests
 from datetime import datetime
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
 from scheduler import CronScheduler
+from async_engine import AsyncCronScheduler
+from http_pool import KeepAliveAdapter
+from host_limits import HostLimiter, parse_host_limits
+from circuit_breaker import CircuitBreaker
 from job_manager import JobManager
+from retry_policy import RetryPolicy
+from job_import import InvalidJobsError, available_formats, dump_jobs, format_for_filename, parse_document, validate_jobs
+from sqlite_store import SQLiteJobManager
+from postgres_store import PostgresJobManager
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -14,8 +26,69 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 
 # Initialize job manager and scheduler
-job_manager = JobManager()
-scheduler = CronScheduler(job_manager)
+# JOB_STORE selects the storage backend: 'json' (default), 'sqlite' or 'postgres'
+# HISTORY_RETENTION_DAYS bounds raw history; rollups are kept for months
+history_retention_days = int(os.environ.get('HISTORY_RETENTION_DAYS', '30'))
+job_store = os.environ.get('JOB_STORE', 'json').lower()
+if job_store == 'sqlite':
+    job_manager = SQLiteJobManager(
+        os.environ.get('JOB_STORE_PATH', 'data/jobs.db'),
+        history_retention_days=history_retention_days
+    )
+elif job_store == 'postgres':
+    job_manager = PostgresJobManager(
+        os.environ.get('DATABASE_URL'),
+        pool_size=int(os.environ.get('JOB_STORE_POOL_SIZE', '10')),
+        history_retention_days=history_retention_days
+    )
+else:
+    job_manager = JobManager(history_retention_days=history_retention_days)
+
+# Flush buffered execution records when the process exits
+atexit.register(job_manager.close)
+# Jobs share keep-alive connections, pooled per host:
+# HTTP_POOL_HOSTS hosts are kept with up to HTTP_POOL_MAXSIZE idle connections each;
+# connections idle for HTTP_POOL_IDLE_TIMEOUT seconds or open for HTTP_POOL_MAX_AGE seconds are reopened
+max_workers = int(os.environ.get('SCHEDULER_MAX_WORKERS', '20'))
+http_pool = KeepAliveAdapter(
+    pool_hosts=int(os.environ.get('HTTP_POOL_HOSTS', '100')),
+    pool_maxsize=int(os.environ.get('HTTP_POOL_MAXSIZE', str(max_workers))),
+    idle_timeout=float(os.environ.get('HTTP_POOL_IDLE_TIMEOUT', '55')),
+    max_age=float(os.environ.get('HTTP_POOL_MAX_AGE', '600'))
+)
+# Scheduled runs against one host are limited to HOST_MAX_CONCURRENCY at once and
+# HOST_RATE_LIMIT per second (bursts of HOST_RATE_BURST); 0 means no limit.
+# HOST_LIMITS overrides them per host or '.domain' group: 'api.example.com=2:0.5,.example.org=4'
+host_limiter = HostLimiter(
+    max_concurrency=int(os.environ.get('HOST_MAX_CONCURRENCY', '0')),
+    rate=float(os.environ.get('HOST_RATE_LIMIT', '0')),
+    burst=float(os.environ.get('HOST_RATE_BURST', '0')) or None,
+    overrides=parse_host_limits(os.environ.get('HOST_LIMITS', ''))
+)
+# Runs against a host are short-circuited for CIRCUIT_OPEN_SECONDS once CIRCUIT_FAILURE_RATE
+# of its last CIRCUIT_WINDOW requests (at least CIRCUIT_MIN_CALLS) failed or took
+# CIRCUIT_SLOW_CALL_SECONDS or longer; a CIRCUIT_FAILURE_RATE of 0 disables the breaker
+circuit_breaker = CircuitBreaker(
+    failure_rate=float(os.environ.get('CIRCUIT_FAILURE_RATE', '0.5')),
+    min_calls=int(os.environ.get('CIRCUIT_MIN_CALLS', '5')),
+    window=int(os.environ.get('CIRCUIT_WINDOW', '20')),
+    slow_call_seconds=float(os.environ.get('CIRCUIT_SLOW_CALL_SECONDS', '20')),
+    open_seconds=float(os.environ.get('CIRCUIT_OPEN_SECONDS', '60'))
+)
+# SCHEDULER_ENGINE selects how jobs run: 'thread' (default) or 'asyncio' (needs aiohttp)
+# SCHEDULER_MAX_WORKERS sizes the thread pool that runs jobs in thread mode
+# SCHEDULER_MAX_IN_FLIGHT caps concurrent HTTP requests in asyncio mode
+if os.environ.get('SCHEDULER_ENGINE', 'thread').lower() == 'asyncio':
+    scheduler = AsyncCronScheduler(
+        job_manager,
+        max_in_flight=int(os.environ.get('SCHEDULER_MAX_IN_FLIGHT', '1000')),
+        http_pool=http_pool,
+        host_limiter=host_limiter,
+        circuit_breaker=circuit_breaker
+    )
+else:
+    scheduler = CronScheduler(job_manager, max_workers=max_workers, http_pool=http_pool, host_limiter=host_limiter,
+                              circuit_breaker=circuit_breaker)
 
 # Template filter for date formatting
 @app.template_filter('format_datetime')
@@ -36,61 +109,90 @@ def index():
     jobs = job_manager.get_all_jobs()
     running_jobs = scheduler.get_running_jobs()
     
-    # Add running status to jobs
-    for job in jobs:
-        job['is_running'] = job['id'] in running_jobs
+    stats = job_manager.get_all_job_stats()
+    # Served from the revision cache, so this stays one lookup per job
+    revisions = job_manager.get_revisions(job.revision_id for job in jobs)
     
-    return render_template('index.html', jobs=jobs)
+    return render_template('index.html', jobs=jobs, stats=stats, running_jobs=set(running_jobs),
+                           revisions=revisions, circuits=circuit_breaker.metrics())
+
+def parse_job_form(form, retry_policy=None):
+    """Read the add/edit job form; returns (fields, error message or None)
+    
+    The form only edits the main retry settings; the rest of
+    ``retry_policy`` (the job's current policy, when editing) is kept.
+    """
+    name = form.get('name', '').strip()
+    url = form.get('url', '').strip()
+    cron_expression = form.get('cron_expression', '').strip()
+    method = form.get('method', 'GET')
+    headers = form.get('headers', '')
+    payload = form.get('payload', '')
+    
+    # Validate inputs
+    if not name or not url or not cron_expression:
+        return None, 'Name, URL, and cron expression are required'
+    
+    # Validate URL
+    if not (url.startswith('http://') or url.startswith('https://')):
+        return None, 'URL must start with http:// or https://'
+    
+    # Parse headers if provided
+    parsed_headers = {}
+    if headers:
+        try:
+            for line in headers.split('\n'):
+                if ':' in line:
+                    key, value = line.split(':', 1)
+                    parsed_headers[key.strip()] = value.strip()
+        except Exception:
+            return None, 'Invalid headers format. Use "Key: Value" format, one per line'
+    
+    # One attempt means no retries
+    max_attempts = form.get('retry_max_attempts', '').strip()
+    if max_attempts and max_attempts != '1':
+        try:
+            policy = dict(retry_policy or {}, max_attempts=int(max_attempts))
+            backoff = form.get('retry_backoff', '').strip()
+            if backoff:
+                policy['backoff'] = float(backoff)
+            statuses = form.get('retry_statuses', '').strip()
+            if statuses:
+                policy['retry_statuses'] = [int(status) for status in statuses.replace(',', ' ').split()]
+            retry_policy = RetryPolicy.from_dict(policy).to_dict()
+        except ValueError as e:
+            return None, f'Invalid retry settings: {e}'
+    else:
+        retry_policy = None
+    
+    return {
+        'name': name,
+        'url': url,
+        'cron_expression': cron_expression,
+        'method': method,
+        'headers': parsed_headers,
+        'payload': payload if payload else None,
+        'retry_policy': retry_policy
+    }, None
 
 @app.route('/add_job', methods=['GET', 'POST'])
 def add_job():
     """Add a new cron job"""
     if request.method == 'POST':
         try:
-            name = request.form.get('name', '').strip()
-            url = request.form.get('url', '').strip()
-            cron_expression = request.form.get('cron_expression', '').strip()
-            method = request.form.get('method', 'GET')
-            headers = request.form.get('headers', '')
-            payload = request.form.get('payload', '')
-            
-            # Validate inputs
-            if not name or not url or not cron_expression:
-                flash('Name, URL, and cron expression are required', 'error')
+            fields, error = parse_job_form(request.form)
+            if error:
+                flash(error, 'error')
                 return render_template('add_job.html')
             
-            # Validate URL
-            if not (url.startswith('http://') or url.startswith('https://')):
-                flash('URL must start with http:// or https://', 'error')
-                return render_template('add_job.html')
-            
-            # Parse headers if provided
-            parsed_headers = {}
-            if headers:
-                try:
-                    for line in headers.split('\n'):
-                        if ':' in line:
-                            key, value = line.split(':', 1)
-                            parsed_headers[key.strip()] = value.strip()
-                except Exception:
-                    flash('Invalid headers format. Use "Key: Value" format, one per line', 'error')
-                    return render_template('add_job.html')
-            
             # Create job
-            job_id = job_manager.add_job(
-                name=name,
-                url=url,
-                cron_expression=cron_expression,
-                method=method,
-                headers=parsed_headers,
-                payload=payload if payload else None
-            )
+            job_id = job_manager.add_job(**fields)
             
             # Schedule the job
             if scheduler.schedule_job(job_id):
-                flash(f'Job "{name}" added and scheduled successfully', 'success')
+                flash(f'Job "{fields["name"]}" added and scheduled successfully', 'success')
             else:
-                flash(f'Job "{name}" added but failed to schedule. Check cron expression.', 'warning')
+                flash(f'Job "{fields["name"]}" added but failed to schedule. Check cron expression.', 'warning')
             
             return redirect(url_for('index'))
             
@@ -100,19 +202,131 @@ def add_job():
     
     return render_template('add_job.html')
 
+@app.route('/edit_job/<job_id>', methods=['GET', 'POST'])
+def edit_job(job_id):
+    """Edit a job's configuration; each saved change becomes a new revision"""
+    job = job_manager.get_job(job_id)
+    if not job:
+        flash('Job not found', 'error')
+        return redirect(url_for('index'))
+    
+    if request.method == 'POST':
+        try:
+            fields, error = parse_job_form(request.form, job.retry_policy)
+            if error:
+                flash(error, 'error')
+            else:
+                # Hold the job's lock so the scheduler is updated in step with the store
+                with job_manager.job_lock(job_id):
+                    updated = job_manager.update_job(job_id, **fields)
+                    if updated is None:
+                        flash('Job not found', 'error')
+                    elif updated.revision_id == job.revision_id:
+                        flash(f'No changes to job "{updated.name}"', 'info')
+                    elif updated.active and not scheduler.schedule_job(job_id):
+                        flash(f'Job "{updated.name}" saved but failed to schedule. Check cron expression.', 'warning')
+                    else:
+                        flash(f'Job "{updated.name}" saved', 'success')
+                return redirect(url_for('index'))
+        except Exception as e:
+            flash(f'Error updating job: {str(e)}', 'error')
+            logging.error(f"Error updating job {job_id}: {e}")
+    
+    return render_template('add_job.html', job=job, revisions=job_manager.compare_revisions(job_id))
+
+@app.route('/api/jobs/<job_id>/revisions')
+def job_revisions(job_id):
+    """A job's revisions, newest first, each with the stats of the executions that ran it"""
+    if not job_manager.get_job(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job_id': job_id, 'revisions': job_manager.compare_revisions(job_id)})
+
+def import_jobs_document(text, fmt):
+    """Validate every job in an import document, store them in one transaction and schedule them in one batch
+
+    Returns (jobs, ids that failed to schedule); raises ValueError before
+    anything is written if any job is invalid.
+    """
+    specs = validate_jobs(parse_document(text, fmt))
+    jobs = job_manager.add_jobs(specs)
+    failed = scheduler.schedule_jobs([job for job in jobs if job.active])
+    return jobs, failed
+
+@app.route('/import_jobs', methods=['GET', 'POST'])
+def import_jobs():
+    """Import jobs from an uploaded JSON or YAML file"""
+    formats = available_formats()
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a JSON or YAML file to import', 'error')
+            return render_template('import_jobs.html', formats=formats)
+        try:
+            text = upload.read().decode('utf-8')
+            jobs, failed = import_jobs_document(text, format_for_filename(upload.filename))
+        except InvalidJobsError as e:
+            flash(f'Nothing was imported: {len(e.errors)} problem(s) found', 'error')
+            return render_template('import_jobs.html', formats=formats, errors=e.errors)
+        except (ValueError, UnicodeDecodeError) as e:
+            flash(f'Nothing was imported: {str(e)}', 'error')
+            return render_template('import_jobs.html', formats=formats)
+        except Exception as e:
+            flash(f'Error importing jobs: {str(e)}', 'error')
+            logging.error(f"Error importing jobs: {e}")
+            return render_template('import_jobs.html', formats=formats)
+        
+        if failed:
+            flash(f'Imported {len(jobs)} jobs but {len(failed)} failed to schedule', 'warning')
+        else:
+            flash(f'Imported and scheduled {len(jobs)} jobs', 'success')
+        return redirect(url_for('index'))
+    
+    return render_template('import_jobs.html', formats=formats)
+
+@app.route('/export_jobs')
+def export_jobs():
+    """Download every job definition as JSON or YAML, in the format /import_jobs accepts"""
+    export_format = request.args.get('format', 'json').lower()
+    try:
+        body = dump_jobs(job_manager.get_all_jobs(), export_format)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return app.response_class(
+        body,
+        mimetype='application/yaml' if export_format == 'yaml' else 'application/json',
+        headers={'Content-Disposition': f'attachment; filename=jobs.{export_format}'}
+    )
+
+@app.route('/api/jobs/import', methods=['POST'])
+def api_import_jobs():
+    """Import jobs from a JSON or YAML request body; all of them are stored or none are"""
+    is_yaml = 'yaml' in (request.content_type or '') or request.args.get('format') == 'yaml'
+    try:
+        jobs, failed = import_jobs_document(request.get_data(as_text=True), 'yaml' if is_yaml else 'json')
+    except InvalidJobsError as e:
+        return jsonify({'error': 'Nothing was imported', 'errors': e.errors}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'imported': len(jobs),
+        'job_ids': [job.id for job in jobs],
+        'schedule_failed': failed
+    }), 201
+
 @app.route('/delete_job/<job_id>')
 def delete_job(job_id):
     """Delete a job"""
     try:
-        job = job_manager.get_job(job_id)
-        if job:
-            # Remove from scheduler
-            scheduler.remove_job(job_id)
-            # Delete from job manager
-            job_manager.delete_job(job_id)
-            flash(f'Job "{job["name"]}" deleted successfully', 'success')
-        else:
-            flash('Job not found', 'error')
+        with job_manager.job_lock(job_id):
+            job = job_manager.get_job(job_id)
+            if job:
+                # Remove from scheduler
+                scheduler.remove_job(job_id)
+                # Delete from job manager
+                job_manager.delete_job(job_id)
+                flash(f'Job "{job.name}" deleted successfully', 'success')
+            else:
+                flash('Job not found', 'error')
     except Exception as e:
         flash(f'Error deleting job: {str(e)}', 'error')
         logging.error(f"Error deleting job {job_id}: {e}")
@@ -123,21 +337,24 @@ def delete_job(job_id):
 def toggle_job(job_id):
     """Toggle job active status"""
     try:
-        job = job_manager.get_job(job_id)
-        if job:
-            new_status = not job.get('active', True)
-            job_manager.update_job_status(job_id, new_status)
-            
-            if new_status:
-                if scheduler.schedule_job(job_id):
-                    flash(f'Job "{job["name"]}" activated', 'success')
+        # Hold the job's lock so concurrent toggles can't both flip the same
+        # old status or leave the scheduler out of step with the store
+        with job_manager.job_lock(job_id):
+            job = job_manager.get_job(job_id)
+            if job:
+                new_status = not job.active
+                job_manager.update_job_status(job_id, new_status)
+                
+                if new_status:
+                    if scheduler.schedule_job(job_id):
+                        flash(f'Job "{job.name}" activated', 'success')
+                    else:
+                        flash(f'Job "{job.name}" activated but scheduling failed', 'warning')
                 else:
-                    flash(f'Job "{job["name"]}" activated but scheduling failed', 'warning')
+                    scheduler.remove_job(job_id)
+                    flash(f'Job "{job.name}" deactivated', 'info')
             else:
-                scheduler.remove_job(job_id)
-                flash(f'Job "{job["name"]}" deactivated', 'info')
-        else:
-            flash('Job not found', 'error')
+                flash('Job not found', 'error')
     except Exception as e:
         flash(f'Error toggling job: {str(e)}', 'error')
         logging.error(f"Error toggling job {job_id}: {e}")
@@ -162,17 +379,48 @@ def run_job_now(job_id):
 @app.route('/job_history')
 def job_history():
     """Display job execution history"""
-    history = job_manager.get_job_history()
-    jobs = job_manager.get_all_jobs()
+    filters = {
+        key: request.args.get(key, '').strip()
+        for key in ('job_id', 'status', 'since', 'until')
+        if request.args.get(key, '').strip()
+    }
+    
+    try:
+        page = job_manager.query_history(
+            job_id=filters.get('job_id'),
+            success={'success': True, 'failed': False}.get(filters.get('status')),
+            since=filters.get('since'),
+            until=filters.get('until'),
+            limit=request.args.get('limit', 100, type=int),
+            cursor=request.args.get('cursor')
+        )
+    except ValueError:
+        flash('Invalid history page link', 'error')
+        return redirect(url_for('job_history', **filters))
     
-    # Create job lookup for names
-    job_lookup = {job['id']: job['name'] for job in jobs}
+    history = page['records']
     
-    # Add job names to history
-    for entry in history:
-        entry['job_name'] = job_lookup.get(entry['job_id'], 'Unknown Job')
+    # Look up names only for the jobs on this page
+    job_names = job_manager.get_job_names(entry.job_id for entry in history)
+    revisions = job_manager.get_revisions(entry.revision_id for entry in history)
     
-    return render_template('job_history.html', history=history)
+    return render_template(
+        'job_history.html',
+        history=history,
+        job_names=job_names,
+        revisions=revisions,
+        filters=filters,
+        next_cursor=page['next_cursor'],
+        prev_cursor=page['prev_cursor']
+    )
+
+@app.route('/history/response/<response_hash>')
+def history_response(response_hash):
+    """Serve a stored response body on demand"""
+    content = job_manager.get_response_content(response_hash)
+    if content is None:
+        return jsonify({'error': 'Response not found'}), 404
+    return app.response_class(content, mimetype='text/plain')
 
 @app.route('/clear_history')
 def clear_history():
@@ -186,6 +434,95 @@ def clear_history():
     
     return redirect(url_for('job_history'))
 
+@app.route('/api/metrics/storage')
+def storage_metrics():
+    """Write-behind queue depth and flush latency"""
+    return jsonify(job_manager.get_write_metrics())
+
+@app.route('/api/metrics/connections')
+def connection_metrics():
+    """Keep-alive connection reuse per host"""
+    return jsonify(http_pool.pool_stats())
+
+@app.route('/api/metrics/hosts')
+def host_metrics():
+    """Per-host limits, queued runs and how long runs waited to start"""
+    return jsonify(host_limiter.metrics())
+
+@app.route('/api/metrics/circuits')
+def circuit_metrics():
+    """Circuit breaker state and recent failure rates per host"""
+    return jsonify(circuit_breaker.metrics())
+
+# Columns of /api/history/export, in CSV order
+EXPORT_FIELDS = ('id', 'job_id', 'job_name', 'revision_id', 'attempt', 'retry_of', 'timestamp', 'status_code',
+                 'execution_time', 'success', 'short_circuited', 'error_message', 'response_hash', 'response_size')
+
+def export_ndjson(records, job_names):
+    for record in records:
+        row = record.to_dict()
+        row.pop('response_content', None)
+        row['job_name'] = job_names.get(record.job_id)
+        yield json.dumps(row, separators=(',', ':')) + '\n'
+
+def export_csv(records, job_names):
+    # One reusable buffer, emptied after every row
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for record in records:
+        writer.writerow([
+            job_names.get(record.job_id, '') if field == 'job_name' else getattr(record, field)
+            for field in EXPORT_FIELDS
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+@app.route('/api/history/export')
+def export_history():
+    """Stream history as NDJSON or CSV, most recent first, filtered like the history page"""
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': "format must be 'ndjson' or 'csv'"}), 400
+    status = request.args.get('status', '').strip()
+    if status and status not in ('success', 'failed'):
+        return jsonify({'error': "status must be 'success' or 'failed'"}), 400
+    
+    records = job_manager.iter_history(
+        job_id=request.args.get('job_id', '').strip() or None,
+        success={'success': True, 'failed': False}.get(status),
+        since=request.args.get('since', '').strip() or None,
+        until=request.args.get('until', '').strip() or None
+    )
+    job_names = {job.id: job.name for job in job_manager.get_all_jobs()}
+    
+    if export_format == 'csv':
+        body, mimetype = export_csv(records, job_names), 'text/csv'
+    else:
+        body, mimetype = export_ndjson(records, job_names), 'application/x-ndjson'
+    return app.response_class(
+        body,
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=job_history.{export_format}'}
+    )
+
+@app.route('/api/jobs/<job_id>/rollups')
+def job_rollups(job_id):
+    """Minute, hour or day reliability rollups for a job"""
+    granularity = request.args.get('granularity', 'hour')
+    try:
+        rollups = job_manager.get_job_rollups(
+            job_id,
+            granularity=granularity,
+            since=request.args.get('since'),
+            until=request.args.get('until')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'job_id': job_id, 'granularity': granularity, 'rollups': rollups})
+
 @app.route('/webhook/earnings', methods=['POST'])
 def webhook_earnings():
     """Secure webhook endpoint for triggering the daily earnings job"""
@@ -201,7 +538,7 @@ def webhook_earnings():
         jobs = job_manager.get_all_jobs()
         earnings_job = None
         for job in jobs:
-            if 'earnings' in job['name'].lower() or 'dailybred' in job['name'].lower():
+            if 'earnings' in job.name.lower() or 'dailybred' in job.name.lower():
                 earnings_job = job
                 break
         
@@ -209,20 +546,20 @@ def webhook_earnings():
             return jsonify({'error': 'Earnings job not found'}), 404
         
         # Execute the earnings job
-        result = scheduler.run_job_now(earnings_job['id'])
+        result = scheduler.run_job_now(earnings_job.id)
         
         if result:
             return jsonify({
                 'success': True,
                 'message': 'Daily earnings job executed successfully',
-                'job_name': earnings_job['name'],
+                'job_name': earnings_job.name,
                 'timestamp': datetime.now().isoformat()
             })
         else:
             return jsonify({
                 'success': False,
                 'message': 'Failed to execute earnings job',
-                'job_name': earnings_job['name']
+                'job_name': earnings_job.name
             }), 500
             
     except Exception as e:
@@ -272,8 +609,8 @@ if __name__ == '__main__':
     # Load and schedule existing jobs
     jobs = job_manager.get_all_jobs()
     for job in jobs:
-        if job.get('active', True):
-            scheduler.schedule_job(job['id'])
+        if job.active:
+            scheduler.schedule_job(job.id)
     
     try:
         app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,292 @@
+import asyncio
+import functools
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from scheduler import REQUEST_TIMEOUT, CronScheduler, FireTimeExecutorMixin
+from http_pool import KeepAliveAdapter
+from host_limits import HostLimiter
+from circuit_breaker import CircuitBreaker
+
+try:
+    import aiohttp
+except ImportError:
+    # The asyncio engine is only available when aiohttp is installed
+    aiohttp = None
+
+# Executions allowed to wait on HTTP at once; beyond this, firings queue on the event loop
+DEFAULT_MAX_IN_FLIGHT = 1000
+# Threads for job store calls (get_job, claim_run, record_execution), which block
+DEFAULT_STORE_WORKERS = 8
+# Seconds shutdown waits for in-flight executions to finish
+SHUTDOWN_GRACE_SECONDS = 10
+
+
+class FireTimeAsyncIOExecutor(FireTimeExecutorMixin, AsyncIOExecutor):
+    pass
+
+
+class AsyncCronScheduler(CronScheduler):
+    """CronScheduler that runs executions as coroutines on one event loop in a dedicated thread
+
+    APScheduler's AsyncIOScheduler fires jobs on the loop and each HTTP call
+    is made with aiohttp, so an execution waiting on a slow endpoint costs
+    a coroutine rather than a thread. Up to ``max_in_flight`` executions
+    wait on HTTP at once. Job store calls still block, so they run on a
+    small pool of ``store_workers`` threads. Scheduling, removal and
+    ``run_job_now`` are safe to call from any thread.
+    """
+
+    def __init__(self, job_manager, max_in_flight=DEFAULT_MAX_IN_FLIGHT, store_workers=DEFAULT_STORE_WORKERS,
+                 http_pool=None, host_limiter=None, circuit_breaker=None):
+        if aiohttp is None:
+            raise RuntimeError("The asyncio scheduler engine needs aiohttp installed")
+        self.job_manager = job_manager
+        self.max_in_flight = max_in_flight
+        # Used by runs handed to the threaded implementation; its idle
+        # timeout also applies to the aiohttp connections
+        self.http_pool = http_pool or KeepAliveAdapter(pool_maxsize=store_workers)
+        self.limiter = host_limiter or HostLimiter()
+        self.breaker = circuit_breaker or CircuitBreaker()
+        self.logger = logging.getLogger(__name__)
+
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(ThreadPoolExecutor(store_workers, thread_name_prefix='job-store'))
+        self._thread = threading.Thread(target=self._run_loop, name='async-engine', daemon=True)
+        self._session = None
+        self._in_flight = None
+        self._tasks = set()
+        # Dispatches waiting on a host's limits, by job id, so remove_job can drop them
+        self._waiting = {}
+
+        self.scheduler = AsyncIOScheduler(
+            event_loop=self._loop,
+            executors={'default': FireTimeAsyncIOExecutor()},
+            job_defaults={'coalesce': False, 'max_instances': 3}
+        )
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _call(self, coro, timeout=None):
+        """Run a coroutine on the engine's loop from another thread and return its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    async def _open(self):
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=self.http_pool.idle_timeout),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        )
+
+    async def _stop(self):
+        # Stop firing, let in-flight executions finish, then shut down: the
+        # scheduler's executor cancels whatever is still pending at shutdown
+        if self.scheduler.running:
+            self.scheduler.pause()
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=SHUTDOWN_GRACE_SECONDS)
+        super().shutdown()
+        if self._session:
+            await self._session.close()
+
+    def start(self):
+        """Start the event loop thread, then the scheduler on it"""
+        if not self._thread.is_alive():
+            self._thread.start()
+            self._call(self._open())
+        super().start()
+
+    def shutdown(self):
+        """Let in-flight executions finish, stop the scheduler and stop the event loop"""
+        if not self._thread.is_alive():
+            return super().shutdown()
+        try:
+            self._call(self._stop(), timeout=SHUTDOWN_GRACE_SECONDS + 5)
+        except Exception as e:
+            self.logger.error(f"Failed to stop the async engine cleanly: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    def run_job_now(self, job_id):
+        """Execute a job immediately on the engine's loop and wait for the result"""
+        try:
+            return self._call(self._execute_job_async(job_id), timeout=REQUEST_TIMEOUT + 30)
+        except Exception as e:
+            self.logger.error(f"Failed to run job {job_id} immediately: {e}")
+            return False
+
+    def submit(self, job_id):
+        """Start an execution on the loop without waiting for it; returns a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(self._execute_job_async(job_id), self._loop)
+
+    def _cancel_queued(self, job_id):
+        """Drop a job's runs still waiting on a host's limits; cancelled waits pass their slots on"""
+        self.limiter.cancel(job_id)
+        if self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._cancel_waiting, job_id)
+
+    def _cancel_waiting(self, job_id):
+        # Each cancelled dispatch takes itself out of _waiting
+        tasks = list(self._waiting.get(job_id, ()))
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            self.logger.info(f"Dropped {len(tasks)} queued runs of job {job_id}")
+
+    def _stop_waiting(self, job_id, task):
+        tasks = self._waiting.get(job_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._waiting[job_id]
+
+    async def _in_store(self, fn, *args, **kwargs):
+        """Run a blocking job store call on the store threads"""
+        return await self._loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+    async def _run_scheduled_job(self, job_id, fire_time=None):
+        """Run a cron firing unless another process sharing the job store already claimed it"""
+        key = self._claim_key(fire_time)
+        if not await self._in_store(self.job_manager.claim_run, job_id, key):
+            self.logger.debug(f"Job {job_id} firing at {key} already claimed by another process")
+            return False
+        return await self._dispatch(job_id)
+
+    async def _dispatch(self, job_id, attempt=1, retry_of=None):
+        """Wait on the loop until the job's host has capacity, then execute a firing or retry"""
+        queued_at = time.monotonic()
+        job = await self._in_store(self._pending_job, job_id)
+        if not job:
+            return False
+        host = urlparse(job.url).hostname
+        if not host:
+            return await self._execute_job_async(job_id, attempt, retry_of)
+        if not self.breaker.allow(host):
+            return await self._in_store(self._short_circuit, job_id, host, attempt, retry_of)
+
+        slot = self._loop.create_future()
+        delay = self.limiter.acquire(
+            host, lambda delay: self._loop.call_soon_threadsafe(self._hand_over, slot, host, delay), owner=job_id
+        )
+        queued = delay is None
+        task = asyncio.current_task()
+        self._waiting.setdefault(job_id, set()).add(task)
+        try:
+            if queued:
+                delay = await slot
+            if delay:
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            # Dropped while waiting. A run still queued holds no slot: one
+            # handed to it meanwhile is passed on by _hand_over
+            if not queued or not slot.cancelled():
+                self.limiter.release(host)
+            return False
+        finally:
+            self._stop_waiting(job_id, task)
+        try:
+            self.limiter.record_wait(host, time.monotonic() - queued_at)
+            if (delay or queued) and not await self._in_store(self._pending_job, job_id):
+                return False
+            return await self._execute_job_async(job_id, attempt, retry_of)
+        finally:
+            self.limiter.release(host)
+
+    def _hand_over(self, slot, host, delay):
+        # A run cancelled while queued passes the slot it was handed straight on
+        if slot.cancelled():
+            self.limiter.release(host)
+        else:
+            slot.set_result(delay)
+
+    async def _execute_job_async(self, job_id, attempt=1, retry_of=None):
+        """Execute a job with aiohttp and record the outcome"""
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            return await self._execute(job_id, attempt, retry_of)
+        finally:
+            self._tasks.discard(task)
+
+    @staticmethod
+    def _error_kind(error):
+        """Classify an aiohttp exception as one of retry_policy.ERROR_KINDS"""
+        if isinstance(error, asyncio.TimeoutError):
+            return 'timeout'
+        if isinstance(error, aiohttp.ClientConnectionError):
+            return 'connection'
+        return 'request'
+
+    async def _execute(self, job_id, attempt, retry_of):
+        start_time = datetime.now()
+        job, revision_id = None, None
+        status_code, text, error_message, error_kind = None, None, None, None
+
+        try:
+            job = await self._in_store(self.job_manager.get_job, job_id)
+            if not job:
+                self.logger.error(f"Job {job_id} not found during execution")
+                return False
+            revision_id = job.revision_id
+
+            self.logger.info(f"Executing job {job_id}: {job.name}")
+            method, url, request_kwargs = self._prepare_request(job)
+
+            async with self._in_flight:
+                async with self._session.request(method, url, **request_kwargs) as response:
+                    status_code = response.status
+                    text = await response.text(errors='replace')
+
+            if method == 'GET' and 'aes.js' in text and '__test=' in text:
+                # The anti-bot cookie dance needs the requests session logic; hand
+                # this run to the blocking implementation, which records it itself
+                self.logger.info(f"Job {job_id} hit anti-bot protection, retrying on a store thread")
+                return await self._in_store(self._execute_job, job_id, attempt, retry_of)
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error_message = f"Request failed: {str(e) or type(e).__name__}"
+            error_kind = self._error_kind(e)
+            self.logger.error(f"Job {job_id} failed: {error_message}")
+        except Exception as e:
+            error_message = f"Unexpected error: {str(e)}"
+            self.logger.error(f"Job {job_id} failed with unexpected error: {error_message}")
+
+        execution_time = (datetime.now() - start_time).total_seconds()
+        success = status_code is not None and 200 <= status_code < 400
+        if job:
+            # Unexpected errors count as failures too: a half-open circuit waits on its probes
+            self._record_outcome(job, execution_time, status_code)
+        if status_code is not None:
+            if success:
+                self.logger.info(f"Job {job_id} executed successfully. Status: {status_code}, Time: {execution_time:.2f}s")
+            else:
+                self.logger.warning(f"Job {job_id} returned status {status_code}. Time: {execution_time:.2f}s")
+                error_message = f"HTTP {status_code}: {text[:200]}"
+
+        try:
+            record_id = await self._in_store(
+                self.job_manager.record_execution,
+                job_id=job_id,
+                status_code=status_code,
+                execution_time=execution_time,
+                success=success,
+                error_message=error_message,
+                response_content=text if success else None,
+                revision_id=revision_id,
+                attempt=attempt,
+                retry_of=retry_of
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to record execution of job {job_id}: {e}")
+            return success
+        # Unexpected errors (neither a status nor a request error) are never retried
+        if not success and (status_code is not None or error_kind):
+            self._schedule_retry(job, attempt, retry_of or record_id, status_code, error_kind)
+        return success
@@ -0,0 +1,61 @@
+import json
+import os
+import stat
+import tempfile
+
+# The process umask, read once: changing it to read it isn't thread-safe
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def fsync_dir(path):
+    """Flush a directory entry so a rename inside it survives a crash"""
+    try:
+        fd = os.open(path or '.', os.O_RDONLY)
+    except OSError:
+        # Directories can't be opened on some platforms (e.g. Windows)
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, data):
+    """Replace a file with data (bytes or str) so readers see either the old or the new content
+
+    The data goes to a temporary file in the same directory, is fsynced,
+    and is then renamed over the target; a crash at any point leaves the
+    previous file intact. The new file keeps the permissions of the one it
+    replaces, or gets the usual umask-based ones if there was none.
+    """
+    directory = os.path.dirname(path) or '.'
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    try:
+        permissions = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        permissions = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        # mkstemp creates the file readable by its owner only
+        if hasattr(os, 'fchmod'):
+            os.fchmod(fd, permissions)
+        with os.fdopen(fd, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    fsync_dir(directory)
+
+
+def atomic_write_json(path, obj, **kwargs):
+    """Atomically replace a file with obj serialized as JSON"""
+    atomic_write(path, json.dumps(obj, default=str, **kwargs))
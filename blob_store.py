@@ -0,0 +1,129 @@
+import hashlib
+import os
+import re
+import time
+import zlib
+import logging
+from atomic_file import atomic_write
+
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Bodies younger than this are never swept, so a body stored just before its
+# history row is committed can't be collected in between
+SWEEP_GRACE_SECONDS = 600
+
+BLOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS response_blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class FileBlobStore:
+    """Content-addressed, zlib-compressed response bodies stored as files
+
+    Bodies are keyed by the SHA-256 of their UTF-8 bytes, so identical
+    responses are stored once no matter how many history rows refer to
+    them. Files live at ``<root>/<first two hex chars>/<hash>.z``.
+    """
+
+    def __init__(self, root='data/blobs'):
+        self.root = root
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest + '.z')
+
+    def put(self, content):
+        """Store a body and return (hash, size in bytes)"""
+        data = content.encode('utf-8')
+        digest = content_hash(data)
+        path = self._path(digest)
+        try:
+            # Refresh the mtime so a body that is referenced again survives the sweep grace period
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, zlib.compress(data))
+        return digest, len(data)
+
+    def get(self, digest):
+        """Return a stored body, or None if it is unknown"""
+        if not HASH_RE.match(digest or ''):
+            return None
+        try:
+            with open(self._path(digest), 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8')
+        except FileNotFoundError:
+            return None
+
+    def sweep(self, live_hashes):
+        """Delete bodies no longer referenced by any history row"""
+        removed = 0
+        threshold = time.time() - SWEEP_GRACE_SECONDS
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename.endswith('.z') and filename[:-2] not in live_hashes and os.path.getmtime(path) < threshold:
+                    os.remove(path)
+                    removed += 1
+        if removed:
+            self.logger.info(f"Removed {removed} unreferenced response bodies")
+        return removed
+
+
+class SQLiteBlobStore:
+    """Content-addressed, zlib-compressed response bodies in a SQLite table"""
+
+    def __init__(self, connect):
+        self.logger = logging.getLogger(__name__)
+        self._connect = connect
+        self._connect().executescript(BLOB_SCHEMA)
+
+    def put(self, content, commit=True):
+        """Store a body and return (hash, size in bytes)"""
+        data = content.encode('utf-8')
+        digest = content_hash(data)
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM response_blobs WHERE hash = ?", (digest,)).fetchone():
+            sql = "UPDATE response_blobs SET stored_at = ? WHERE hash = ?"
+            params = (time.time(), digest)
+        else:
+            sql = "INSERT OR IGNORE INTO response_blobs (hash, size, stored_at, data) VALUES (?, ?, ?, ?)"
+            params = (digest, len(data), time.time(), zlib.compress(data))
+        if commit:
+            with conn:
+                conn.execute(sql, params)
+        else:
+            conn.execute(sql, params)
+        return digest, len(data)
+
+    def get(self, digest):
+        """Return a stored body, or None if it is unknown"""
+        row = self._connect().execute("SELECT data FROM response_blobs WHERE hash = ?", (digest,)).fetchone()
+        return zlib.decompress(row['data']).decode('utf-8') if row else None
+
+    def sweep(self, commit=True):
+        """Delete bodies no longer referenced by the history table in the same database"""
+        conn = self._connect()
+        sql = (
+            "DELETE FROM response_blobs WHERE stored_at < ? AND hash NOT IN "
+            "(SELECT response_hash FROM history WHERE response_hash IS NOT NULL)"
+        )
+        params = (time.time() - SWEEP_GRACE_SECONDS,)
+        if commit:
+            with conn:
+                removed = conn.execute(sql, params).rowcount
+        else:
+            removed = conn.execute(sql, params).rowcount
+        if removed:
+            self.logger.info(f"Removed {removed} unreferenced response bodies")
+        return removed
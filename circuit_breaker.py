@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Outcomes per host that the failure and slow rates are computed over
+DEFAULT_WINDOW = 20
+# Outcomes older than this no longer count towards the rates
+DEFAULT_WINDOW_SECONDS = 600
+# Fewest outcomes in the window before the breaker may open
+DEFAULT_MIN_CALLS = 5
+DEFAULT_FAILURE_RATE = 0.5
+# Requests taking at least this long count as slow
+DEFAULT_SLOW_CALL_SECONDS = 20
+# How long an open circuit short-circuits runs before letting a probe through
+DEFAULT_OPEN_SECONDS = 60
+# Probe runs that must all succeed in half-open state to close the circuit
+DEFAULT_HALF_OPEN_PROBES = 1
+
+
+class _Circuit:
+    __slots__ = ('state', 'outcomes', 'changed_at', 'probes_started', 'probe_successes', 'opened', 'short_circuited')
+
+    def __init__(self, window):
+        self.state = CLOSED
+        # (monotonic time, failed, slow) per finished request
+        self.outcomes = deque(maxlen=window)
+        self.changed_at = time.monotonic()
+        self.probes_started = 0
+        self.probe_successes = 0
+        self.opened = 0
+        self.short_circuited = 0
+
+
+class CircuitBreaker:
+    """Per-host circuit breakers that stop runs against a host that keeps failing
+
+    Each host's circuit starts closed. Once at least ``min_calls`` recent
+    requests have finished and the share that failed (a request error or a
+    5xx status) or was slow reaches ``failure_rate``, the circuit opens:
+    allow() turns runs away for ``open_seconds`` instead of letting them
+    wait on a dead host. After that the circuit is half-open and lets
+    ``half_open_probes`` runs through; it closes if they all succeed and
+    opens again on the first failure. A failure_rate of 0 disables it.
+    """
+
+    def __init__(self, failure_rate=DEFAULT_FAILURE_RATE, min_calls=DEFAULT_MIN_CALLS, window=DEFAULT_WINDOW,
+                 window_seconds=DEFAULT_WINDOW_SECONDS, slow_call_seconds=DEFAULT_SLOW_CALL_SECONDS,
+                 open_seconds=DEFAULT_OPEN_SECONDS, half_open_probes=DEFAULT_HALF_OPEN_PROBES):
+        if not 0 <= failure_rate <= 1:
+            raise ValueError("failure_rate must be between 0 and 1")
+        if min(min_calls, window, half_open_probes) < 1 or min(window_seconds, open_seconds) <= 0:
+            raise ValueError("Circuit breaker windows, call counts and open time must be positive")
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.window_seconds = window_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.failure_rate > 0
+
+    def _circuit(self, host):
+        host = (host or '').lower()
+        circuit = self._circuits.get(host)
+        if circuit is None:
+            circuit = self._circuits[host] = _Circuit(self.window)
+        return circuit
+
+    def _set_state(self, circuit, state, now):
+        circuit.state = state
+        circuit.changed_at = now
+        circuit.probes_started = 0
+        circuit.probe_successes = 0
+        if state == OPEN:
+            circuit.opened += 1
+        else:
+            circuit.outcomes.clear()
+
+    def allow(self, host):
+        """Whether a run against host may go ahead; a run turned away is counted as short-circuited"""
+        if not self.enabled:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuit(host)
+            if circuit.state == OPEN and now - circuit.changed_at >= self.open_seconds:
+                self._set_state(circuit, HALF_OPEN, now)
+            if circuit.state == HALF_OPEN:
+                # A probe that never reported back (its job was deleted, say)
+                # must not hold the circuit half-open forever
+                if circuit.probes_started >= self.half_open_probes and now - circuit.changed_at >= self.open_seconds:
+                    self._set_state(circuit, HALF_OPEN, now)
+                if circuit.probes_started < self.half_open_probes:
+                    circuit.probes_started += 1
+                    return True
+            elif circuit.state == CLOSED:
+                return True
+            circuit.short_circuited += 1
+            return False
+
+    def record(self, host, failed, elapsed):
+        """Report a finished request: whether it failed and how many seconds it took"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        slow = elapsed >= self.slow_call_seconds
+        with self._lock:
+            circuit = self._circuit(host)
+            if circuit.state == OPEN:
+                # Runs admitted before the circuit opened; the host is already known to be failing
+                return
+            if circuit.state == HALF_OPEN:
+                if failed or slow:
+                    self._set_state(circuit, OPEN, now)
+                else:
+                    circuit.probe_successes += 1
+                    if circuit.probe_successes >= self.half_open_probes:
+                        self._set_state(circuit, CLOSED, now)
+                return
+            circuit.outcomes.append((now, failed, slow))
+            self._expire(circuit, now)
+            calls = len(circuit.outcomes)
+            if calls >= self.min_calls:
+                failures = sum(1 for _, failed, _ in circuit.outcomes if failed)
+                slow_calls = sum(1 for _, _, slow in circuit.outcomes if slow)
+                if max(failures, slow_calls) >= self.failure_rate * calls:
+                    self._set_state(circuit, OPEN, now)
+
+    def _expire(self, circuit, now):
+        while circuit.outcomes and now - circuit.outcomes[0][0] > self.window_seconds:
+            circuit.outcomes.popleft()
+
+    def state(self, host):
+        """The current state of a host's circuit"""
+        with self._lock:
+            circuit = self._circuits.get((host or '').lower())
+            return circuit.state if circuit else CLOSED
+
+    def metrics(self):
+        """State, recent failure and slow rates and short-circuited runs per host"""
+        now = time.monotonic()
+        with self._lock:
+            result = []
+            for host, circuit in sorted(self._circuits.items()):
+                self._expire(circuit, now)
+                calls = len(circuit.outcomes)
+                failures = sum(1 for _, failed, _ in circuit.outcomes if failed)
+                slow_calls = sum(1 for _, _, slow in circuit.outcomes if slow)
+                retry_in = None
+                if circuit.state == OPEN:
+                    retry_in = round(max(0.0, self.open_seconds - (now - circuit.changed_at)), 1)
+                result.append({
+                    'host': host,
+                    'state': circuit.state,
+                    'calls': calls,
+                    'failure_rate': round(failures / calls, 3) if calls else 0,
+                    'slow_rate': round(slow_calls / calls, 3) if calls else 0,
+                    'opened': circuit.opened,
+                    'short_circuited': circuit.short_circuited,
+                    'state_age': round(now - circuit.changed_at, 1),
+                    'retry_in': retry_in
+                })
+            return result
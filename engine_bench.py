@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the scheduler execution engines against a slow local endpoint.
+
+    python engine_bench.py [thread asyncio] [--executions 2000] [--delay 0.5] [--workers 20]
+
+Each engine fires the same burst of one-shot executions through its
+APScheduler at a local HTTP server that answers every request after
+--delay seconds, recording history in a fresh JSON Lines store. The report
+gives wall time, executions per second and the peak number of threads.
+"""
+import argparse
+import asyncio
+import sys
+import threading
+import time
+import logging
+from datetime import datetime
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
+from scheduler import CronScheduler
+from async_engine import AsyncCronScheduler, aiohttp
+from storage_kit import StoreFactory
+
+ENGINES = ('thread', 'asyncio')
+
+
+class SlowServer:
+    """HTTP/1.1 server on its own event loop thread that answers every request after a delay"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                if not head:
+                    break
+                await asyncio.sleep(self.delay)
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 2\r\n\r\nok')
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def start(self):
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, '127.0.0.1', 0, backlog=4096), self.loop
+        ).result()
+        return f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/"
+
+    def stop(self):
+        self.server.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+def run_engine(engine, url, executions, jobs=50, workers=20):
+    """Fire ``executions`` runs through one engine; returns (completed, elapsed, peak threads, recorded)"""
+    factory = StoreFactory('jsonl')
+    manager = factory.open()
+    try:
+        job_ids = [job.id for job in manager.add_jobs([
+            {'name': f'bench-{n}', 'url': url, 'cron_expression': '0 0 1 1 *'} for n in range(jobs)
+        ])]
+        if engine == 'asyncio':
+            scheduler = AsyncCronScheduler(manager)
+            execute = scheduler._execute_job_async
+        else:
+            scheduler = CronScheduler(manager, max_workers=workers)
+            execute = scheduler._execute_job
+
+        done = threading.Event()
+        completed = [0]
+        count_lock = threading.Lock()
+
+        def on_finished(event):
+            with count_lock:
+                completed[0] += 1
+                if completed[0] == executions:
+                    done.set()
+
+        scheduler.scheduler.add_listener(on_finished, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+        scheduler.start()
+        peak_threads = threading.active_count()
+        started = time.perf_counter()
+        now = datetime.now()
+        for n in range(executions):
+            scheduler.scheduler.add_job(
+                func=execute, trigger='date', run_date=now, args=[job_ids[n % jobs]],
+                id=f'bench_{n}', misfire_grace_time=None
+            )
+        while not done.wait(0.05):
+            peak_threads = max(peak_threads, threading.active_count())
+        elapsed = time.perf_counter() - started
+        scheduler.shutdown()
+        manager.flush()
+        recorded = sum(manager.get_job_stats(job_id)['total_executions'] for job_id in job_ids)
+        return completed[0], elapsed, peak_threads, recorded
+    finally:
+        manager.close()
+        factory.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scheduler execution engine benchmark")
+    parser.add_argument('engines', nargs='*', help=f"any of {', '.join(ENGINES)} (default: all available)")
+    parser.add_argument('--executions', type=int, default=2000, help="executions fired per engine")
+    parser.add_argument('--delay', type=float, default=0.5, help="seconds the endpoint takes to answer")
+    parser.add_argument('--workers', type=int, default=20, help="thread pool size of the thread engine")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    unknown = set(args.engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"unknown engines: {', '.join(sorted(unknown))}")
+    engines = args.engines or [engine for engine in ENGINES if engine != 'asyncio' or aiohttp]
+
+    server = SlowServer(args.delay)
+    url = server.start()
+    failed = False
+    try:
+        for engine in engines:
+            completed, elapsed, peak_threads, recorded = run_engine(engine, url, args.executions, workers=args.workers)
+            status = 'ok' if recorded == args.executions else 'FAIL'
+            print(f"{status:<5} {engine:<8} {completed:>7} executions  {elapsed:8.3f}s  "
+                  f"{completed / elapsed if elapsed else 0:>8.0f} exec/s  {peak_threads:>4} threads peak")
+            failed |= status != 'ok'
+    finally:
+        server.stop()
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
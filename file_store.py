@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import logging
+from history_log import HistoryLog, JsonHistoryFile
+from runtime_state import RuntimeStateStore
+from job_revisions import RevisionStore
+from sqlite_conn import ThreadConnections
+from ids import uuid7
+from blob_store import FileBlobStore
+from storage_backend import StorageBackend
+from job_table import JobTable
+
+
+class FileBackend(StorageBackend):
+    """Jobs in a JSON snapshot and journal, history in a JSON Lines log or legacy JSON array, runtime state and revisions in SQLite
+
+    A history file ending in '.jsonl' selects the append-only segmented
+    log; anything else keeps the legacy single JSON array.
+    """
+
+    def __init__(self, jobs_file='data/jobs.json', history_file='data/job_history.jsonl',
+                 state_file='data/job_state.db', blob_dir='data/blobs'):
+        self.jobs_file = jobs_file
+        self.history_file = history_file
+        self.name = 'jsonl' if history_file.endswith('.jsonl') else 'json'
+        self.logger = logging.getLogger(__name__)
+
+        self._commit_lock = threading.Lock()
+        # Ids of records whose runtime state is stored but which aren't in
+        # the history log yet because the append failed
+        self._state_applied = set()
+
+        # Ensure data directory exists
+        os.makedirs(os.path.dirname(jobs_file) or '.', exist_ok=True)
+
+        # Job definitions: an atomically replaced snapshot plus a fsynced journal
+        self.jobs = JobTable(jobs_file)
+
+        # Response bodies are stored once per distinct content, compressed
+        self.blobs = FileBlobStore(blob_dir)
+
+        # last_run/last_status live in their own small store so executions
+        # never rewrite (or invalidate the cache of) job definitions
+        self._state_conn = ThreadConnections(state_file)
+        self.state = RuntimeStateStore(connect=self._state_conn)
+        self._migrate_embedded_state()
+
+        # Job revisions are append-only, so they share the state database
+        # rather than growing the job table
+        self.revisions = RevisionStore(connect=self._state_conn)
+        self._backfill_revisions()
+
+        if history_file.endswith('.jsonl'):
+            self.history = HistoryLog(history_file)
+            self._migrate_legacy_history()
+        else:
+            self.history = JsonHistoryFile(history_file)
+        if not self.state.has_stats() and not self.history.is_empty():
+            self.state.rebuild_stats(self.history.iter_records())
+
+    def _migrate_embedded_state(self):
+        """Move runtime fields out of jobs.json written by older versions"""
+        jobs = self.jobs.list()
+        if not any('last_run' in job or 'last_status' in job for job in jobs):
+            return
+        if not self.state.get_all():
+            self.state.import_from_jobs(jobs)
+        for job in jobs:
+            job.pop('last_run', None)
+            job.pop('last_status', None)
+        self.jobs.replace_all(jobs)
+
+    def _backfill_revisions(self):
+        """Give jobs created before revisions existed their first revision"""
+        jobs = self.jobs.list()
+        revisions = self.revisions.missing_revisions(jobs, uuid7)
+        if not revisions:
+            return
+        self.revisions.add_many(revisions)
+        updated = {revision.job_id for revision in revisions}
+        self.jobs.put_many([job for job in jobs if job['id'] in updated])
+        self.logger.info(f"Created initial revisions for {len(revisions)} jobs")
+
+    def _migrate_legacy_history(self):
+        """Import a legacy job_history.json into an empty JSON Lines log"""
+        legacy_file = os.path.splitext(self.history_file)[0] + '.json'
+        if not os.path.exists(legacy_file) or not self.history.is_empty():
+            return
+        try:
+            with open(legacy_file, 'r') as f:
+                records = json.load(f)
+            for record in records:
+                content = record.pop('response_content', None)
+                if content:
+                    record['response_hash'], record['response_size'] = self.blobs.put(content)
+            self.history.import_records(records)
+            os.replace(legacy_file, legacy_file + '.migrated')
+            self.logger.info(f"Migrated {len(records)} history records from {legacy_file}")
+        except Exception as e:
+            self.logger.error(f"Failed to migrate legacy history: {e}")
+
+    def list_jobs(self):
+        jobs = self.jobs.list()
+        states = self.state.get_all()
+        for job in jobs:
+            self.state.merge(job, states.get(job['id']))
+        return jobs
+
+    def get_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if not job:
+            return None
+        return self.state.merge(job, self.state.get(job_id))
+
+    def insert_job(self, job, revision):
+        # The revision goes first: a crash in between leaves an unused
+        # revision rather than a job pointing at a missing one
+        self.revisions.add_many([revision])
+        self.jobs.put(job)
+
+    def insert_jobs(self, jobs, revisions):
+        self.revisions.add_many(revisions)
+        self.jobs.put_many(jobs)
+
+    def update_job(self, job_id, fields, revision):
+        self.revisions.add_many([revision])
+        self.jobs.update(job_id, **fields)
+
+    def delete_job(self, job_id):
+        self.jobs.delete(job_id)
+        self.state.delete(job_id)
+
+    def set_job_active(self, job_id, active):
+        self.jobs.update(job_id, active=active)
+
+    def get_job_names(self, job_ids):
+        return self.jobs.names(job_ids)
+
+    def get_revisions(self, revision_ids):
+        return self.revisions.get_many(revision_ids)
+
+    def list_revisions(self, job_id):
+        return self.revisions.list(job_id)
+
+    def set_state(self, job_id, state):
+        self.state.set_many({job_id: state})
+
+    def claim_run(self, job_id, fire_time):
+        """This store is only shared by one process, so every claim wins"""
+        return True
+
+    def get_stats(self, job_id):
+        return self.state.get_stats(job_id)
+
+    def get_all_stats(self):
+        return self.state.get_all_stats()
+
+    def get_rollups(self, job_id, granularity='hour', since=None, until=None):
+        return self.state.get_rollups(job_id, granularity, since, until)
+
+    def append_records(self, records):
+        """Fold records into runtime state, then append them to the history log
+
+        The two writes can't share a transaction. A batch that failed is
+        retried whole, so state already applied for a record is skipped
+        rather than counted again; a failed state update appends nothing.
+        """
+        with self._commit_lock:
+            fresh = [record for record in records if record.id not in self._state_applied]
+            if fresh:
+                self.state.apply_records(fresh)
+                self._state_applied.update(record.id for record in fresh)
+            self.history.append_many(records)
+            self._state_applied.difference_update(record.id for record in records)
+
+    def tail(self, limit):
+        # Most recent entries first, read backwards from the end of the log
+        return self.history.tail(limit)
+
+    def query_history(self, limit, cursor=None, **filters):
+        return self.history.query(limit, cursor, **filters)
+
+    def clear_history(self):
+        with self._commit_lock:
+            self.history.clear()
+            self.state.clear_stats()
+            self.blobs.sweep(set())
+
+    def expire_history(self, history_cutoff, rollup_retention_days=None, now=None):
+        with self._commit_lock:
+            removed = self.history.expire_before(history_cutoff)
+            self.state.expire_rollups(rollup_retention_days, now)
+            live_hashes = {record.response_hash for record in self.history.iter_records()}
+            self.blobs.sweep(live_hashes)
+        return removed
+
+    def put_blob(self, content):
+        return self.blobs.put(content)
+
+    def get_blob(self, digest):
+        return self.blobs.get(digest)
+
+    def close(self):
+        """Snapshot the job table, stop the history maintenance thread and close the state database"""
+        self.jobs.close()
+        self.history.close()
+        self.state.close()
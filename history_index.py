@@ -0,0 +1,93 @@
+import bisect
+import json
+
+# Records per index entry; a seek parses at most this many records it doesn't need
+DEFAULT_INDEX_EVERY = 256
+
+TIMESTAMP_KEY = b'"timestamp":"'
+
+
+def line_timestamp(line):
+    """Pull the timestamp out of an encoded history line without parsing the whole record"""
+    start = line.find(TIMESTAMP_KEY)
+    if start >= 0:
+        start += len(TIMESTAMP_KEY)
+        end = line.find(b'"', start)
+        if end > start:
+            return bytes(line[start:end]).decode('ascii', 'replace')
+    try:
+        return json.loads(line).get('timestamp')
+    except (ValueError, AttributeError):
+        return None
+
+
+class SegmentIndex:
+    """Sparse offset index over one JSON Lines history segment
+
+    Records are grouped into blocks of ``every`` consecutive lines, and
+    for each block the index keeps its byte offset and the oldest and
+    newest timestamp inside it. Timestamps are only roughly in file order
+    (threads finishing together can append slightly out of order), so
+    seeks rely on the per-block bounds rather than on record order. The
+    index grows with the segment: ``extend`` only scans bytes appended
+    since the last call.
+    """
+
+    def __init__(self, identity=None, every=DEFAULT_INDEX_EVERY):
+        self.identity = identity
+        self.every = every
+        self.offsets = []
+        self.min_ts = []
+        self.max_ts = []
+        self.count = 0
+        self.indexed_bytes = 0
+
+    def extend(self, buf, size):
+        """Index the complete lines in buf between indexed_bytes and size"""
+        pos = self.indexed_bytes
+        while pos < size:
+            end = buf.find(b'\n', pos, size)
+            if end < 0:
+                # A line still being written; index it once it is complete
+                break
+            if end > pos:
+                timestamp = line_timestamp(buf[pos:end])
+                if self.count % self.every == 0:
+                    self.offsets.append(pos)
+                    self.min_ts.append(timestamp)
+                    self.max_ts.append(timestamp)
+                elif timestamp is not None:
+                    if self.min_ts[-1] is None or timestamp < self.min_ts[-1]:
+                        self.min_ts[-1] = timestamp
+                    if self.max_ts[-1] is None or timestamp > self.max_ts[-1]:
+                        self.max_ts[-1] = timestamp
+                self.count += 1
+            pos = end + 1
+        self.indexed_bytes = pos
+
+    def block_of(self, offset):
+        """Index of the block holding the record at a byte offset"""
+        return bisect.bisect_right(self.offsets, offset) - 1
+
+    def ends_before(self, block, timestamp):
+        """Whether every record in a block is older than timestamp"""
+        newest = self.max_ts[block] if block >= 0 else None
+        return newest is not None and newest < timestamp
+
+    def newest(self):
+        """The newest timestamp in the segment, or None"""
+        return max((ts for ts in self.max_ts if ts is not None), default=None)
+
+    def end_before(self, timestamp, size):
+        """Byte offset to read backwards from so that every record skipped is newer than timestamp
+
+        Returns 0 when the whole segment is newer, and ``size`` when no
+        block can be skipped.
+        """
+        end = size
+        for i in range(len(self.offsets) - 1, -1, -1):
+            oldest = self.min_ts[i]
+            if oldest is None or oldest <= timestamp:
+                break
+            end = self.offsets[i]
+        return end
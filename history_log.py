@@ -0,0 +1,442 @@
+import glob
+import json
+import mmap
+import os
+import re
+import threading
+import logging
+from history_query import page_from_newest_first
+from atomic_file import atomic_write, atomic_write_json
+from records import ExecutionRecord
+from history_index import DEFAULT_INDEX_EVERY, SegmentIndex
+
+
+class JsonHistoryFile:
+    """Execution history kept as a single JSON array that is rewritten on every append"""
+
+    def __init__(self, path, max_records=1000):
+        self.path = path
+        self.max_records = max_records
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.path):
+            self._save([])
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return [ExecutionRecord.from_dict(record) for record in json.load(f)]
+        except Exception as e:
+            self.logger.error(f"Failed to load history: {e}")
+            return []
+
+    def _save(self, history):
+        try:
+            atomic_write_json(self.path, [record.to_dict() for record in history], indent=2)
+        except Exception as e:
+            self.logger.error(f"Failed to save history: {e}")
+
+    def append(self, record):
+        """Append a record, keeping only the most recent max_records"""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Append several records with a single rewrite"""
+        with self._lock:
+            history = self._load()
+            history.extend(records)
+            self._save(history[-self.max_records:])
+
+    def tail(self, limit):
+        """Return up to limit records, most recent first"""
+        history = self._load()
+        history.reverse()
+        return history[:limit]
+
+    def iter_records(self):
+        """Iterate over all records, oldest first"""
+        return iter(self._load())
+
+    def query(self, limit, cursor=None, **filters):
+        """Return one page of records matching the filters, most recent first"""
+        return page_from_newest_first(reversed(self._load()), limit, cursor, **filters)
+
+    def is_empty(self):
+        return not self._load()
+
+    def expire_before(self, cutoff):
+        """Drop records with a timestamp older than the ISO cutoff"""
+        with self._lock:
+            history = self._load()
+            kept = [record for record in history if record.timestamp >= cutoff]
+            if len(kept) != len(history):
+                self._save(kept)
+        return len(history) - len(kept)
+
+    def clear(self):
+        with self._lock:
+            self._save([])
+
+    def close(self):
+        pass
+
+
+class HistoryLog:
+    """Append-only JSON Lines execution history split into rotated segments
+
+    New records are appended to the active segment (``job_history.jsonl``).
+    A background thread seals the active segment once it grows past
+    ``segment_max_bytes`` by renaming it to ``job_history.000001.jsonl``
+    and so on, and compacts the log by deleting the oldest sealed segments
+    beyond ``max_segments``. Reads memory-map the segments and walk them
+    newest first, backwards from the end, so ``tail`` only touches the
+    pages it returns. A sparse index per segment (one entry every
+    ``index_every`` records, see ``history_index.py``) lets time-bounded
+    queries skip straight past newer records without parsing them.
+    """
+
+    def __init__(self, path, segment_max_bytes=1024 * 1024, max_segments=50, maintenance_interval=60,
+                 index_every=DEFAULT_INDEX_EVERY):
+        self.path = path
+        self.segment_max_bytes = segment_max_bytes
+        self.max_segments = max_segments
+        self.index_every = index_every
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._indexes = {}
+
+        stem, ext = os.path.splitext(path)
+        self._segment_pattern = f"{glob.escape(stem)}.*{ext}"
+        self._segment_re = re.compile(re.escape(os.path.basename(stem)) + r'\.(\d{6})' + re.escape(ext) + '$')
+        self._stem, self._ext = stem, ext
+
+        if not os.path.exists(self.path):
+            open(self.path, 'a').close()
+
+        self._stop = threading.Event()
+        self._maintenance_thread = None
+        if maintenance_interval:
+            self._maintenance_thread = threading.Thread(
+                target=self._maintenance_loop, args=(maintenance_interval,),
+                name='history-log-maintenance', daemon=True
+            )
+            self._maintenance_thread.start()
+
+    def _sealed_segments(self):
+        """Return sealed segment paths, oldest first"""
+        segments = []
+        for path in glob.glob(self._segment_pattern):
+            match = self._segment_re.search(os.path.basename(path))
+            if match:
+                segments.append((int(match.group(1)), path))
+        return [path for _, path in sorted(segments)]
+
+    def _next_segment_path(self, sealed):
+        last = self._segment_re.search(os.path.basename(sealed[-1])).group(1) if sealed else 0
+        return f"{self._stem}.{int(last) + 1:06d}{self._ext}"
+
+    @staticmethod
+    def _encode(record):
+        return json.dumps(record.to_dict(), separators=(',', ':'), default=str) + '\n'
+
+    def append(self, record):
+        """Append a record to the active segment"""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Append several records with a single write"""
+        data = ''.join(self._encode(record) for record in records)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(data)
+
+    def import_records(self, records):
+        """Bulk-load record dicts, oldest first, e.g. from a legacy JSON history file"""
+        if records:
+            self.append_many([ExecutionRecord.from_dict(record) for record in records])
+
+    @staticmethod
+    def _map(path):
+        """Map a segment read-only as it is now; returns (name, buffer, size, identity)"""
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            # Empty files can't be mapped, and appends after this point stay invisible
+            buf = mmap.mmap(f.fileno(), stat.st_size, access=mmap.ACCESS_READ) if stat.st_size else b''
+        return os.path.basename(path), buf, stat.st_size, (stat.st_dev, stat.st_ino)
+
+    def _snapshot(self):
+        """Map every segment, newest first, at its size at this moment"""
+        with self._lock:
+            segments = []
+            for path in [self.path] + self._sealed_segments()[::-1]:
+                try:
+                    segments.append(self._map(path))
+                except FileNotFoundError:
+                    continue
+            return segments
+
+    @staticmethod
+    def _release(segments):
+        for _, buf, _, _ in segments:
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+
+    def _index(self, name, buf, size, identity):
+        """Return the segment's sparse index, brought up to date with its first size bytes"""
+        with self._index_lock:
+            index = self._indexes.get(name)
+            if index is None or index.identity != identity:
+                index = self._indexes[name] = SegmentIndex(identity, self.index_every)
+            if index.indexed_bytes < size:
+                index.extend(buf, size)
+            return index
+
+    def _forget_indexes(self, paths=None):
+        """Drop the indexes of removed segments, or of every segment"""
+        with self._index_lock:
+            if paths is None:
+                self._indexes.clear()
+            for path in paths or ():
+                self._indexes.pop(os.path.basename(path), None)
+
+    @staticmethod
+    def _read_lines_reverse(buf, end):
+        """Yield (offset, line) for the lines of a mapped segment backwards, starting at byte offset end"""
+        while end > 0:
+            start = buf.rfind(b'\n', 0, end) + 1
+            line = buf[start:end]
+            if line.strip():
+                yield start, line
+            end = start - 1
+
+    def _decode(self, line):
+        try:
+            return ExecutionRecord.from_dict(json.loads(line))
+        except (ValueError, KeyError, TypeError):
+            # A torn trailing line from an interrupted write; skip it
+            self.logger.warning(f"Skipping malformed history line in {self.path}")
+            return None
+
+    def _record_at(self, buf, size, offset):
+        if not 0 <= offset < size:
+            return None
+        end = buf.find(b'\n', offset, size)
+        return self._decode(buf[offset:end if end >= 0 else size])
+
+    def iter_reverse(self, start=None, with_positions=False, before=None, after=None):
+        """Iterate over all records, most recent first
+
+        ``start`` is a (segment name, byte offset) position as yielded with
+        ``with_positions=True``; iteration then resumes with the record
+        just before it. Positions go stale when the active segment is
+        rotated, so callers should check the record at a position with
+        ``record_at`` before resuming from it.
+
+        Without a start position, ``before`` (an ISO timestamp) uses the
+        segment indexes to skip blocks whose records are all newer than
+        it. Some newer records may still be yielded; callers filter them.
+
+        ``after`` (an ISO timestamp) ends iteration at the first index block
+        whose records are all older than it. Records are only roughly in
+        time order, so nothing stops earlier; some older records may still
+        be yielded and callers filter them too.
+        """
+        segments = self._snapshot()
+        try:
+            started = start is None
+            for name, buf, size, identity in segments:
+                end = size
+                if not started:
+                    if name != start[0]:
+                        continue
+                    started = True
+                    end = min(start[1], size)
+                elif start is None and before is not None and size:
+                    end = min(self._index(name, buf, size, identity).end_before(before, size), size)
+                index = self._index(name, buf, size, identity) if after is not None and size else None
+                block = None
+                for offset, line in self._read_lines_reverse(buf, end):
+                    if index is not None:
+                        line_block = index.block_of(offset)
+                        if line_block != block:
+                            block = line_block
+                            if index.ends_before(block, after):
+                                return
+                    record = self._decode(line)
+                    if record is not None:
+                        yield (record, (name, offset)) if with_positions else record
+        finally:
+            self._release(segments)
+
+    def record_at(self, position):
+        """Return the record stored at a (segment name, byte offset) position, or None"""
+        segments = self._snapshot()
+        try:
+            for name, buf, size, _ in segments:
+                if name == position[0]:
+                    return self._record_at(buf, size, position[1])
+            return None
+        finally:
+            self._release(segments)
+
+    def iter_records(self):
+        """Iterate over all records, oldest first"""
+        segments = self._snapshot()
+        try:
+            for _, buf, size, _ in reversed(segments):
+                pos = 0
+                while pos < size:
+                    end = buf.find(b'\n', pos, size)
+                    end = size if end < 0 else end
+                    line = buf[pos:end]
+                    pos = end + 1
+                    if line.strip():
+                        record = self._decode(line)
+                        if record is not None:
+                            yield record
+        finally:
+            self._release(segments)
+
+    def query(self, limit, cursor=None, **filters):
+        """Return one page of records matching the filters, most recent first
+
+        Cursors carry the (segment, offset) position of their record, so a
+        following page seeks straight to it instead of re-reading the log
+        from the end.
+        """
+        positions = {}
+        start = None
+        if cursor and cursor['d'] == 'next' and cursor.get('p'):
+            hint = tuple(cursor['p'])
+            found = self.record_at(hint)
+            if found and found.id == cursor['id']:
+                start = hint
+
+        # Without a usable position, seek by time: nothing newer than the
+        # cursor record or at/after `until` belongs on this page
+        before = None
+        if start is None:
+            bounds = [filters.get('until')]
+            if cursor and cursor['d'] == 'next':
+                bounds.append(cursor['key'][0])
+            before = min((bound for bound in bounds if bound is not None), default=None)
+        # Nothing older than `since`, or than the cursor record on a 'prev' page, belongs on it either
+        bounds = [filters.get('since')]
+        if cursor and cursor['d'] == 'prev':
+            bounds.append(cursor['key'][0])
+        after = max((bound for bound in bounds if bound is not None), default=None)
+
+        def records():
+            for record, position in self.iter_reverse(start, with_positions=True, before=before, after=after):
+                positions[record.id] = list(position)
+                yield record
+
+        return page_from_newest_first(
+            records(), limit, cursor, resumed=start is not None,
+            position_of=lambda record: positions.get(record.id), **filters
+        )
+
+    def tail(self, limit):
+        """Return up to limit records, most recent first"""
+        records = []
+        if limit <= 0:
+            return records
+        for record in self.iter_reverse():
+            records.append(record)
+            if len(records) >= limit:
+                break
+        return records
+
+    def is_empty(self):
+        return not self._sealed_segments() and os.path.getsize(self.path) == 0
+
+    def rotate(self):
+        """Seal the active segment if it has outgrown segment_max_bytes"""
+        with self._lock:
+            try:
+                if os.path.getsize(self.path) < self.segment_max_bytes:
+                    return False
+            except OSError:
+                return False
+            target = self._next_segment_path(self._sealed_segments())
+            os.replace(self.path, target)
+            open(self.path, 'a').close()
+            # The sealed file is the same file under a new name, so its index carries over
+            with self._index_lock:
+                index = self._indexes.pop(os.path.basename(self.path), None)
+                if index is not None:
+                    self._indexes[os.path.basename(target)] = index
+        self.logger.debug(f"Rotated history segment to {target}")
+        return True
+
+    def compact(self):
+        """Drop the oldest sealed segments beyond max_segments"""
+        with self._lock:
+            sealed = self._sealed_segments()
+            expired = sealed[:max(0, len(sealed) - self.max_segments)]
+            for path in expired:
+                os.remove(path)
+            self._forget_indexes(expired)
+        if expired:
+            self.logger.info(f"Compacted history log, removed {len(expired)} old segments")
+        return len(expired)
+
+    def _segment_summary(self, path):
+        """Return (newest timestamp or None, record count) of a segment"""
+        name, buf, size, identity = self._map(path)
+        try:
+            if not size:
+                return None, 0
+            index = self._index(name, buf, size, identity)
+            return index.newest(), index.count
+        finally:
+            self._release([(name, buf, size, identity)])
+
+    def expire_before(self, cutoff):
+        """Delete sealed segments whose newest record is older than the ISO cutoff; returns the records removed"""
+        segments, removed = 0, 0
+        with self._lock:
+            for path in self._sealed_segments():
+                newest, count = self._segment_summary(path)
+                if newest is not None and newest >= cutoff:
+                    break
+                os.remove(path)
+                self._forget_indexes([path])
+                segments += 1
+                removed += count
+        if segments:
+            self.logger.info(f"Expired {segments} history segments ({removed} records) older than {cutoff}")
+        return removed
+
+    def maintain(self):
+        """Run one rotation and compaction pass"""
+        try:
+            self.rotate()
+            self.compact()
+        except Exception as e:
+            self.logger.error(f"History log maintenance failed: {e}")
+
+    def _maintenance_loop(self, interval):
+        while not self._stop.wait(interval):
+            self.maintain()
+
+    def clear(self):
+        """Remove all segments and replace the active one with an empty file
+
+        The active segment is replaced rather than truncated: readers may
+        still have it mapped, and touching pages past a truncated end
+        kills the process with SIGBUS.
+        """
+        with self._lock:
+            for path in self._sealed_segments():
+                os.remove(path)
+            atomic_write(self.path, b'')
+            self._forget_indexes()
+
+    def close(self):
+        """Stop the background maintenance thread"""
+        self._stop.set()
+        if self._maintenance_thread:
+            self._maintenance_thread.join(timeout=5)
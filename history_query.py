@@ -0,0 +1,118 @@
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(record, direction, position=None):
+    """Build an opaque page cursor from a record's (timestamp, id) key
+
+    ``direction`` is 'next' (older records) or 'prev' (newer records).
+    Stores that can seek directly may add a ``position`` hint; it is only
+    trusted after checking that the record found there has the same id.
+    """
+    data = {'ts': record.timestamp, 'id': record.id, 'd': direction}
+    if position is not None:
+        data['p'] = position
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if data['d'] not in ('next', 'prev'):
+            raise ValueError(data['d'])
+        data['key'] = (data['ts'], data['id'])
+        return data
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid history cursor: {e}")
+
+
+def record_key(record):
+    return (record.timestamp, record.id)
+
+
+def normalize_limit(limit):
+    return max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+
+def matches(record, job_id=None, success=None, since=None, until=None):
+    """Whether a record passes the query filters; since is inclusive, until exclusive"""
+    if job_id is not None and record.job_id != job_id:
+        return False
+    if success is not None and bool(record.success) != success:
+        return False
+    if since is not None and record.timestamp < since:
+        return False
+    if until is not None and record.timestamp >= until:
+        return False
+    return True
+
+
+def build_page(rows, limit, cursor, position_of=None):
+    """Turn up to limit + 1 fetched rows into a page with next/prev cursors
+
+    ``rows`` are newest first for 'next' pages and for the first page, and
+    oldest first for 'prev' pages, exactly as the store fetched them.
+    """
+    direction = cursor['d'] if cursor else 'next'
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'prev':
+        rows.reverse()
+
+    position_of = position_of or (lambda record: None)
+    next_cursor = prev_cursor = None
+    if rows:
+        older_exists = has_more if direction == 'next' else True
+        newer_exists = cursor is not None if direction == 'next' else has_more
+        if older_exists:
+            next_cursor = encode_cursor(rows[-1], 'next', position_of(rows[-1]))
+        if newer_exists:
+            prev_cursor = encode_cursor(rows[0], 'prev', position_of(rows[0]))
+    return {'records': rows, 'next_cursor': next_cursor, 'prev_cursor': prev_cursor}
+
+
+def page_from_newest_first(records, limit, cursor=None, resumed=False, position_of=None, **filters):
+    """Paginate any newest-first record iterator by cursor
+
+    Used by stores without a B-tree index. Records are walked in log order
+    and the cursor record is located by id (falling back to its key if it
+    has since been expired). Pass ``resumed=True`` when the iterator
+    already starts just past the cursor, e.g. after seeking to its
+    position hint. Reading stops as soon as the page is full. Records are
+    only roughly in time order, so one older than ``since`` or than a
+    'prev' cursor doesn't end the scan; stores bound ``records`` instead
+    (see HistoryLog.iter_reverse).
+    """
+    limit = normalize_limit(limit)
+    rows = []
+    if cursor and cursor['d'] == 'prev':
+        # Newer records sit between the head of the log and the cursor; if
+        # the cursor record has expired, every record left is newer
+        for record in records:
+            if record.id == cursor['id']:
+                break
+            if matches(record, **filters):
+                rows.append(record)
+        rows = rows[::-1][:limit + 1]
+        return build_page(rows, limit, cursor, position_of)
+
+    skipping = cursor is not None and not resumed
+    for record in records:
+        if skipping:
+            if record.id == cursor['id']:
+                skipping = False
+                continue
+            if record_key(record) >= cursor['key']:
+                continue
+            skipping = False
+        if matches(record, **filters):
+            rows.append(record)
+            if len(rows) > limit:
+                break
+    return build_page(rows, limit, cursor, position_of)
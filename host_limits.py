@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import deque
+
+# Recent waits kept per limit group for the p95 metric
+WAIT_SAMPLE_SIZE = 500
+# Waits shorter than this are dispatch overhead, not limiting
+DELAYED_THRESHOLD = 0.05
+
+
+def parse_host_limits(text):
+    """Parse 'host=concurrency:rate,...' overrides, e.g. 'api.example.com=2:0.5,.example.org=4'
+
+    A key starting with a dot groups a domain with all its subdomains under
+    one shared limit. Concurrency or rate may be left empty or 0 for no limit.
+    """
+    limits = {}
+    for entry in (text or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        key, sep, spec = entry.partition('=')
+        key = key.strip().lower()
+        concurrency, _, rate = spec.partition(':')
+        try:
+            limit = (int(concurrency.strip() or 0), float(rate.strip() or 0))
+        except ValueError:
+            limit = None
+        if not sep or not key or limit is None or min(limit) < 0:
+            raise ValueError(f"Invalid host limit {entry!r}; expected host=concurrency:rate")
+        limits[key] = limit
+    return limits
+
+
+class TokenBucket:
+    """Token bucket whose tokens can be reserved ahead: a caller that finds it empty learns how long to wait"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def reserve(self, now=None):
+        """Take one token, going into debt if needed; returns the seconds until that token is due"""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+
+class _LimitGroup:
+    __slots__ = ('concurrency', 'bucket', 'in_flight', 'waiters', 'admitted', 'delayed', 'total_wait',
+                 'max_wait', 'waits')
+
+    def __init__(self, concurrency, rate, burst):
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.in_flight = 0
+        self.waiters = deque()
+        self.admitted = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.waits = deque(maxlen=WAIT_SAMPLE_SIZE)
+
+
+class HostLimiter:
+    """Per-host caps on concurrent requests and requests per second
+
+    A run asks for a slot with acquire(). If the host is at its concurrency
+    cap the run is queued rather than blocked: the callback it passed is
+    called with a delay once a finishing run hands its slot over. Rate limits
+    reserve a token ahead of time, so an admitted run may also be told to
+    wait a few seconds before it starts. Every admitted run must call
+    release() when it is done; queued runs can be dropped with cancel().
+    """
+
+    def __init__(self, max_concurrency=0, rate=0, burst=None, overrides=None):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.overrides = dict(overrides or {})
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def group_for(self, host):
+        """The limit group of a host: itself, or a configured '.domain' covering it"""
+        host = (host or '').lower()
+        if host in self.overrides:
+            return host
+        for key in self.overrides:
+            if key.startswith('.') and (host.endswith(key) or host == key[1:]):
+                return key
+        return host
+
+    def _group(self, key):
+        group = self._groups.get(key)
+        if group is None:
+            concurrency, rate = self.overrides.get(key, (self.max_concurrency, self.rate))
+            group = self._groups[key] = _LimitGroup(concurrency, rate, self.burst)
+        return group
+
+    def acquire(self, host, on_slot, owner=None):
+        """Return the seconds to wait before running, or None if queued until on_slot(delay) is called
+
+        ``owner`` (a job id, say) lets cancel() find the run while it is queued.
+        """
+        with self._lock:
+            group = self._group(self.group_for(host))
+            if group.concurrency and (group.in_flight >= group.concurrency or group.waiters):
+                group.waiters.append((owner, on_slot))
+                return None
+            group.in_flight += 1
+            return group.bucket.reserve() if group.bucket else 0.0
+
+    def release(self, host):
+        """Free a slot, handing it straight to the longest waiting run if there is one"""
+        with self._lock:
+            group = self._group(self.group_for(host))
+            if not group.waiters:
+                group.in_flight -= 1
+                return
+            _, on_slot = group.waiters.popleft()
+            delay = group.bucket.reserve() if group.bucket else 0.0
+        on_slot(delay)
+
+    def cancel(self, owner):
+        """Drop the queued runs of an owner; they hold no slot yet. Returns how many were dropped"""
+        with self._lock:
+            dropped = 0
+            for group in self._groups.values():
+                kept = deque(waiter for waiter in group.waiters if waiter[0] != owner)
+                dropped += len(group.waiters) - len(kept)
+                group.waiters = kept
+            return dropped
+
+    def record_wait(self, host, seconds):
+        """Note how long an admitted run waited between its firing and its start"""
+        with self._lock:
+            group = self._group(self.group_for(host))
+            group.admitted += 1
+            if seconds >= DELAYED_THRESHOLD:
+                group.delayed += 1
+            group.total_wait += seconds
+            group.max_wait = max(group.max_wait, seconds)
+            group.waits.append(seconds)
+
+    def metrics(self):
+        """Limits, current load and wait times per host or domain group"""
+        with self._lock:
+            result = []
+            for key, group in sorted(self._groups.items()):
+                waits = sorted(group.waits)
+                result.append({
+                    'host': key,
+                    'max_concurrency': group.concurrency or None,
+                    'rate': group.bucket.rate if group.bucket else None,
+                    'in_flight': group.in_flight,
+                    'queued': len(group.waiters),
+                    'admitted': group.admitted,
+                    'delayed': group.delayed,
+                    'average_wait': round(group.total_wait / group.admitted, 3) if group.admitted else 0,
+                    'p95_wait': round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0,
+                    'max_wait': round(group.max_wait, 3)
+                })
+            return result
@@ -0,0 +1,89 @@
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Hosts whose connection pools are kept; the least recently used host is dropped beyond this
+DEFAULT_POOL_HOSTS = 100
+# Idle keep-alive connections kept per host
+DEFAULT_POOL_MAXSIZE = 20
+# Seconds an idle connection is reused for; many servers drop keep-alive connections after 60-120s
+DEFAULT_IDLE_TIMEOUT = 55
+# Seconds after which a connection is reopened even if busy, so DNS and TLS changes are picked up
+DEFAULT_MAX_AGE = 600
+
+
+class _ExpiringPoolMixin:
+    """Closes pooled connections that sat idle or have been open too long before handing them out"""
+
+    idle_timeout = DEFAULT_IDLE_TIMEOUT
+    max_age = DEFAULT_MAX_AGE
+    num_expired = 0
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        if conn is not None and conn.sock is not None:
+            now = time.monotonic()
+            if now - conn._keepalive_last_used > self.idle_timeout or now - conn._keepalive_opened_at > self.max_age:
+                # A closed connection reconnects on its next request
+                conn.close()
+                self.num_expired += 1
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None and conn.sock is not None:
+            now = time.monotonic()
+            if getattr(conn, '_keepalive_sock', None) is not conn.sock:
+                conn._keepalive_sock = conn.sock
+                conn._keepalive_opened_at = now
+            conn._keepalive_last_used = now
+        super()._put_conn(conn)
+
+
+class _ExpiringHTTPConnectionPool(_ExpiringPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _ExpiringHTTPSConnectionPool(_ExpiringPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """Transport adapter holding one pool of keep-alive connections per host, shared by many Sessions
+
+    Mount it on short-lived Sessions so each execution keeps its own cookies
+    while the TCP and TLS connections outlive it. Never close such a Session:
+    Session.close() closes its adapters, which would drop the shared pools.
+    """
+
+    def __init__(self, pool_hosts=DEFAULT_POOL_HOSTS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, max_age=DEFAULT_MAX_AGE):
+        if idle_timeout <= 0 or max_age <= 0:
+            raise ValueError("idle_timeout and max_age must be positive")
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        super().__init__(pool_connections=pool_hosts, pool_maxsize=pool_maxsize)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': self._pool_class(_ExpiringHTTPConnectionPool),
+            'https': self._pool_class(_ExpiringHTTPSConnectionPool),
+        }
+
+    def _pool_class(self, base):
+        return type(base.__name__, (base,), {'idle_timeout': self.idle_timeout, 'max_age': self.max_age})
+
+    def pool_stats(self):
+        """Connections opened, reopened after expiring and requests sent per host since its pool was created"""
+        pools = self.poolmanager.pools
+        stats = []
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                stats.append({
+                    'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                    'connections_opened': pool.num_connections,
+                    'connections_expired': pool.num_expired,
+                    'requests': pool.num_requests
+                })
+        return stats
@@ -0,0 +1,51 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+_lock = threading.Lock()
+_last_ms = 0
+_last_seq = 0
+
+# 74 bits of a UUIDv7 follow the timestamp: 12 in rand_a and 62 in rand_b
+_SEQ_BITS = 74
+_SEQ_MAX = (1 << _SEQ_BITS) - 1
+
+
+def uuid7(unix_ms=None):
+    """Return a UUIDv7 (RFC 9562) string: 48-bit Unix milliseconds followed by random bits
+
+    IDs sort by creation time both as UUIDs and as strings, so new rows
+    land at the end of a primary-key index instead of all over it.
+    Within one process IDs are strictly increasing: the random bits are
+    reseeded each millisecond and incremented for further IDs in the same
+    millisecond (RFC 9562 method 2), and a clock that steps back keeps
+    using the last millisecond seen.
+    """
+    global _last_ms, _last_seq
+    now = time.time_ns() // 1_000_000 if unix_ms is None else unix_ms
+    with _lock:
+        if now > _last_ms:
+            # Leave the top bit clear so increments within the millisecond can't overflow in practice
+            _last_ms, _last_seq = now, int.from_bytes(os.urandom(10), 'big') >> (80 - _SEQ_BITS + 1)
+        elif _last_seq < _SEQ_MAX:
+            _last_seq += 1
+        else:
+            _last_ms, _last_seq = _last_ms + 1, 0
+        unix_ms, seq = _last_ms, _last_seq
+
+    value = (
+        (unix_ms & 0xFFFFFFFFFFFF) << 80
+        | 0x7 << 76
+        | (seq >> 62) << 64
+        | 0b10 << 62
+        | (seq & 0x3FFFFFFFFFFFFFFF)
+    )
+    return str(uuid.UUID(int=value))
+
+
+def new_id_and_timestamp():
+    """Return a UUIDv7 and the local ISO timestamp of the same instant"""
+    now = time.time()
+    return uuid7(int(now * 1000)), datetime.fromtimestamp(now).isoformat()
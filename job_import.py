@@ -0,0 +1,142 @@
+import json
+import os
+from apscheduler.triggers.cron import CronTrigger
+from retry_policy import RetryPolicy
+
+try:
+    import yaml
+except ImportError:
+    # YAML import/export is only offered when PyYAML is installed
+    yaml = None
+
+HTTP_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+# Fields of an imported job; exports add id and created_at, which imports ignore
+IMPORT_FIELDS = ('name', 'url', 'cron_expression', 'method', 'headers', 'payload', 'retry_policy', 'active')
+EXPORT_FIELDS = ('id',) + IMPORT_FIELDS + ('created_at',)
+IGNORED_FIELDS = ('id', 'created_at', 'revision_id', 'last_run', 'last_status')
+
+
+class InvalidJobsError(ValueError):
+    """Raised when an import document has problems; ``errors`` lists every one of them"""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} problem(s) in the imported jobs: " + '; '.join(errors[:5]))
+        self.errors = errors
+
+
+def available_formats():
+    return ('json', 'yaml') if yaml else ('json',)
+
+
+def format_for_filename(filename, default='json'):
+    """Pick the document format from a file extension"""
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext in ('.yaml', '.yml'):
+        return 'yaml'
+    if ext == '.json':
+        return 'json'
+    return default
+
+
+def parse_document(text, fmt='json'):
+    """Parse a JSON or YAML document holding a list of jobs, or {"jobs": [...]}"""
+    if fmt not in available_formats():
+        raise ValueError("YAML import needs PyYAML installed" if fmt == 'yaml' else f"Unknown format: {fmt}")
+    parse_errors = (ValueError, yaml.YAMLError) if yaml else ValueError
+    try:
+        data = yaml.safe_load(text) if fmt == 'yaml' else json.loads(text)
+    except parse_errors as e:
+        raise ValueError(f"Could not parse {fmt.upper()}: {e}")
+    if isinstance(data, dict):
+        data = data.get('jobs')
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of jobs or an object with a 'jobs' list")
+    return data
+
+
+def _validate_job(item):
+    """Return (job spec, problems) for one imported job"""
+    if not isinstance(item, dict):
+        return None, ["not an object"]
+    problems = []
+    unknown = set(item) - set(IMPORT_FIELDS) - set(IGNORED_FIELDS)
+    if unknown:
+        problems.append(f"unknown fields: {', '.join(sorted(unknown))}")
+
+    name = item.get('name')
+    if not isinstance(name, str) or not name.strip():
+        problems.append("name is required")
+    url = item.get('url')
+    if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+        problems.append("url must start with http:// or https://")
+    cron_expression = item.get('cron_expression')
+    if not isinstance(cron_expression, str):
+        problems.append("cron_expression is required")
+    else:
+        try:
+            CronTrigger.from_crontab(cron_expression)
+        except ValueError as e:
+            problems.append(f"invalid cron_expression {cron_expression!r}: {e}")
+    method = item.get('method') or 'GET'
+    if not isinstance(method, str) or method.upper() not in HTTP_METHODS:
+        problems.append(f"method must be one of {', '.join(HTTP_METHODS)}")
+    headers = item.get('headers') or {}
+    if not isinstance(headers, dict) or not all(isinstance(v, (str, int, float)) for v in headers.values()):
+        problems.append("headers must map names to values")
+    payload = item.get('payload')
+    if isinstance(payload, (dict, list)):
+        payload = json.dumps(payload)
+    elif payload is not None and not isinstance(payload, str):
+        problems.append("payload must be a string or a JSON object")
+    retry_policy = item.get('retry_policy')
+    if retry_policy is not None:
+        try:
+            retry_policy = RetryPolicy.from_dict(retry_policy).to_dict()
+        except ValueError as e:
+            problems.append(str(e))
+    active = item.get('active', True)
+    if not isinstance(active, bool):
+        problems.append("active must be true or false")
+
+    if problems:
+        return None, problems
+    return {
+        'name': name.strip(),
+        'url': url,
+        'cron_expression': cron_expression.strip(),
+        'method': method.upper(),
+        'headers': {str(k): str(v) for k, v in headers.items()},
+        'payload': payload or None,
+        'retry_policy': retry_policy,
+        'active': active
+    }, []
+
+
+def validate_jobs(items):
+    """Check every imported job, cron expressions included, before anything is written
+
+    Returns the cleaned job specs, or raises InvalidJobsError listing the
+    problems of every invalid job.
+    """
+    specs, errors = [], []
+    for number, item in enumerate(items, 1):
+        spec, problems = _validate_job(item)
+        label = f"job {number}" + (f" ({item['name']})" if isinstance(item, dict) and item.get('name') else '')
+        errors.extend(f"{label}: {problem}" for problem in problems)
+        specs.append(spec)
+    if not items:
+        errors.append("no jobs to import")
+    if errors:
+        raise InvalidJobsError(errors)
+    return specs
+
+
+def dump_jobs(jobs, fmt='json'):
+    """Serialize Job objects for export; the result can be imported again"""
+    if fmt not in available_formats():
+        raise ValueError("YAML export needs PyYAML installed" if fmt == 'yaml' else f"Unknown format: {fmt}")
+    data = {'jobs': [{field: getattr(job, field) for field in EXPORT_FIELDS} for job in jobs]}
+    if fmt == 'yaml':
+        return yaml.safe_dump(data, sort_keys=False, allow_unicode=True)
+    return json.dumps(data, indent=2)
@@ -1,189 +1,384 @@
-import json
-import os
-import uuid
 from datetime import datetime
+import threading
 import logging
+from write_behind import WriteBehindBuffer
+from job_stats import JobStats
+from rollups import cutoff
+from history_query import MAX_PAGE_SIZE, decode_cursor
+from file_store import FileBackend
+from ids import new_id_and_timestamp, uuid7
+from records import ExecutionRecord, Job, JobRevision
+from job_revisions import DEFAULT_REVISION_CACHE_SIZE, RevisionCache
+from runtime_state import latest_states
+from lock_stripes import DEFAULT_STRIPES, LockStripes
+from retry_policy import RetryPolicy
 
 class JobManager:
-    def __init__(self, jobs_file='data/jobs.json', history_file='data/job_history.json'):
-        self.jobs_file = jobs_file
-        self.history_file = history_file
+    """Facade over a StorageBackend
+    
+    Builds job definitions and execution records, group-commits records
+    through a write-behind buffer and overlays still-queued records on
+    reads; everything that persists is delegated to ``backend``. Without
+    one, the JSON file backend is built from the file arguments.
+    
+    Safe to share between any number of worker and request threads. Every
+    history and runtime state write goes through one commit lock, so the
+    backend only ever sees a single writer per process, and changes to one
+    job serialize on that job's stripe of ``lock_stripes`` locks.
+    """
+    
+    def __init__(self, jobs_file='data/jobs.json', history_file='data/job_history.jsonl',
+                 state_file='data/job_state.db', flush_interval_ms=200, flush_batch_size=100,
+                 history_retention_days=30, rollup_retention_days=None, blob_dir='data/blobs', backend=None,
+                 lock_stripes=DEFAULT_STRIPES, revision_cache_size=DEFAULT_REVISION_CACHE_SIZE):
+        self.history_retention_days = history_retention_days
+        self.rollup_retention_days = rollup_retention_days
         self.logger = logging.getLogger(__name__)
+        self.backend = backend or FileBackend(jobs_file, history_file, state_file, blob_dir)
+        self._commit_lock = threading.Lock()
+        self._job_locks = LockStripes(lock_stripes)
+        self._revisions = RevisionCache(revision_cache_size)
         
-        # Ensure data directory exists
-        os.makedirs(os.path.dirname(jobs_file), exist_ok=True)
-        
-        # Initialize files if they don't exist
-        self._init_files()
-    
-    def _init_files(self):
-        """Initialize JSON files if they don't exist"""
-        if not os.path.exists(self.jobs_file):
-            with open(self.jobs_file, 'w') as f:
-                json.dump([], f)
-        
-        if not os.path.exists(self.history_file):
-            with open(self.history_file, 'w') as f:
-                json.dump([], f)
-    
-    def _load_jobs(self):
-        """Load jobs from JSON file"""
-        try:
-            with open(self.jobs_file, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            self.logger.error(f"Failed to load jobs: {e}")
-            return []
-    
-    def _save_jobs(self, jobs):
-        """Save jobs to JSON file"""
-        try:
-            with open(self.jobs_file, 'w') as f:
-                json.dump(jobs, f, indent=2, default=str)
-        except Exception as e:
-            self.logger.error(f"Failed to save jobs: {e}")
-    
-    def _load_history(self):
-        """Load job execution history from JSON file"""
-        try:
-            with open(self.history_file, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            self.logger.error(f"Failed to load history: {e}")
-            return []
-    
-    def _save_history(self, history):
-        """Save job execution history to JSON file"""
-        try:
-            with open(self.history_file, 'w') as f:
-                json.dump(history, f, indent=2, default=str)
-        except Exception as e:
-            self.logger.error(f"Failed to save history: {e}")
-    
-    def add_job(self, name, url, cron_expression, method='GET', headers=None, payload=None):
+        # Execution records from worker threads are group-committed by a
+        # single flusher; flush_interval_ms=0 writes each record inline
+        self._write_buffer = None
+        if flush_interval_ms:
+            self._write_buffer = WriteBehindBuffer(
+                self._commit, flush_interval_ms, flush_batch_size,
+                name=f'{self.backend.name}-history-writer'
+            )
+    
+    @staticmethod
+    def normalize_retry_policy(retry_policy):
+        """Validate a retry policy dict and fill in its defaults; None (or empty) means no retries"""
+        return RetryPolicy.from_dict(retry_policy).to_dict() if retry_policy else None
+    
+    def add_job(self, name, url, cron_expression, method='GET', headers=None, payload=None, retry_policy=None):
         """Add a new job"""
-        jobs = self._load_jobs()
-        
-        job = {
-            'id': str(uuid.uuid4()),
-            'name': name,
-            'url': url,
-            'cron_expression': cron_expression,
-            'method': method,
-            'headers': headers or {},
-            'payload': payload,
-            'active': True,
-            'created_at': datetime.now().isoformat(),
-            'last_run': None,
-            'last_status': None
-        }
+        job = Job(uuid7(), name, url, cron_expression, method, headers, payload,
+                  active=True, created_at=datetime.now().isoformat(), revision_id=uuid7(),
+                  retry_policy=self.normalize_retry_policy(retry_policy))
+        revision = JobRevision.from_job(job, 1, job.created_at)
         
-        jobs.append(job)
-        self._save_jobs(jobs)
+        self.backend.insert_job(job.definition(), revision)
+        self._revisions.put(revision, current=True)
         
-        self.logger.info(f"Added new job: {name} ({job['id']})")
-        return job['id']
+        self.logger.info(f"Added new job: {name} ({job.id})")
+        return job.id
+    
+    def add_jobs(self, specs):
+        """Add several validated jobs in one transaction; returns the new Job objects"""
+        created_at = datetime.now().isoformat()
+        jobs = [
+            Job(uuid7(), spec['name'], spec['url'], spec['cron_expression'], spec.get('method', 'GET'),
+                spec.get('headers'), spec.get('payload'), active=spec.get('active', True), created_at=created_at,
+                revision_id=uuid7(), retry_policy=self.normalize_retry_policy(spec.get('retry_policy')))
+            for spec in specs
+        ]
+        revisions = [JobRevision.from_job(job, 1, created_at) for job in jobs]
+        
+        self.backend.insert_jobs([job.definition() for job in jobs], revisions)
+        for revision in revisions:
+            self._revisions.put(revision, current=True)
+        
+        self.logger.info(f"Added {len(jobs)} jobs in one batch")
+        return jobs
     
     def get_all_jobs(self):
-        """Get all jobs"""
-        return self._load_jobs()
+        """Get all jobs as Job objects"""
+        jobs = [Job.from_dict(job) for job in self.backend.list_jobs()]
+        pending = self._pending_states()
+        for job in jobs:
+            if job.id in pending:
+                job.set_state(pending[job.id])
+        return jobs
     
     def get_job(self, job_id):
-        """Get a specific job by ID"""
-        jobs = self._load_jobs()
-        for job in jobs:
-            if job['id'] == job_id:
+        """Get a specific job by ID, or None"""
+        job = self.backend.get_job(job_id)
+        if not job:
+            return None
+        job = Job.from_dict(job)
+        pending = self._pending_states()
+        return job.set_state(pending[job_id]) if job_id in pending else job
+    
+    def job_lock(self, job_id):
+        """The lock serializing changes to one job; hold it to read-modify-write a job"""
+        return self._job_locks(job_id)
+    
+    def update_job(self, job_id, **fields):
+        """Change a job's configuration, recording it as a new revision
+        
+        Only Job.REVISION_FIELDS can be changed this way. Returns the
+        updated Job, the unchanged Job if no field actually changed, or None
+        if the job doesn't exist.
+        """
+        unknown = set(fields) - set(Job.REVISION_FIELDS)
+        if unknown:
+            raise ValueError(f"Cannot update job fields: {', '.join(sorted(unknown))}")
+        if 'headers' in fields:
+            fields['headers'] = fields['headers'] or {}
+        if 'retry_policy' in fields:
+            fields['retry_policy'] = self.normalize_retry_policy(fields['retry_policy'])
+        
+        with self.job_lock(job_id):
+            job = self.get_job(job_id)
+            if not job:
+                return None
+            changes = {field: value for field, value in fields.items() if getattr(job, field) != value}
+            if not changes:
                 return job
-        return None
+            
+            current = self.get_revision(job.revision_id)
+            for field, value in changes.items():
+                setattr(job, field, value)
+            job.revision_id = uuid7()
+            revision = JobRevision.from_job(job, (current.number if current else 0) + 1, datetime.now().isoformat())
+            
+            self.backend.update_job(job_id, dict(changes, revision_id=job.revision_id), revision)
+            self._revisions.put(revision, current=True)
+        
+        self.logger.info(f"Updated job {job_id} ({', '.join(changes)}), now at revision {revision.number}")
+        return job
+    
+    def get_revision(self, revision_id):
+        """Get a JobRevision by ID, or None"""
+        if not revision_id:
+            return None
+        return self.get_revisions([revision_id]).get(revision_id)
+    
+    def get_revisions(self, revision_ids):
+        """Map revision IDs to JobRevisions, from the revision cache where possible"""
+        found, missing = {}, []
+        for revision_id in set(revision_ids) - {None}:
+            revision = self._revisions.get(revision_id)
+            if revision is not None:
+                found[revision_id] = revision
+            else:
+                missing.append(revision_id)
+        if missing:
+            for revision_id, revision in self.backend.get_revisions(missing).items():
+                self._revisions.put(revision)
+                found[revision_id] = revision
+        return found
+    
+    def list_revisions(self, job_id):
+        """Every revision of a job, newest first"""
+        return self.backend.list_revisions(job_id)
+    
+    def current_revision_id(self, job_id):
+        """The id of the revision a job is currently at, or None"""
+        revision_id = self._revisions.current(job_id)
+        if revision_id is None:
+            # Under the job's lock so an edit can't land between the read and the cache fill
+            with self.job_lock(job_id):
+                job = self.backend.get_job(job_id)
+                revision_id = job.get('revision_id') if job else None
+                if revision_id:
+                    self._revisions.set_current(job_id, revision_id)
+        return revision_id
+    
+    def compare_revisions(self, job_id):
+        """Execution stats of a job per revision, newest revision first
+        
+        Lets latency and success rate be compared before and after a
+        configuration change. Walks the job's retained history once;
+        executions recorded before revisions existed are grouped under a
+        revision of None at the end.
+        """
+        stats_by_revision = {}
+        for record in self.iter_history(job_id=job_id):
+            stats_by_revision.setdefault(record.revision_id, JobStats()).add(record)
+        
+        comparison = [
+            {'revision': revision.to_dict(), 'stats': stats_by_revision.pop(revision.id, JobStats()).summary()}
+            for revision in self.list_revisions(job_id)
+        ]
+        if None in stats_by_revision:
+            comparison.append({'revision': None, 'stats': stats_by_revision.pop(None).summary()})
+        return comparison
     
     def delete_job(self, job_id):
         """Delete a job"""
-        jobs = self._load_jobs()
-        jobs = [job for job in jobs if job['id'] != job_id]
-        self._save_jobs(jobs)
+        with self.job_lock(job_id):
+            self.backend.delete_job(job_id)
+            self._revisions.forget_job(job_id)
         self.logger.info(f"Deleted job: {job_id}")
     
     def update_job_status(self, job_id, active):
         """Update job active status"""
-        jobs = self._load_jobs()
-        for job in jobs:
-            if job['id'] == job_id:
-                job['active'] = active
-                break
-        self._save_jobs(jobs)
+        with self.job_lock(job_id):
+            self.backend.set_job_active(job_id, active)
         self.logger.info(f"Updated job {job_id} active status to {active}")
     
     def update_job_last_run(self, job_id, status_code, success):
         """Update job last run information"""
-        jobs = self._load_jobs()
-        for job in jobs:
-            if job['id'] == job_id:
-                job['last_run'] = datetime.now().isoformat()
-                job['last_status'] = 'success' if success else 'failed'
-                break
-        self._save_jobs(jobs)
-    
-    def add_execution_history(self, job_id, status_code, execution_time, success, error_message=None, response_content=None):
-        """Add an execution record to history"""
-        history = self._load_history()
-        
-        # Update job last run info
-        self.update_job_last_run(job_id, status_code, success)
-        
-        record = {
-            'id': str(uuid.uuid4()),
-            'job_id': job_id,
-            'timestamp': datetime.now().isoformat(),
-            'status_code': status_code,
-            'execution_time': round(execution_time, 3),
-            'success': success,
-            'error_message': error_message,
-            'response_content': response_content[:1000] if response_content else None  # Limit to 1000 chars
+        state = {
+            'last_run': datetime.now().isoformat(),
+            'last_status': 'success' if success else 'failed'
         }
+        with self.job_lock(job_id), self._commit_lock:
+            self.backend.set_state(job_id, state)
+    
+    def claim_run(self, job_id, fire_time):
+        """Claim one cron firing of a job, keyed on its scheduled time as UTC ISO; False if another process
+        sharing the store already has"""
+        return self.backend.claim_run(job_id, fire_time)
+    
+    def record_execution(self, job_id, status_code, execution_time, success, error_message=None, response_content=None,
+                         revision_id=None, attempt=1, retry_of=None, short_circuited=False):
+        """Record an execution: append the history row and update the job's last run together
         
-        history.append(record)
+        Pass the revision_id of the job configuration that was run; without
+        it the record is linked to the job's current revision. A retry passes
+        its attempt number and the id of the first attempt as ``retry_of``.
+        A run skipped by an open circuit breaker passes ``short_circuited``.
+        Returns the new record's id.
+        """
+        if revision_id is None:
+            revision_id = self.current_revision_id(job_id)
         
-        # Keep only the last 1000 records to prevent file from growing too large
-        if len(history) > 1000:
-            history = history[-1000:]
+        response_hash, response_size = None, None
+        if response_content:
+            # Limit to 1000 chars
+            response_hash, response_size = self.backend.put_blob(response_content[:1000])
         
-        self._save_history(history)
+        # The id and timestamp come from the same instant, so new records sort
+        # the same way by id as by (timestamp, id)
+        record_id, timestamp = new_id_and_timestamp()
+        record = ExecutionRecord(record_id, job_id, timestamp, status_code, round(execution_time, 3), success,
+                                 error_message, response_hash, response_size, revision_id, attempt, retry_of,
+                                 short_circuited)
+        
+        if self._write_buffer:
+            self._write_buffer.submit(record)
+        else:
+            self._commit([record])
         self.logger.debug(f"Added execution history for job {job_id}")
+        return record_id
+    
+    def add_execution_history(self, job_id, status_code, execution_time, success, error_message=None, response_content=None):
+        """Add an execution record to history"""
+        return self.record_execution(job_id, status_code, execution_time, success, error_message, response_content)
+    
+    def _commit(self, records):
+        """The single path by which execution records reach the backend"""
+        with self._commit_lock:
+            self.backend.append_records(records)
+    
+    def _pending_records(self):
+        """Execution records queued in the write-behind buffer, oldest first"""
+        return self._write_buffer.pending() if self._write_buffer else []
+    
+    def _pending_states(self):
+        return latest_states(self._pending_records())
+    
+    def _read_with_pending(self, read_fn):
+        """Call read_fn(pending records) so that no record is both stored and pending"""
+        if not self._write_buffer:
+            return read_fn([])
+        return self._write_buffer.read_settled(read_fn)
+    
+    def flush(self):
+        """Commit queued execution records now"""
+        if self._write_buffer:
+            self._write_buffer.flush()
+    
+    def get_write_metrics(self):
+        """Queue depth and flush latency of the write-behind buffer"""
+        if not self._write_buffer:
+            return {'enabled': False, 'backend': self.backend.name}
+        return dict(self._write_buffer.metrics(), enabled=True, backend=self.backend.name)
     
     def get_job_history(self, limit=100):
         """Get job execution history"""
-        history = self._load_history()
-        # Return most recent entries first
-        history.reverse()
-        return history[:limit]
+        # Queued records are newer than anything stored; a record can show up
+        # in both while its batch is being committed, so skip repeats by id
+        pending = self._pending_records()[::-1][:limit]
+        seen = {record.id for record in pending}
+        flushed = [r for r in self.backend.tail(limit) if r.id not in seen]
+        return (pending + flushed)[:limit]
+    
+    def query_history(self, job_id=None, success=None, since=None, until=None, limit=50, cursor=None):
+        """Page through history, most recent first, with optional filters
+        
+        Returns {'records', 'next_cursor', 'prev_cursor'}; pass either cursor
+        back to get the older or newer page. Raises ValueError for a bad cursor.
+        """
+        cursor = decode_cursor(cursor) if cursor else None
+        self.flush()
+        return self.backend.query_history(
+            limit, cursor, job_id=job_id, success=success, since=since, until=until
+        )
+    
+    def iter_history(self, job_id=None, success=None, since=None, until=None, page_size=MAX_PAGE_SIZE):
+        """Yield every matching record, most recent first
+        
+        Records are fetched one keyset page at a time, so memory stays flat
+        however many match. Records committed after the first page is read
+        are newer than the walk and are not included.
+        """
+        self.flush()
+        cursor = None
+        while True:
+            page = self.backend.query_history(
+                page_size, cursor, job_id=job_id, success=success, since=since, until=until
+            )
+            yield from page['records']
+            if not page['next_cursor']:
+                return
+            cursor = decode_cursor(page['next_cursor'])
+    
+    def get_job_names(self, job_ids):
+        """Map the given job IDs to job names"""
+        return self.backend.get_job_names(job_ids)
     
     def clear_history(self):
         """Clear all execution history"""
-        self._save_history([])
+        self.flush()
+        with self._commit_lock:
+            self.backend.clear_history()
         self.logger.info("Cleared job execution history")
     
+    def expire_history(self, now=None):
+        """Drop raw history past its retention and rollups past theirs"""
+        self.flush()
+        with self._commit_lock:
+            return self.backend.expire_history(
+                cutoff(self.history_retention_days, now), self.rollup_retention_days, now
+            )
+    
+    def get_response_content(self, response_hash):
+        """Load a stored response body by its content hash"""
+        return self.backend.get_blob(response_hash)
+    
+    def get_job_rollups(self, job_id, granularity='hour', since=None, until=None):
+        """Minute, hour or day rollups for a job, oldest first"""
+        return self.backend.get_rollups(job_id, granularity, since, until)
+    
+    def close(self):
+        """Flush queued records and release the backend"""
+        if self._write_buffer:
+            self._write_buffer.close()
+        self.backend.close()
+    
     def get_job_stats(self, job_id):
         """Get statistics for a specific job"""
-        history = self._load_history()
-        job_history = [record for record in history if record['job_id'] == job_id]
-        
-        if not job_history:
-            return {
-                'total_executions': 0,
-                'successful_executions': 0,
-                'failed_executions': 0,
-                'success_rate': 0,
-                'average_execution_time': 0
-            }
-        
-        successful = len([r for r in job_history if r['success']])
-        total = len(job_history)
-        avg_time = sum(r['execution_time'] for r in job_history) / total
-        
-        return {
-            'total_executions': total,
-            'successful_executions': successful,
-            'failed_executions': total - successful,
-            'success_rate': round((successful / total) * 100, 1),
-            'average_execution_time': round(avg_time, 3)
-        }
+        # Running aggregates are kept up to date on every commit, so this is
+        # one row lookup plus whatever is still queued for this job
+        def read(pending):
+            stats = self.backend.get_stats(job_id)
+            for record in pending:
+                if record.job_id == job_id:
+                    stats.add(record)
+            return stats
+        return self._read_with_pending(read).summary()
+    
+    def get_all_job_stats(self):
+        """Get statistics for every job that has run, keyed by job ID"""
+        def read(pending):
+            stats_by_job = self.backend.get_all_stats()
+            for record in pending:
+                stats_by_job.setdefault(record.job_id, JobStats()).add(record)
+            return stats_by_job
+        return {job_id: stats.summary() for job_id, stats in self._read_with_pending(read).items()}
@@ -0,0 +1,172 @@
+import json
+import threading
+import logging
+from collections import OrderedDict
+from records import JobRevision
+from sqlite_conn import ThreadConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_revisions (
+    id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    created_at TEXT,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    cron_expression TEXT NOT NULL,
+    method TEXT NOT NULL DEFAULT 'GET',
+    headers TEXT,
+    payload TEXT,
+    retry_policy TEXT
+) WITHOUT ROWID;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_job_revisions_job_number ON job_revisions (job_id, number);
+"""
+
+REVISION_COLUMNS = ', '.join(JobRevision.__slots__)
+
+# Revisions kept in JobManager's cache; enough for every job on a dashboard plus recent history pages
+DEFAULT_REVISION_CACHE_SIZE = 1024
+
+
+class RevisionStore:
+    """Immutable job revisions in SQLite
+
+    Rows are only ever inserted: editing a job adds a revision and points
+    the job at it. Pass ``connect`` to share a connection (and
+    transactions) with another SQLite store; otherwise the store opens its
+    own database at ``db_file``.
+    """
+
+    def __init__(self, db_file=None, connect=None):
+        self.logger = logging.getLogger(__name__)
+        self._owns_connection = connect is None
+        self._connect = connect or ThreadConnections(db_file)
+        self._migrate_columns()
+        self._connect().executescript(SCHEMA)
+
+    def _migrate_columns(self):
+        """Add retry_policy to revision tables created by older versions"""
+        conn = self._connect()
+        columns = [row['name'] for row in conn.execute("PRAGMA table_info(job_revisions)")]
+        if columns and 'retry_policy' not in columns:
+            with conn:
+                conn.execute("ALTER TABLE job_revisions ADD COLUMN retry_policy TEXT")
+
+    @staticmethod
+    def _to_row(revision):
+        return (revision.id, revision.job_id, revision.number, revision.created_at, revision.name, revision.url,
+                revision.cron_expression, revision.method, json.dumps(revision.headers or {}), revision.payload,
+                json.dumps(revision.retry_policy) if revision.retry_policy else None)
+
+    @staticmethod
+    def _from_row(row):
+        revision = JobRevision(*row)
+        revision.headers = json.loads(row['headers']) if row['headers'] else {}
+        revision.retry_policy = json.loads(row['retry_policy']) if row['retry_policy'] else None
+        return revision
+
+    def add_many(self, revisions, commit=True):
+        """Insert revisions; with commit=False the statements join the caller's open transaction"""
+        conn = self._connect()
+        rows = [self._to_row(revision) for revision in revisions]
+        sql = f"INSERT INTO job_revisions ({REVISION_COLUMNS}) VALUES ({', '.join('?' * len(JobRevision.__slots__))})"
+        if commit:
+            with conn:
+                conn.executemany(sql, rows)
+        else:
+            conn.executemany(sql, rows)
+
+    def get_many(self, revision_ids):
+        """Map the given revision IDs to JobRevisions, skipping unknown IDs"""
+        revision_ids = list(set(revision_ids))
+        if not revision_ids:
+            return {}
+        rows = self._connect().execute(
+            f"SELECT {REVISION_COLUMNS} FROM job_revisions WHERE id IN ({', '.join('?' * len(revision_ids))})",
+            revision_ids
+        ).fetchall()
+        return {row['id']: self._from_row(row) for row in rows}
+
+    def list(self, job_id):
+        """Every revision of a job, newest first"""
+        rows = self._connect().execute(
+            f"SELECT {REVISION_COLUMNS} FROM job_revisions WHERE job_id = ? ORDER BY number DESC", (job_id,)
+        ).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def last_numbers(self, job_ids):
+        """Map job IDs to their highest revision number, skipping jobs without revisions"""
+        job_ids = list(set(job_ids))
+        if not job_ids:
+            return {}
+        rows = self._connect().execute(
+            f"SELECT job_id, max(number) AS number FROM job_revisions "
+            f"WHERE job_id IN ({', '.join('?' * len(job_ids))}) GROUP BY job_id",
+            job_ids
+        ).fetchall()
+        return {row['job_id']: row['number'] for row in rows}
+
+    def missing_revisions(self, jobs, new_id):
+        """Initial revisions for jobs whose revision_id is unset or not stored
+
+        Used to migrate jobs created before revisions existed. A job that
+        already names a revision keeps that id, so history rows pointing at
+        it stay linked.
+        """
+        known = self.get_many(job['revision_id'] for job in jobs if job.get('revision_id'))
+        missing = [job for job in jobs if job.get('revision_id') not in known]
+        numbers = self.last_numbers(job['id'] for job in missing)
+        revisions = []
+        for job in missing:
+            job['revision_id'] = job.get('revision_id') or new_id()
+            revisions.append(JobRevision.from_job(job, numbers.get(job['id'], 0) + 1, job.get('created_at')))
+        return revisions
+
+    def close(self):
+        if self._owns_connection:
+            self._connect.close()
+
+
+class RevisionCache:
+    """Small LRU of revisions by id plus each job's current revision id
+
+    Revisions never change once stored, so a cached revision never goes
+    stale; only the job -> current revision mapping has to be updated when
+    a job is edited or deleted.
+    """
+
+    def __init__(self, maxsize=DEFAULT_REVISION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._revisions = OrderedDict()
+        self._current = {}
+
+    def get(self, revision_id):
+        with self._lock:
+            revision = self._revisions.get(revision_id)
+            if revision is not None:
+                self._revisions.move_to_end(revision_id)
+            return revision
+
+    def put(self, revision, current=False):
+        with self._lock:
+            self._revisions[revision.id] = revision
+            self._revisions.move_to_end(revision.id)
+            while len(self._revisions) > self.maxsize:
+                self._revisions.popitem(last=False)
+            if current:
+                self._current[revision.job_id] = revision.id
+
+    def current(self, job_id):
+        """The current revision id of a job, or None if it isn't known yet"""
+        with self._lock:
+            return self._current.get(job_id)
+
+    def set_current(self, job_id, revision_id):
+        with self._lock:
+            self._current[job_id] = revision_id
+
+    def forget_job(self, job_id):
+        with self._lock:
+            self._current.pop(job_id, None)
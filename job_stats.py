@@ -0,0 +1,154 @@
+import math
+
+# Relative accuracy of the latency sketch: quantiles are within 2% of the true value
+SKETCH_ACCURACY = 0.02
+# Latencies below this (in seconds) share the lowest bucket
+SKETCH_MIN_VALUE = 0.001
+# Number of most recent outcomes kept for the recent failure count
+RECENT_WINDOW = 20
+
+
+class LatencySketch:
+    """Log-bucketed latency histogram with bounded relative error
+
+    Each value lands in bucket ceil(log(v) / log(gamma)), so a quantile is
+    reported within SKETCH_ACCURACY of the true value regardless of how
+    many values were added. Two sketches merge by adding bucket counts,
+    which makes them usable for rollups as well as per-job totals.
+    """
+
+    __slots__ = ('buckets', 'count')
+
+    _gamma = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+    _log_gamma = math.log(_gamma)
+
+    def __init__(self, buckets=None, count=0):
+        self.buckets = buckets if buckets is not None else {}
+        self.count = count
+
+    def _index(self, value):
+        return math.ceil(math.log(max(value, SKETCH_MIN_VALUE)) / self._log_gamma)
+
+    def add(self, value, count=1):
+        index = self._index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """Return the approximate q-quantile (0 <= q <= 1), or 0 if empty"""
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i]
+                return 2 * self._gamma ** index / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.buckets) / (self._gamma + 1)
+
+    def to_dict(self):
+        return {'b': {str(index): count for index, count in self.buckets.items()}, 'n': self.count}
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        return cls({int(index): count for index, count in data['b'].items()}, data['n'])
+
+
+class JobStats:
+    """Running execution aggregates for one job, updated one record at a time"""
+
+    __slots__ = ('total', 'successful', 'total_time', 'min_time', 'max_time',
+                 'failure_streak', 'recent', 'sketch')
+
+    def __init__(self):
+        self.total = 0
+        self.successful = 0
+        self.total_time = 0.0
+        self.min_time = None
+        self.max_time = None
+        self.failure_streak = 0
+        self.recent = ''
+        self.sketch = LatencySketch()
+
+    def add(self, record):
+        """Fold one execution record into the aggregates; runs skipped by a circuit breaker don't count"""
+        if record.short_circuited:
+            return self
+        execution_time = record.execution_time or 0.0
+        self.total += 1
+        self.total_time += execution_time
+        self.min_time = execution_time if self.min_time is None else min(self.min_time, execution_time)
+        self.max_time = execution_time if self.max_time is None else max(self.max_time, execution_time)
+        self.sketch.add(execution_time)
+
+        if record.success:
+            self.successful += 1
+            self.failure_streak = 0
+        else:
+            self.failure_streak += 1
+        self.recent = (self.recent + ('S' if record.success else 'F'))[-RECENT_WINDOW:]
+        return self
+
+    def summary(self):
+        """Stats in the shape returned by JobManager.get_job_stats"""
+        if not self.total:
+            return {
+                'total_executions': 0,
+                'successful_executions': 0,
+                'failed_executions': 0,
+                'success_rate': 0,
+                'average_execution_time': 0,
+                'p50_execution_time': 0,
+                'p95_execution_time': 0,
+                'p99_execution_time': 0,
+                'failure_streak': 0,
+                'recent_failures': 0
+            }
+
+        return {
+            'total_executions': self.total,
+            'successful_executions': self.successful,
+            'failed_executions': self.total - self.successful,
+            'success_rate': round((self.successful / self.total) * 100, 1),
+            'average_execution_time': round(self.total_time / self.total, 3),
+            'p50_execution_time': round(self.sketch.quantile(0.50), 3),
+            'p95_execution_time': round(self.sketch.quantile(0.95), 3),
+            'p99_execution_time': round(self.sketch.quantile(0.99), 3),
+            'failure_streak': self.failure_streak,
+            'recent_failures': self.recent.count('F')
+        }
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'successful': self.successful,
+            'total_time': self.total_time,
+            'min_time': self.min_time,
+            'max_time': self.max_time,
+            'failure_streak': self.failure_streak,
+            'recent': self.recent,
+            'sketch': self.sketch.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        if data:
+            stats.total = data['total']
+            stats.successful = data['successful']
+            stats.total_time = data['total_time']
+            stats.min_time = data.get('min_time')
+            stats.max_time = data.get('max_time')
+            stats.failure_streak = data.get('failure_streak', 0)
+            stats.recent = data.get('recent', '')
+            stats.sketch = LatencySketch.from_dict(data.get('sketch'))
+        return stats
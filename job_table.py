@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+import logging
+from atomic_file import atomic_write_json
+
+# Journal entries replayed at most on startup before a new snapshot is written
+DEFAULT_SNAPSHOT_EVERY = 100
+
+logger = logging.getLogger(__name__)
+
+
+def journal_path_for(snapshot_path):
+    return os.path.splitext(snapshot_path)[0] + '.journal.jsonl'
+
+
+def apply_entry(jobs, entry):
+    """Apply one journal entry to a {job_id: job} dict"""
+    op = entry['op']
+    if op == 'put':
+        jobs[entry['job']['id']] = entry['job']
+    elif op == 'put_many':
+        jobs.update((job['id'], job) for job in entry['jobs'])
+    elif op == 'update':
+        if entry['id'] in jobs:
+            jobs[entry['id']] = dict(jobs[entry['id']], **entry['fields'])
+    elif op == 'delete':
+        jobs.pop(entry['id'], None)
+    else:
+        raise ValueError(f"Unknown journal op: {op}")
+
+
+def read_table(snapshot_path, journal_path=None, repair=False):
+    """Load a snapshot and replay its journal, returning ({job_id: job}, journal entries replayed)
+
+    Raises ValueError if the snapshot is unreadable. With ``repair`` a torn
+    final journal entry is truncated away so the next append starts clean.
+    """
+    journal_path = journal_path or journal_path_for(snapshot_path)
+    try:
+        with open(snapshot_path, 'r') as f:
+            jobs = {job['id']: job for job in json.load(f)}
+    except FileNotFoundError:
+        jobs = {}
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Unreadable jobs snapshot {snapshot_path}: {e}")
+
+    entries = 0
+    try:
+        with open(journal_path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return jobs, entries
+
+    offset = 0
+    for line in data.splitlines(keepends=True):
+        try:
+            apply_entry(jobs, json.loads(line))
+            entries += 1
+        except (ValueError, KeyError, TypeError):
+            if offset + len(line) >= len(data):
+                # A torn final entry from a crash mid-append
+                logger.warning(f"Dropping torn entry at the end of {journal_path}")
+                if repair:
+                    with open(journal_path, 'r+b') as f:
+                        f.truncate(offset)
+                        os.fsync(f.fileno())
+                break
+            logger.error(f"Skipping unreadable entry at byte {offset} of {journal_path}")
+        offset += len(line)
+    return jobs, entries
+
+
+class JobTable:
+    """Job definitions persisted as a JSON snapshot plus an append-only mutation journal
+
+    The snapshot (``jobs.json``) is only ever replaced atomically, and each
+    mutation is appended and fsynced to the journal (``jobs.journal.jsonl``)
+    before it is applied in memory, so a crash can lose at most the
+    mutation being written. Loading replays the journal over the snapshot;
+    every ``snapshot_every`` mutations the table is folded into a fresh
+    snapshot and the journal is truncated, which bounds replay on startup.
+    Journal entries are idempotent, so replaying one that already made it
+    into the snapshot is harmless.
+    """
+
+    def __init__(self, snapshot_path, journal_path=None, snapshot_every=DEFAULT_SNAPSHOT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or journal_path_for(snapshot_path)
+        self.snapshot_every = snapshot_every
+        self._lock = threading.RLock()
+        self._jobs = {}
+        self._journal_entries = 0
+        self._stamp = None
+        # Bumped on every change, including reloads after an external edit
+        self.version = 0
+
+        if not os.path.exists(self.snapshot_path):
+            atomic_write_json(self.snapshot_path, [])
+        self._jobs, self._journal_entries = read_table(self.snapshot_path, self.journal_path, repair=True)
+        self._stamp = self._disk_stamp()
+        if self._journal_entries:
+            self.snapshot()
+
+    def _disk_stamp(self):
+        stamp = []
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    @staticmethod
+    def _copy(job):
+        """Copy a job so callers can't mutate the table"""
+        job = dict(job)
+        job['headers'] = dict(job.get('headers') or {})
+        return job
+
+    def _refresh(self):
+        """Pick up edits made to the files by someone else since we last read or wrote them"""
+        stamp = self._disk_stamp()
+        if stamp == self._stamp:
+            return
+        try:
+            self._jobs, self._journal_entries = read_table(self.snapshot_path, self.journal_path, repair=True)
+            self.version += 1
+        except ValueError as e:
+            # Keep serving the last good table rather than an empty one
+            logger.error(f"Failed to reload jobs: {e}")
+        self._stamp = self._disk_stamp()
+
+    def list(self):
+        """Return copies of every job, in insertion order"""
+        with self._lock:
+            self._refresh()
+            return [self._copy(job) for job in self._jobs.values()]
+
+    def get(self, job_id):
+        with self._lock:
+            self._refresh()
+            job = self._jobs.get(job_id)
+            return self._copy(job) if job else None
+
+    def names(self, job_ids):
+        with self._lock:
+            self._refresh()
+            return {job_id: self._jobs[job_id]['name'] for job_id in set(job_ids) if job_id in self._jobs}
+
+    def put(self, job):
+        """Add a job, or replace the job with the same id"""
+        self._write({'op': 'put', 'job': job})
+
+    def put_many(self, jobs):
+        """Add or replace several jobs with a single journal entry, so a crash keeps all or none"""
+        self._write({'op': 'put_many', 'jobs': list(jobs)})
+
+    def update(self, job_id, **fields):
+        self._write({'op': 'update', 'id': job_id, 'fields': fields})
+
+    def delete(self, job_id):
+        self._write({'op': 'delete', 'id': job_id})
+
+    def _write(self, entry):
+        line = json.dumps(entry, separators=(',', ':'), default=str) + '\n'
+        with self._lock:
+            self._refresh()
+            with open(self.journal_path, 'a') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            apply_entry(self._jobs, json.loads(line))
+            self._journal_entries += 1
+            self.version += 1
+            if self._journal_entries >= self.snapshot_every:
+                self.snapshot()
+            self._stamp = self._disk_stamp()
+
+    def replace_all(self, jobs):
+        """Replace the whole table with a fresh snapshot"""
+        with self._lock:
+            self._jobs = {job['id']: dict(job) for job in jobs}
+            self.version += 1
+            self.snapshot()
+
+    def snapshot(self):
+        """Fold the journal into a new snapshot and truncate it"""
+        with self._lock:
+            atomic_write_json(self.snapshot_path, list(self._jobs.values()), indent=2)
+            # Once the snapshot is durable the journal is redundant; if we crash
+            # before truncating it, replaying it again is harmless
+            with open(self.journal_path, 'w') as f:
+                os.fsync(f.fileno())
+            self._journal_entries = 0
+            self._stamp = self._disk_stamp()
+
+    def close(self):
+        """Fold any journal entries into the snapshot so the next start has nothing to replay"""
+        with self._lock:
+            if self._journal_entries:
+                self.snapshot()
@@ -0,0 +1,19 @@
+import threading
+
+DEFAULT_STRIPES = 64
+
+
+class LockStripes:
+    """A fixed set of re-entrant locks shared out by key hash
+
+    Mutations of the same key always take the same lock, while mutations
+    of different keys mostly take different ones, so any number of keys
+    costs ``stripes`` locks and unrelated keys rarely wait on each other.
+    """
+
+    def __init__(self, stripes=DEFAULT_STRIPES):
+        self._locks = [threading.RLock() for _ in range(stripes)]
+
+    def __call__(self, key):
+        """Return the lock guarding key"""
+        return self._locks[hash(key) % len(self._locks)]
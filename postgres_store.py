@@ -0,0 +1,711 @@
+import json
+import os
+import socket
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import logging
+import psycopg2
+from psycopg2 import extensions, pool
+from psycopg2.extras import Json, RealDictCursor, execute_batch
+from history_log import HistoryLog
+from job_table import read_table
+from job_stats import JobStats, LatencySketch
+from rollups import DEFAULT_ROLLUP_RETENTION_DAYS, GRANULARITIES, RollupBucket, cutoff, rollup_records
+from blob_store import SWEEP_GRACE_SECONDS, FileBlobStore, content_hash
+from history_query import build_page, normalize_limit
+from storage_backend import StorageBackend
+from job_manager import JobManager
+from runtime_state import latest_states
+from records import ExecutionRecord, Job, JobRevision
+from ids import uuid7
+
+# Advisory lock keys: (namespace, key) pairs so they can't clash with other users of the database
+SCHEMA_LOCK = (0x4A4D, 0)
+JOB_LOCK_NAMESPACE = 0x4A4E
+
+# Bump when SCHEMA changes; DDL only runs against databases at an older version, so a process
+# starting up never takes table locks that could deadlock with another process's writes
+SCHEMA_VERSION = 5
+
+# Run claims older than this are dropped by expire_history
+CLAIM_RETENTION_DAYS = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    cron_expression TEXT NOT NULL,
+    method TEXT NOT NULL DEFAULT 'GET',
+    headers JSONB NOT NULL DEFAULT '{}',
+    payload TEXT,
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TEXT,
+    revision_id TEXT,
+    retry_policy JSONB
+);
+
+CREATE TABLE IF NOT EXISTS job_revisions (
+    id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    created_at TEXT,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    cron_expression TEXT NOT NULL,
+    method TEXT NOT NULL DEFAULT 'GET',
+    headers JSONB NOT NULL DEFAULT '{}',
+    payload TEXT,
+    retry_policy JSONB
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_job_revisions_job_number ON job_revisions (job_id, number);
+
+CREATE TABLE IF NOT EXISTS job_state (
+    job_id TEXT PRIMARY KEY,
+    last_run TEXT,
+    last_status TEXT
+);
+
+CREATE TABLE IF NOT EXISTS job_stats (
+    job_id TEXT PRIMARY KEY,
+    data JSONB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS job_rollups (
+    job_id TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    latency_sum DOUBLE PRECISION NOT NULL,
+    sketch JSONB NOT NULL,
+    PRIMARY KEY (job_id, granularity, bucket_start)
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_rollups_expiry ON job_rollups (granularity, bucket_start);
+
+CREATE TABLE IF NOT EXISTS job_claims (
+    job_id TEXT NOT NULL,
+    fire_time TEXT NOT NULL,
+    claimed_by TEXT NOT NULL,
+    PRIMARY KEY (job_id, fire_time)
+);
+
+CREATE TABLE IF NOT EXISTS history (
+    id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status_code INTEGER,
+    execution_time DOUBLE PRECISION,
+    success BOOLEAN NOT NULL,
+    error_message TEXT,
+    response_hash TEXT,
+    response_size INTEGER,
+    revision_id TEXT,
+    attempt INTEGER NOT NULL DEFAULT 1,
+    retry_of TEXT,
+    short_circuited BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+-- Added in schema version 2
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS revision_id TEXT;
+ALTER TABLE history ADD COLUMN IF NOT EXISTS revision_id TEXT;
+
+-- Added in schema version 3
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS retry_policy JSONB;
+ALTER TABLE job_revisions ADD COLUMN IF NOT EXISTS retry_policy JSONB;
+ALTER TABLE history ADD COLUMN IF NOT EXISTS attempt INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE history ADD COLUMN IF NOT EXISTS retry_of TEXT;
+
+-- Added in schema version 5
+ALTER TABLE history ADD COLUMN IF NOT EXISTS short_circuited BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_history_job_ts_id ON history (job_id, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_history_ts_id ON history (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_history_response_hash ON history (response_hash) WHERE response_hash IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS response_blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored_at DOUBLE PRECISION NOT NULL,
+    data BYTEA NOT NULL
+);
+
+-- Added in schema version 4: one-time steps that have run, e.g. the JSON import
+CREATE TABLE IF NOT EXISTS store_metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+JOB_COLUMNS = ', '.join(Job.DEFINITION_FIELDS)
+JOB_INSERT = f"INSERT INTO jobs ({JOB_COLUMNS}) VALUES ({', '.join(['%s'] * len(Job.DEFINITION_FIELDS))})"
+REVISION_COLUMNS = ', '.join(JobRevision.__slots__)
+REVISION_INSERT = f"INSERT INTO job_revisions ({REVISION_COLUMNS}) VALUES ({', '.join(['%s'] * len(JobRevision.__slots__))})"
+HISTORY_COLUMNS = ', '.join(ExecutionRecord.ROW_FIELDS)
+HISTORY_INSERT = f"INSERT INTO history ({HISTORY_COLUMNS}) VALUES ({', '.join(['%s'] * len(ExecutionRecord.ROW_FIELDS))})"
+
+# Statements run on every execution or page view, prepared once per connection
+STATEMENTS = {
+    'get_job': f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = $1",
+    'get_state': "SELECT last_run, last_status FROM job_state WHERE job_id = $1",
+    'insert_history': (
+        f"INSERT INTO history ({HISTORY_COLUMNS}) "
+        f"VALUES ({', '.join(f'${n}' for n in range(1, len(ExecutionRecord.ROW_FIELDS) + 1))})"
+    ),
+    'upsert_state': (
+        "INSERT INTO job_state (job_id, last_run, last_status) VALUES ($1, $2, $3) "
+        "ON CONFLICT (job_id) DO UPDATE SET last_run = excluded.last_run, last_status = excluded.last_status "
+        "WHERE job_state.last_run IS NULL OR job_state.last_run <= excluded.last_run"
+    ),
+    'lock_job': f"SELECT pg_advisory_xact_lock({JOB_LOCK_NAMESPACE}, hashtext($1))",
+    'get_stats': "SELECT data FROM job_stats WHERE job_id = $1",
+    'upsert_stats': (
+        "INSERT INTO job_stats (job_id, data) VALUES ($1, $2) "
+        "ON CONFLICT (job_id) DO UPDATE SET data = excluded.data"
+    ),
+    'get_rollup': (
+        "SELECT count, failures, latency_sum, sketch FROM job_rollups "
+        "WHERE job_id = $1 AND granularity = $2 AND bucket_start = $3"
+    ),
+    'upsert_rollup': (
+        "INSERT INTO job_rollups (job_id, granularity, bucket_start, count, failures, latency_sum, sketch) "
+        "VALUES ($1, $2, $3, $4, $5, $6, $7) ON CONFLICT (job_id, granularity, bucket_start) DO UPDATE SET "
+        "count = excluded.count, failures = excluded.failures, latency_sum = excluded.latency_sum, sketch = excluded.sketch"
+    ),
+    'claim_run': (
+        "INSERT INTO job_claims (job_id, fire_time, claimed_by) VALUES ($1, $2, $3) ON CONFLICT DO NOTHING"
+    ),
+    'touch_blob': "UPDATE response_blobs SET stored_at = $2 WHERE hash = $1",
+    'insert_blob': (
+        "INSERT INTO response_blobs (hash, size, stored_at, data) VALUES ($1, $2, $3, $4) "
+        "ON CONFLICT (hash) DO UPDATE SET stored_at = excluded.stored_at"
+    ),
+    'get_blob': "SELECT data FROM response_blobs WHERE hash = $1"
+}
+
+
+class PreparedConnection(extensions.connection):
+    """Connection that remembers which of STATEMENTS it has prepared"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of Postgres connections
+
+    At most ``maxconn`` connections are open at once; callers beyond that
+    wait for a connection to be returned instead of failing. Broken
+    connections are discarded rather than handed out again.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10):
+        self._pool = pool.ThreadedConnectionPool(
+            minconn, maxconn, dsn, connection_factory=PreparedConnection, cursor_factory=RealDictCursor
+        )
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    @contextmanager
+    def cursor(self):
+        """Yield a cursor for one transaction, committed on success and rolled back on error"""
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._pool.getconn()
+            try:
+                with conn:
+                    with conn.cursor() as cur:
+                        yield cur
+            except Exception:
+                self._reset_prepared(conn)
+                raise
+        finally:
+            if conn is not None:
+                self._pool.putconn(conn, close=bool(conn.closed))
+            self._slots.release()
+
+    @staticmethod
+    def _reset_prepared(conn):
+        """Forget prepared statements after a failed transaction so none are assumed to exist"""
+        conn.prepared.clear()
+        if conn.closed:
+            return
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute("DEALLOCATE ALL")
+        except psycopg2.Error:
+            conn.close()
+
+    def close(self):
+        self._pool.closeall()
+
+
+def execute_prepared(cur, name, params=()):
+    """Run one of STATEMENTS, preparing it on the cursor's connection the first time"""
+    _prepare(cur, name)
+    cur.execute(_execute_sql(name, len(params)), params)
+
+
+def execute_prepared_batch(cur, name, rows, page_size=100):
+    """Run one of STATEMENTS for many parameter rows in a few round trips"""
+    if rows:
+        _prepare(cur, name)
+        execute_batch(cur, _execute_sql(name, len(rows[0])), rows, page_size=page_size)
+
+
+def _prepare(cur, name):
+    if name not in cur.connection.prepared:
+        cur.execute(f"PREPARE {name} AS {STATEMENTS[name]}")
+        cur.connection.prepared.add(name)
+
+
+def _execute_sql(name, arity):
+    return f"EXECUTE {name} ({', '.join(['%s'] * arity)})" if arity else f"EXECUTE {name}"
+
+
+class PostgresBlobStore:
+    """Content-addressed, zlib-compressed response bodies in a Postgres table"""
+
+    def __init__(self, pool):
+        self.logger = logging.getLogger(__name__)
+        self._pool = pool
+
+    def put(self, content, cur=None):
+        """Store a body and return (hash, size in bytes); pass cur to join an open transaction"""
+        if cur is None:
+            with self._pool.cursor() as cur:
+                return self.put(content, cur)
+        data = content.encode('utf-8')
+        digest = content_hash(data)
+        execute_prepared(cur, 'touch_blob', (digest, time.time()))
+        if not cur.rowcount:
+            execute_prepared(cur, 'insert_blob', (digest, len(data), time.time(), zlib.compress(data)))
+        return digest, len(data)
+
+    def get(self, digest):
+        """Return a stored body, or None if it is unknown"""
+        with self._pool.cursor() as cur:
+            execute_prepared(cur, 'get_blob', (digest,))
+            row = cur.fetchone()
+        return zlib.decompress(bytes(row['data'])).decode('utf-8') if row else None
+
+    def sweep(self, cur):
+        """Delete bodies no longer referenced by any history row"""
+        cur.execute(
+            "DELETE FROM response_blobs b WHERE stored_at < %s AND NOT EXISTS "
+            "(SELECT 1 FROM history h WHERE h.response_hash = b.hash)",
+            (time.time() - SWEEP_GRACE_SECONDS,)
+        )
+        removed = cur.rowcount
+        if removed:
+            self.logger.info(f"Removed {removed} unreferenced response bodies")
+        return removed
+
+
+class PostgresBackend(StorageBackend):
+    """Storage backend on PostgreSQL that several processes can share
+
+    Connections come from a bounded pool, executions are written with
+    prepared batch inserts, per-job stats and rollups are updated under
+    per-job advisory locks, and ``claim_run`` makes sure each cron firing
+    runs only once.
+    """
+
+    name = 'postgres'
+
+    def __init__(self, dsn=None, pool_size=10, jobs_file='data/jobs.json', history_file='data/job_history.jsonl',
+                 blob_dir='data/blobs'):
+        self.logger = logging.getLogger(__name__)
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        dsn = dsn or os.environ.get('DATABASE_URL')
+        if not dsn:
+            raise ValueError("PostgresBackend needs a DSN or the DATABASE_URL environment variable")
+        self._pool = ConnectionPool(dsn, 1, pool_size)
+        self.blobs = PostgresBlobStore(self._pool)
+
+        with self._pool.cursor() as cur:
+            # Serialize schema setup and the one-time import across processes starting together
+            cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", SCHEMA_LOCK)
+            cur.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+            cur.execute("SELECT max(version) AS version FROM schema_version")
+            if (cur.fetchone()['version'] or 0) < SCHEMA_VERSION:
+                cur.execute(SCHEMA)
+                cur.execute("INSERT INTO schema_version (version) VALUES (%s)", (SCHEMA_VERSION,))
+            self._import_json_files(cur, jobs_file, history_file, blob_dir)
+            self._backfill_revisions(cur)
+
+    def _import_json_files(self, cur, jobs_file, history_file, blob_dir):
+        """Seed a new database from the JSON files used by JobManager, once
+
+        The import is recorded in store_metadata, so deleting every job
+        later doesn't bring the old files back on the next start.
+        """
+        cur.execute("SELECT 1 FROM store_metadata WHERE key = 'json_import'")
+        if cur.fetchone():
+            return
+        cur.execute("INSERT INTO store_metadata (key, value) VALUES ('json_import', %s)", (str(time.time()),))
+        # Databases from before the marker existed that already hold data were seeded back then
+        cur.execute("SELECT EXISTS (SELECT 1 FROM jobs) OR EXISTS (SELECT 1 FROM history) AS seeded")
+        if cur.fetchone()['seeded']:
+            return
+
+        try:
+            jobs = list(read_table(jobs_file)[0].values())
+        except ValueError:
+            jobs = []
+        try:
+            if history_file.endswith('.jsonl') and os.path.exists(history_file):
+                history = list(HistoryLog(history_file, maintenance_interval=0).iter_records())
+            else:
+                with open(os.path.splitext(history_file)[0] + '.json', 'r') as f:
+                    history = [ExecutionRecord.from_dict(record) for record in json.load(f)]
+        except Exception:
+            history = []
+
+        if not jobs and not history:
+            return
+
+        execute_batch(cur, JOB_INSERT + " ON CONFLICT DO NOTHING", [self._job_to_row(job) for job in jobs])
+        execute_batch(
+            cur, HISTORY_INSERT + " ON CONFLICT DO NOTHING",
+            [self._record_to_row(record) for record in history]
+        )
+        states = {
+            job['id']: {'last_run': job.get('last_run'), 'last_status': job.get('last_status')}
+            for job in jobs if job.get('last_run') or job.get('last_status')
+        }
+        states.update(latest_states(history))
+        execute_prepared_batch(
+            cur, 'upsert_state', [(job_id, state['last_run'], state['last_status']) for job_id, state in states.items()]
+        )
+        self._apply_stats(cur, history)
+
+        # Copy bodies from the JSON store's blob files, or from legacy inline responses
+        file_blobs = FileBlobStore(blob_dir) if os.path.isdir(blob_dir) else None
+        for digest in {record.response_hash for record in history} - {None}:
+            content = file_blobs.get(digest) if file_blobs else None
+            if content is not None:
+                self.blobs.put(content, cur)
+        for record in history:
+            if record.response_content:
+                digest, size = self.blobs.put(record.response_content, cur)
+                cur.execute(
+                    "UPDATE history SET response_hash = %s, response_size = %s WHERE id = %s",
+                    (digest, size, record.id)
+                )
+        self.logger.info(f"Imported {len(jobs)} jobs and {len(history)} history records into Postgres")
+
+    def _backfill_revisions(self, cur):
+        """Give jobs created before revisions existed their first revision, keeping any revision_id they name"""
+        cur.execute(
+            f"SELECT {JOB_COLUMNS}, (SELECT max(number) FROM job_revisions r WHERE r.job_id = j.id) AS last_number "
+            "FROM jobs j WHERE revision_id IS NULL "
+            "OR NOT EXISTS (SELECT 1 FROM job_revisions r WHERE r.id = j.revision_id)"
+        )
+        jobs = [dict(row) for row in cur.fetchall()]
+        if not jobs:
+            return
+        revisions = []
+        for job in jobs:
+            job['revision_id'] = job['revision_id'] or uuid7()
+            revisions.append(JobRevision.from_job(job, (job['last_number'] or 0) + 1, job['created_at']))
+        execute_batch(cur, REVISION_INSERT, [self._revision_to_row(revision) for revision in revisions])
+        execute_batch(
+            cur, "UPDATE jobs SET revision_id = %s WHERE id = %s",
+            [(revision.id, revision.job_id) for revision in revisions]
+        )
+        self.logger.info(f"Created initial revisions for {len(revisions)} jobs")
+
+    @staticmethod
+    def _revision_to_row(revision):
+        return (revision.id, revision.job_id, revision.number, revision.created_at, revision.name, revision.url,
+                revision.cron_expression, revision.method, Json(revision.headers or {}), revision.payload,
+                Json(revision.retry_policy) if revision.retry_policy else None)
+
+    @staticmethod
+    def _job_to_row(job):
+        return (
+            job['id'],
+            job['name'],
+            job['url'],
+            job['cron_expression'],
+            job.get('method', 'GET'),
+            Json(job.get('headers') or {}),
+            job.get('payload'),
+            bool(job.get('active', True)),
+            job.get('created_at'),
+            job.get('revision_id'),
+            Json(job['retry_policy']) if job.get('retry_policy') else None
+        )
+
+    @staticmethod
+    def _field_value(field, value):
+        """Column value of one job definition field"""
+        if field == 'headers':
+            return Json(value or {})
+        if field == 'retry_policy':
+            return Json(value) if value else None
+        return value
+
+    @staticmethod
+    def _record_to_row(record):
+        return record.to_row()
+
+    @staticmethod
+    def _merge_state(job, state):
+        job['last_run'] = state.get('last_run') if state else None
+        job['last_status'] = state.get('last_status') if state else None
+        return job
+
+    def list_jobs(self):
+        with self._pool.cursor() as cur:
+            cur.execute(
+                "SELECT j.*, s.last_run, s.last_status FROM jobs j "
+                "LEFT JOIN job_state s ON s.job_id = j.id ORDER BY j.created_at, j.id"
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+    def get_job(self, job_id):
+        with self._pool.cursor() as cur:
+            execute_prepared(cur, 'get_job', (job_id,))
+            row = cur.fetchone()
+            if not row:
+                return None
+            job = dict(row)
+            execute_prepared(cur, 'get_state', (job_id,))
+            return self._merge_state(job, cur.fetchone())
+
+    def insert_job(self, job, revision):
+        with self._pool.cursor() as cur:
+            cur.execute(JOB_INSERT, self._job_to_row(job))
+            cur.execute(REVISION_INSERT, self._revision_to_row(revision))
+
+    def insert_jobs(self, jobs, revisions):
+        with self._pool.cursor() as cur:
+            execute_batch(cur, JOB_INSERT, [self._job_to_row(job) for job in jobs])
+            execute_batch(cur, REVISION_INSERT, [self._revision_to_row(revision) for revision in revisions])
+
+    def update_job(self, job_id, fields, revision):
+        """Store the revision and repoint the job in one transaction"""
+        values = [self._field_value(field, value) for field, value in fields.items()]
+        with self._pool.cursor() as cur:
+            cur.execute(REVISION_INSERT, self._revision_to_row(revision))
+            cur.execute(
+                f"UPDATE jobs SET {', '.join(f'{field} = %s' for field in fields)} WHERE id = %s", values + [job_id]
+            )
+
+    def delete_job(self, job_id):
+        with self._pool.cursor() as cur:
+            cur.execute("DELETE FROM jobs WHERE id = %s", (job_id,))
+            cur.execute("DELETE FROM job_state WHERE job_id = %s", (job_id,))
+            cur.execute("DELETE FROM job_stats WHERE job_id = %s", (job_id,))
+            cur.execute("DELETE FROM job_rollups WHERE job_id = %s", (job_id,))
+
+    def set_job_active(self, job_id, active):
+        with self._pool.cursor() as cur:
+            cur.execute("UPDATE jobs SET active = %s WHERE id = %s", (bool(active), job_id))
+
+    def get_job_names(self, job_ids):
+        job_ids = list(set(job_ids))
+        if not job_ids:
+            return {}
+        with self._pool.cursor() as cur:
+            cur.execute("SELECT id, name FROM jobs WHERE id = ANY(%s)", (job_ids,))
+            return {row['id']: row['name'] for row in cur.fetchall()}
+
+    def get_revisions(self, revision_ids):
+        revision_ids = list(set(revision_ids))
+        if not revision_ids:
+            return {}
+        with self._pool.cursor() as cur:
+            cur.execute(f"SELECT {REVISION_COLUMNS} FROM job_revisions WHERE id = ANY(%s)", (revision_ids,))
+            return {row['id']: JobRevision.from_dict(row) for row in cur.fetchall()}
+
+    def list_revisions(self, job_id):
+        with self._pool.cursor() as cur:
+            cur.execute(
+                f"SELECT {REVISION_COLUMNS} FROM job_revisions WHERE job_id = %s ORDER BY number DESC", (job_id,)
+            )
+            return [JobRevision.from_dict(row) for row in cur.fetchall()]
+
+    def set_state(self, job_id, state):
+        with self._pool.cursor() as cur:
+            execute_prepared(cur, 'upsert_state', (job_id, state['last_run'], state['last_status']))
+
+    def claim_run(self, job_id, fire_time):
+        with self._pool.cursor() as cur:
+            execute_prepared(cur, 'claim_run', (job_id, fire_time, self.instance_id))
+            return cur.rowcount == 1
+
+    def get_stats(self, job_id):
+        with self._pool.cursor() as cur:
+            execute_prepared(cur, 'get_stats', (job_id,))
+            row = cur.fetchone()
+        return JobStats.from_dict(row['data'] if row else None)
+
+    def get_all_stats(self):
+        with self._pool.cursor() as cur:
+            cur.execute("SELECT job_id, data FROM job_stats")
+            return {row['job_id']: JobStats.from_dict(row['data']) for row in cur.fetchall()}
+
+    def append_records(self, records):
+        """Insert a batch of execution records and their runtime state updates in one transaction"""
+        with self._pool.cursor() as cur:
+            execute_prepared_batch(cur, 'insert_history', [self._record_to_row(record) for record in records])
+            states = latest_states(records)
+            execute_prepared_batch(
+                cur, 'upsert_state', [(job_id, state['last_run'], state['last_status']) for job_id, state in states.items()]
+            )
+            self._apply_stats(cur, records)
+
+    def _apply_stats(self, cur, records):
+        """Fold records into running stats and rollups
+
+        Other processes update the same rows, so each job's rows are read
+        and rewritten under a per-job advisory lock held until commit.
+        Locks are taken in job id order to avoid deadlocks.
+        """
+        by_job = {}
+        for record in records:
+            by_job.setdefault(record.job_id, []).append(record)
+
+        for job_id in sorted(by_job):
+            execute_prepared(cur, 'lock_job', (job_id,))
+            execute_prepared(cur, 'get_stats', (job_id,))
+            row = cur.fetchone()
+            stats = JobStats.from_dict(row['data'] if row else None)
+            for record in by_job[job_id]:
+                stats.add(record)
+            execute_prepared(cur, 'upsert_stats', (job_id, Json(stats.to_dict())))
+
+            rows = []
+            for (_, granularity, start), bucket in rollup_records(by_job[job_id]).items():
+                execute_prepared(cur, 'get_rollup', (job_id, granularity, start))
+                row = cur.fetchone()
+                if row:
+                    bucket = RollupBucket(
+                        row['count'], row['failures'], row['latency_sum'], LatencySketch.from_dict(row['sketch'])
+                    ).merge(bucket)
+                rows.append((
+                    job_id, granularity, start, bucket.count, bucket.failures, bucket.latency_sum,
+                    Json(bucket.sketch.to_dict())
+                ))
+            execute_prepared_batch(cur, 'upsert_rollup', rows)
+
+    def tail(self, limit):
+        with self._pool.cursor() as cur:
+            cur.execute(f"SELECT {HISTORY_COLUMNS} FROM history ORDER BY timestamp DESC, id DESC LIMIT %s", (limit,))
+            return [ExecutionRecord.from_dict(row) for row in cur.fetchall()]
+
+    def query_history(self, limit, cursor=None, job_id=None, success=None, since=None, until=None):
+        """Page through history by (timestamp, id) keyset
+
+        Pages are served from the history indexes, so a deep page costs
+        the same as the first one.
+        """
+        limit = normalize_limit(limit)
+
+        clauses, params = [], []
+        if job_id is not None:
+            clauses.append("job_id = %s")
+            params.append(job_id)
+        if success is not None:
+            clauses.append("success = %s")
+            params.append(bool(success))
+        if since is not None:
+            clauses.append("timestamp >= %s")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < %s")
+            params.append(until)
+
+        order = "DESC"
+        if cursor:
+            if cursor['d'] == 'next':
+                clauses.append("(timestamp, id) < (%s, %s)")
+            else:
+                clauses.append("(timestamp, id) > (%s, %s)")
+                order = "ASC"
+            params.extend(cursor['key'])
+
+        sql = f"SELECT {HISTORY_COLUMNS} FROM history"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY timestamp {order}, id {order} LIMIT %s"
+        with self._pool.cursor() as cur:
+            cur.execute(sql, params + [limit + 1])
+            records = [ExecutionRecord.from_dict(row) for row in cur.fetchall()]
+        return build_page(records, limit, cursor)
+
+    def clear_history(self):
+        with self._pool.cursor() as cur:
+            cur.execute("TRUNCATE history, job_stats, job_rollups")
+            self.blobs.sweep(cur)
+
+    def expire_history(self, history_cutoff, rollup_retention_days=None, now=None):
+        retention_days = dict(DEFAULT_ROLLUP_RETENTION_DAYS, **(rollup_retention_days or {}))
+        with self._pool.cursor() as cur:
+            cur.execute("DELETE FROM history WHERE timestamp < %s", (history_cutoff,))
+            removed = cur.rowcount
+            for granularity, days in retention_days.items():
+                cur.execute(
+                    "DELETE FROM job_rollups WHERE granularity = %s AND bucket_start < %s",
+                    (granularity, cutoff(days, now))
+                )
+            # Claims are keyed on UTC fire times
+            claim_cutoff = (now or datetime.now()).astimezone(timezone.utc) - timedelta(days=CLAIM_RETENTION_DAYS)
+            cur.execute("DELETE FROM job_claims WHERE fire_time < %s", (claim_cutoff.isoformat(),))
+            self.blobs.sweep(cur)
+        return removed
+
+    def get_rollups(self, job_id, granularity='hour', since=None, until=None):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown rollup granularity: {granularity}")
+        sql = "SELECT * FROM job_rollups WHERE job_id = %s AND granularity = %s"
+        params = [job_id, granularity]
+        if since:
+            sql += " AND bucket_start >= %s"
+            params.append(since)
+        if until:
+            sql += " AND bucket_start < %s"
+            params.append(until)
+        with self._pool.cursor() as cur:
+            cur.execute(sql + " ORDER BY bucket_start", params)
+            rows = cur.fetchall()
+        return [
+            RollupBucket(
+                row['count'], row['failures'], row['latency_sum'], LatencySketch.from_dict(row['sketch'])
+            ).summary(row['bucket_start'])
+            for row in rows
+        ]
+
+    def put_blob(self, content):
+        return self.blobs.put(content)
+
+    def get_blob(self, digest):
+        return self.blobs.get(digest)
+
+    def close(self):
+        """Close every pooled connection"""
+        self._pool.close()
+
+
+class PostgresJobManager(JobManager):
+    """JobManager on the PostgreSQL backend"""
+
+    def __init__(self, dsn=None, pool_size=10, jobs_file='data/jobs.json', history_file='data/job_history.jsonl',
+                 flush_interval_ms=200, flush_batch_size=100, history_retention_days=30, rollup_retention_days=None,
+                 blob_dir='data/blobs'):
+        super().__init__(
+            flush_interval_ms=flush_interval_ms, flush_batch_size=flush_batch_size,
+            history_retention_days=history_retention_days, rollup_retention_days=rollup_retention_days,
+            backend=PostgresBackend(dsn, pool_size, jobs_file, history_file, blob_dir)
+        )
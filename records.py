@@ -0,0 +1,157 @@
+class SlottedRecord:
+    """Base for compact record types: one slot per field instead of a per-instance dict
+
+    Fields are read as attributes. Read-only mapping access (``record['id']``,
+    ``record.get('id')``) is kept for code that still treats records as
+    dicts, and ``to_dict``/``from_dict`` convert at JSON boundaries.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, f) == getattr(other, f) for f in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f"{f}={getattr(self, f)!r}" for f in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build from a dict, ignoring keys that aren't fields (e.g. from older versions)"""
+        try:
+            return cls(**data)
+        except TypeError:
+            return cls(**{f: data[f] for f in cls.__slots__ if f in data})
+
+
+class Job(SlottedRecord):
+    """A job definition plus its runtime state (last_run, last_status)"""
+
+    __slots__ = ('id', 'name', 'url', 'cron_expression', 'method', 'headers', 'payload', 'active', 'created_at',
+                 'revision_id', 'retry_policy', 'last_run', 'last_status')
+
+    # Fields stored with the definition; the rest is runtime state kept elsewhere
+    DEFINITION_FIELDS = __slots__[:11]
+    # Configuration captured by each JobRevision; changing any of them starts a new revision
+    REVISION_FIELDS = ('name', 'url', 'cron_expression', 'method', 'headers', 'payload', 'retry_policy')
+
+    def __init__(self, id, name, url, cron_expression, method='GET', headers=None, payload=None, active=True,
+                 created_at=None, revision_id=None, retry_policy=None, last_run=None, last_status=None):
+        self.id = id
+        self.name = name
+        self.url = url
+        self.cron_expression = cron_expression
+        self.method = method
+        self.headers = headers or {}
+        self.payload = payload
+        self.active = active
+        self.created_at = created_at
+        self.revision_id = revision_id
+        # RetryPolicy fields as a dict, or None to never retry
+        self.retry_policy = retry_policy
+        self.last_run = last_run
+        self.last_status = last_status
+
+    def definition(self):
+        """The definition fields as a dict, as job stores persist them"""
+        return {f: getattr(self, f) for f in self.DEFINITION_FIELDS}
+
+    def set_state(self, state):
+        """Overlay runtime state from a {'last_run', 'last_status'} dict"""
+        self.last_run = state.get('last_run')
+        self.last_status = state.get('last_status')
+        return self
+
+
+class JobRevision(SlottedRecord):
+    """An immutable snapshot of a job's configuration; history rows point at the revision they ran with"""
+
+    __slots__ = ('id', 'job_id', 'number', 'created_at', 'name', 'url', 'cron_expression', 'method', 'headers',
+                 'payload', 'retry_policy')
+
+    def __init__(self, id, job_id, number, created_at=None, name=None, url=None, cron_expression=None, method='GET',
+                 headers=None, payload=None, retry_policy=None):
+        self.id = id
+        self.job_id = job_id
+        self.number = number
+        self.created_at = created_at
+        self.name = name
+        self.url = url
+        self.cron_expression = cron_expression
+        self.method = method
+        self.headers = headers or {}
+        self.payload = payload
+        self.retry_policy = retry_policy
+
+    @classmethod
+    def from_job(cls, job, number, created_at):
+        """Snapshot the configuration of a Job (or job dict) under its revision_id"""
+        return cls(job.get('revision_id'), job.get('id'), number, created_at,
+                   **{f: job.get(f) for f in Job.REVISION_FIELDS})
+
+
+class ExecutionRecord(SlottedRecord):
+    """One job execution in history
+
+    Retries of a failed execution are records of their own: ``attempt``
+    counts from 1 and ``retry_of`` holds the id of the first attempt.
+    ``short_circuited`` marks runs skipped because their host's circuit
+    breaker was open; they sent no request and are left out of stats.
+    """
+
+    __slots__ = ('id', 'job_id', 'timestamp', 'status_code', 'execution_time', 'success', 'error_message',
+                 'response_hash', 'response_size', 'revision_id', 'attempt', 'retry_of', 'short_circuited',
+                 'response_content')
+
+    # Column order used by the SQL stores; response_content only exists on legacy rows
+    ROW_FIELDS = __slots__[:13]
+
+    def __init__(self, id, job_id, timestamp, status_code=None, execution_time=None, success=False,
+                 error_message=None, response_hash=None, response_size=None, revision_id=None, attempt=1,
+                 retry_of=None, short_circuited=False, response_content=None):
+        self.id = id
+        self.job_id = job_id
+        self.timestamp = timestamp
+        self.status_code = status_code
+        self.execution_time = execution_time
+        self.success = success
+        self.error_message = error_message
+        self.response_hash = response_hash
+        self.response_size = response_size
+        self.revision_id = revision_id
+        self.attempt = attempt or 1
+        self.retry_of = retry_of
+        self.short_circuited = bool(short_circuited)
+        self.response_content = response_content
+
+    def to_dict(self):
+        data = {f: getattr(self, f) for f in self.ROW_FIELDS}
+        if self.response_content is not None:
+            data['response_content'] = self.response_content
+        return data
+
+    def to_row(self):
+        """Values in ROW_FIELDS order"""
+        return (self.id, self.job_id, self.timestamp, self.status_code, self.execution_time, self.success,
+                self.error_message, self.response_hash, self.response_size, self.revision_id, self.attempt,
+                self.retry_of, self.short_circuited)
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a record from a row in ROW_FIELDS order, optionally followed by legacy response_content"""
+        return cls(row[0], row[1], row[2], row[3], row[4], bool(row[5]), row[6], row[7], row[8], row[9], row[10],
+                   row[11], row[12], row[13] if len(row) > 13 else None)
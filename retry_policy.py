@@ -0,0 +1,94 @@
+import random
+
+# Statuses worth retrying by default: timeouts, throttling and transient server errors
+DEFAULT_RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+# Kinds of request errors, as classified by the scheduler engines
+ERROR_KINDS = ('timeout', 'connection', 'request')
+DEFAULT_RETRY_ERRORS = ('timeout', 'connection')
+
+# Upper bounds on what a job may ask for
+MAX_ATTEMPTS_LIMIT = 10
+MAX_BACKOFF_LIMIT = 86400
+
+
+class RetryPolicy:
+    """When and how soon a failed execution is tried again
+
+    Attempt n + 1 is started ``backoff * multiplier ** (n - 1)`` seconds
+    after attempt n failed, capped at ``max_backoff``, less a random share of
+    up to ``jitter`` of the delay so jobs that failed together spread out.
+    Only failures with a status in ``retry_statuses`` or a request error
+    kind in ``retry_errors`` are retried.
+    """
+
+    __slots__ = ('max_attempts', 'backoff', 'multiplier', 'max_backoff', 'jitter', 'retry_statuses', 'retry_errors')
+
+    def __init__(self, max_attempts=3, backoff=10, multiplier=2, max_backoff=600, jitter=0.2,
+                 retry_statuses=DEFAULT_RETRY_STATUSES, retry_errors=DEFAULT_RETRY_ERRORS):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = tuple(retry_statuses)
+        self.retry_errors = tuple(retry_errors)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Validate a job's retry_policy dict; raises ValueError describing every problem"""
+        if not isinstance(data, dict):
+            raise ValueError("retry_policy must be an object")
+        unknown = set(data) - set(cls.__slots__)
+        problems = [f"unknown retry_policy fields: {', '.join(sorted(unknown))}"] if unknown else []
+
+        def number(field, low, high, kind=(int, float)):
+            value = data.get(field)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, kind) or not low <= value <= high):
+                problems.append(f"retry_policy {field} must be between {low} and {high}")
+                return None
+            return value
+
+        values = {
+            'max_attempts': number('max_attempts', 1, MAX_ATTEMPTS_LIMIT, kind=int),
+            'backoff': number('backoff', 0, MAX_BACKOFF_LIMIT),
+            'multiplier': number('multiplier', 1, 10),
+            'max_backoff': number('max_backoff', 0, MAX_BACKOFF_LIMIT),
+            'jitter': number('jitter', 0, 1),
+        }
+        statuses = data.get('retry_statuses')
+        if statuses is not None:
+            if not isinstance(statuses, list) or not all(isinstance(s, int) and 100 <= s <= 599 for s in statuses):
+                problems.append("retry_policy retry_statuses must be a list of HTTP status codes")
+            values['retry_statuses'] = statuses
+        errors = data.get('retry_errors')
+        if errors is not None:
+            if not isinstance(errors, list) or not set(errors) <= set(ERROR_KINDS):
+                problems.append(f"retry_policy retry_errors must be a list of: {', '.join(ERROR_KINDS)}")
+            values['retry_errors'] = errors
+        if problems:
+            raise ValueError('; '.join(problems))
+        return cls(**{field: value for field, value in values.items() if value is not None})
+
+    def to_dict(self):
+        return {
+            'max_attempts': self.max_attempts,
+            'backoff': self.backoff,
+            'multiplier': self.multiplier,
+            'max_backoff': self.max_backoff,
+            'jitter': self.jitter,
+            'retry_statuses': list(self.retry_statuses),
+            'retry_errors': list(self.retry_errors)
+        }
+
+    def should_retry(self, attempt, status_code=None, error_kind=None):
+        """Whether a failed attempt (numbered from 1) gets another try"""
+        if attempt >= self.max_attempts:
+            return False
+        if error_kind is not None:
+            return error_kind in self.retry_errors
+        return status_code in self.retry_statuses
+
+    def delay(self, attempt):
+        """Seconds to wait after failed attempt number ``attempt`` before the next one"""
+        delay = min(self.max_backoff, self.backoff * self.multiplier ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
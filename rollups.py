@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from job_stats import LatencySketch
+
+# Rollup granularities and how many characters of an ISO timestamp identify a bucket
+GRANULARITIES = {
+    'minute': 16,   # 2025-09-05T01:06
+    'hour': 13,     # 2025-09-05T01
+    'day': 10       # 2025-09-05
+}
+
+# Default retention per granularity, in days
+DEFAULT_ROLLUP_RETENTION_DAYS = {
+    'minute': 7,
+    'hour': 400,
+    'day': 5 * 365
+}
+
+
+def bucket_start(timestamp, granularity):
+    """Return the ISO start of the rollup bucket containing an ISO timestamp"""
+    prefix = timestamp[:GRANULARITIES[granularity]]
+    if granularity == 'minute':
+        return prefix
+    if granularity == 'hour':
+        return prefix + ':00'
+    return prefix + 'T00:00'
+
+
+def cutoff(days, now=None):
+    """ISO timestamp for `days` days before now"""
+    return ((now or datetime.now()) - timedelta(days=days)).isoformat()
+
+
+class RollupBucket:
+    """Execution counts and latency for one job over one time bucket"""
+
+    __slots__ = ('count', 'failures', 'latency_sum', 'sketch')
+
+    def __init__(self, count=0, failures=0, latency_sum=0.0, sketch=None):
+        self.count = count
+        self.failures = failures
+        self.latency_sum = latency_sum
+        self.sketch = sketch or LatencySketch()
+
+    def add(self, record):
+        execution_time = record.execution_time or 0.0
+        self.count += 1
+        if not record.success:
+            self.failures += 1
+        self.latency_sum += execution_time
+        self.sketch.add(execution_time)
+        return self
+
+    def merge(self, other):
+        self.count += other.count
+        self.failures += other.failures
+        self.latency_sum += other.latency_sum
+        self.sketch.merge(other.sketch)
+        return self
+
+    def summary(self, bucket):
+        return {
+            'bucket': bucket,
+            'count': self.count,
+            'failures': self.failures,
+            'success_rate': round(((self.count - self.failures) / self.count) * 100, 1) if self.count else 0,
+            'average_execution_time': round(self.latency_sum / self.count, 3) if self.count else 0,
+            'p50_execution_time': round(self.sketch.quantile(0.50), 3),
+            'p95_execution_time': round(self.sketch.quantile(0.95), 3),
+            'p99_execution_time': round(self.sketch.quantile(0.99), 3)
+        }
+
+
+def rollup_records(records):
+    """Aggregate records into {(job_id, granularity, bucket_start): RollupBucket}, leaving out short-circuited runs"""
+    buckets = {}
+    for record in records:
+        if record.short_circuited:
+            continue
+        for granularity in GRANULARITIES:
+            key = (record.job_id, granularity, bucket_start(record.timestamp, granularity))
+            buckets.setdefault(key, RollupBucket()).add(record)
+    return buckets
@@ -0,0 +1,252 @@
+import json
+import logging
+from job_stats import JobStats, LatencySketch
+from rollups import DEFAULT_ROLLUP_RETENTION_DAYS, GRANULARITIES, RollupBucket, cutoff, rollup_records
+from sqlite_conn import ThreadConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_state (
+    job_id TEXT PRIMARY KEY,
+    last_run TEXT,
+    last_status TEXT
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS job_stats (
+    job_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS job_rollups (
+    job_id TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    latency_sum REAL NOT NULL,
+    sketch TEXT NOT NULL,
+    PRIMARY KEY (job_id, granularity, bucket_start)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_job_rollups_expiry ON job_rollups (granularity, bucket_start);
+"""
+
+STATE_FIELDS = ('last_run', 'last_status')
+
+
+def latest_states(records):
+    """Map job id to the runtime state of its newest record
+
+    Records can reach a batch slightly out of order when several threads
+    finish at once, so the newest timestamp wins rather than the last record.
+    """
+    states = {}
+    for record in records:
+        state = states.get(record.job_id)
+        if state is None or record.timestamp >= state['last_run']:
+            states[record.job_id] = RuntimeStateStore.state_from_record(record)
+    return states
+
+
+class RuntimeStateStore:
+    """Per-job runtime state (last run and status, running stats, rollups) kept apart from job definitions
+
+    Executions only touch these small tables, so job definitions change
+    only when a user edits a job. Pass ``connect`` to share a connection
+    (and transactions) with another SQLite store; otherwise the store
+    opens its own database at ``db_file``.
+    """
+
+    def __init__(self, db_file=None, connect=None):
+        self.logger = logging.getLogger(__name__)
+        self._connect = connect or ThreadConnections(db_file)
+        self._connect().executescript(SCHEMA)
+
+    @staticmethod
+    def state_from_record(record):
+        """Runtime state implied by an execution record; a run skipped by an open circuit gets its own status"""
+        if record.short_circuited:
+            status = 'short_circuited'
+        else:
+            status = 'success' if record.success else 'failed'
+        return {'last_run': record.timestamp, 'last_status': status}
+
+    @staticmethod
+    def merge(job, state):
+        """Overlay runtime state on a job definition"""
+        for field in STATE_FIELDS:
+            job[field] = state.get(field) if state else job.get(field)
+        return job
+
+    def get(self, job_id):
+        row = self._connect().execute(
+            "SELECT last_run, last_status FROM job_state WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_all(self):
+        rows = self._connect().execute("SELECT job_id, last_run, last_status FROM job_state").fetchall()
+        return {row['job_id']: {'last_run': row['last_run'], 'last_status': row['last_status']} for row in rows}
+
+    def set_many(self, states, commit=True):
+        """Upsert runtime state from a {job_id: state} dict
+
+        A state never replaces a newer last_run, so updates that commit out
+        of order can't roll a job back. With commit=False the statements
+        join the caller's open transaction.
+        """
+        conn = self._connect()
+        rows = [(job_id, state['last_run'], state['last_status']) for job_id, state in states.items()]
+        sql = (
+            "INSERT INTO job_state (job_id, last_run, last_status) VALUES (?, ?, ?) "
+            "ON CONFLICT (job_id) DO UPDATE SET last_run = excluded.last_run, last_status = excluded.last_status "
+            "WHERE job_state.last_run IS NULL OR job_state.last_run <= excluded.last_run"
+        )
+        if commit:
+            with conn:
+                conn.executemany(sql, rows)
+        else:
+            conn.executemany(sql, rows)
+
+    def _run(self, commit, fn):
+        conn = self._connect()
+        if commit:
+            with conn:
+                return fn(conn)
+        return fn(conn)
+
+    def delete(self, job_id, commit=True):
+        def delete(conn):
+            conn.execute("DELETE FROM job_state WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM job_stats WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM job_rollups WHERE job_id = ?", (job_id,))
+        self._run(commit, delete)
+
+    def get_stats(self, job_id):
+        """Return the running JobStats for a job"""
+        row = self._connect().execute("SELECT data FROM job_stats WHERE job_id = ?", (job_id,)).fetchone()
+        return JobStats.from_dict(json.loads(row['data']) if row else None)
+
+    def get_all_stats(self):
+        rows = self._connect().execute("SELECT job_id, data FROM job_stats").fetchall()
+        return {row['job_id']: JobStats.from_dict(json.loads(row['data'])) for row in rows}
+
+    def _save_stats(self, conn, stats_by_job):
+        conn.executemany(
+            "INSERT INTO job_stats (job_id, data) VALUES (?, ?) "
+            "ON CONFLICT (job_id) DO UPDATE SET data = excluded.data",
+            [(job_id, json.dumps(stats.to_dict(), separators=(',', ':'))) for job_id, stats in stats_by_job.items()]
+        )
+
+    def _merge_rollups(self, conn, buckets):
+        """Merge aggregated buckets into the stored rollup rows"""
+        rows = []
+        for (job_id, granularity, start), bucket in buckets.items():
+            row = conn.execute(
+                "SELECT count, failures, latency_sum, sketch FROM job_rollups "
+                "WHERE job_id = ? AND granularity = ? AND bucket_start = ?",
+                (job_id, granularity, start)
+            ).fetchone()
+            if row:
+                bucket = RollupBucket(
+                    row['count'], row['failures'], row['latency_sum'],
+                    LatencySketch.from_dict(json.loads(row['sketch']))
+                ).merge(bucket)
+            rows.append((
+                job_id, granularity, start, bucket.count, bucket.failures, bucket.latency_sum,
+                json.dumps(bucket.sketch.to_dict(), separators=(',', ':'))
+            ))
+        conn.executemany("INSERT OR REPLACE INTO job_rollups VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def get_rollups(self, job_id, granularity='hour', since=None, until=None):
+        """Return rollup buckets for a job, oldest first"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown rollup granularity: {granularity}")
+        sql = "SELECT * FROM job_rollups WHERE job_id = ? AND granularity = ?"
+        params = [job_id, granularity]
+        if since:
+            sql += " AND bucket_start >= ?"
+            params.append(since)
+        if until:
+            sql += " AND bucket_start < ?"
+            params.append(until)
+        rows = self._connect().execute(sql + " ORDER BY bucket_start", params).fetchall()
+        return [
+            RollupBucket(
+                row['count'], row['failures'], row['latency_sum'],
+                LatencySketch.from_dict(json.loads(row['sketch']))
+            ).summary(row['bucket_start'])
+            for row in rows
+        ]
+
+    def expire_rollups(self, retention_days=None, now=None, commit=True):
+        """Delete rollup buckets older than each granularity's retention"""
+        retention_days = dict(DEFAULT_ROLLUP_RETENTION_DAYS, **(retention_days or {}))
+
+        def expire(conn):
+            removed = 0
+            for granularity, days in retention_days.items():
+                removed += conn.execute(
+                    "DELETE FROM job_rollups WHERE granularity = ? AND bucket_start < ?",
+                    (granularity, cutoff(days, now))
+                ).rowcount
+            return removed
+        return self._run(commit, expire)
+
+    def apply_records(self, records, commit=True):
+        """Fold a batch of execution records into runtime state, running stats and rollups
+
+        Callers serialize calls; with commit=False the statements join the
+        caller's open transaction.
+        """
+        states = latest_states(records)
+
+        def apply(conn):
+            stats_by_job = {}
+            for record in records:
+                job_id = record.job_id
+                if job_id not in stats_by_job:
+                    stats_by_job[job_id] = self.get_stats(job_id)
+                stats_by_job[job_id].add(record)
+            self.set_many(states, commit=False)
+            self._save_stats(conn, stats_by_job)
+            self._merge_rollups(conn, rollup_records(records))
+        self._run(commit, apply)
+
+    def rebuild_stats(self, records, commit=True):
+        """Recompute running stats and rollups from a full history, oldest first"""
+        records = list(records)
+        stats_by_job = {}
+        for record in records:
+            stats_by_job.setdefault(record.job_id, JobStats()).add(record)
+
+        def rebuild(conn):
+            conn.execute("DELETE FROM job_stats")
+            conn.execute("DELETE FROM job_rollups")
+            self._save_stats(conn, stats_by_job)
+            self._merge_rollups(conn, rollup_records(records))
+        self._run(commit, rebuild)
+        return len(stats_by_job)
+
+    def has_stats(self):
+        return self._connect().execute("SELECT 1 FROM job_stats LIMIT 1").fetchone() is not None
+
+    def clear_stats(self, commit=True):
+        def clear(conn):
+            conn.execute("DELETE FROM job_stats")
+            conn.execute("DELETE FROM job_rollups")
+        self._run(commit, clear)
+
+    def import_from_jobs(self, jobs, commit=True):
+        """Move last_run/last_status embedded in job definitions into the store"""
+        states = {
+            job['id']: {'last_run': job.get('last_run'), 'last_status': job.get('last_status')}
+            for job in jobs if job.get('last_run') or job.get('last_status')
+        }
+        if states:
+            self.set_many(states, commit=commit)
+            self.logger.info(f"Imported runtime state for {len(states)} jobs")
+        return len(states)
+
+    def close(self):
+        if isinstance(self._connect, ThreadConnections):
+            self._connect.close()
@@ -1,9 +1,12 @@
 import logging
+import functools
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.base import STATE_RUNNING
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.jobstores.base import JobLookupError
 import json
 import re
 from urllib.parse import urlparse, parse_qs
@@ -12,12 +15,69 @@ import base64
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import unpad
 import binascii
+from http_pool import KeepAliveAdapter
+from host_limits import HostLimiter
+from retry_policy import RetryPolicy
+from circuit_breaker import CircuitBreaker
+
+# APScheduler id of the periodic history retention job
+STORAGE_MAINTENANCE_JOB_ID = '__storage_maintenance__'
+
+# Seconds a job's HTTP request may take
+REQUEST_TIMEOUT = 30
+
+BROWSER_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                      'Chrome/91.0.4472.124 Safari/537.36')
+
+# Keyword argument through which a job function receives the fire time it runs for
+FIRE_TIME_KWARG = 'fire_time'
+
+
+class _Firing:
+    """An APScheduler job as submitted for one fire time, which its function gets as a keyword argument"""
+
+    def __init__(self, job, fire_time):
+        self._job = job
+        self.kwargs = dict(job.kwargs, **{FIRE_TIME_KWARG: fire_time})
+
+    def __getattr__(self, name):
+        return getattr(self._job, name)
+
+    def __str__(self):
+        return str(self._job)
+
+
+class FireTimeExecutorMixin:
+    """Executor mixin that tells jobs which scheduled fire time they are running for
+
+    APScheduler doesn't pass the run time to job functions. Jobs added with
+    a ``fire_time`` keyword argument have it filled in, with one submission
+    per fire time, so a run that sat in the executor's queue still knows
+    which firing it belongs to.
+    """
+
+    def submit_job(self, job, run_times):
+        if FIRE_TIME_KWARG not in job.kwargs:
+            return super().submit_job(job, run_times)
+        for run_time in run_times:
+            super().submit_job(_Firing(job, run_time), [run_time])
+
+
+class FireTimeThreadPoolExecutor(FireTimeExecutorMixin, ThreadPoolExecutor):
+    pass
+
 
 class CronScheduler:
-    def __init__(self, job_manager):
+    def __init__(self, job_manager, max_workers=20, http_pool=None, host_limiter=None, circuit_breaker=None):
         self.job_manager = job_manager
+        # Keep-alive connections shared by every execution, one pool per host
+        self.http_pool = http_pool or KeepAliveAdapter(pool_maxsize=max_workers)
+        # Per-host concurrency and rate limits applied to scheduled runs
+        self.limiter = host_limiter or HostLimiter()
+        # Per-host breakers that skip runs against hosts that keep failing
+        self.breaker = circuit_breaker or CircuitBreaker()
         self.scheduler = BackgroundScheduler(
-            executors={'default': ThreadPoolExecutor(20)},
+            executors={'default': FireTimeThreadPoolExecutor(max_workers)},
             job_defaults={'coalesce': False, 'max_instances': 3}
         )
         self.logger = logging.getLogger(__name__)
@@ -26,6 +86,13 @@ class CronScheduler:
         """Start the scheduler"""
         try:
             self.scheduler.start()
+            self.scheduler.add_job(
+                func=self._run_storage_maintenance,
+                trigger='interval',
+                hours=1,
+                id=STORAGE_MAINTENANCE_JOB_ID,
+                replace_existing=True
+            )
             self.logger.info("Scheduler started successfully")
         except Exception as e:
             self.logger.error(f"Failed to start scheduler: {e}")
@@ -38,6 +105,14 @@ class CronScheduler:
         except Exception as e:
             self.logger.error(f"Failed to shutdown scheduler: {e}")
     
+    def _run_storage_maintenance(self):
+        """Expire raw history and old rollups"""
+        try:
+            removed = self.job_manager.expire_history()
+            self.logger.debug(f"Storage maintenance expired {removed} history entries")
+        except Exception as e:
+            self.logger.error(f"Storage maintenance failed: {e}")
+    
     def schedule_job(self, job_id):
         """Schedule a job with APScheduler"""
         try:
@@ -46,44 +121,63 @@ class CronScheduler:
                 self.logger.error(f"Job {job_id} not found")
                 return False
             
-            # Remove existing job if it exists
-            self.remove_job(job_id)
-            
-            # Parse cron expression
-            cron_parts = job['cron_expression'].split()
-            if len(cron_parts) != 5:
-                self.logger.error(f"Invalid cron expression for job {job_id}: {job['cron_expression']}")
-                return False
-            
-            minute, hour, day, month, day_of_week = cron_parts
-            
-            # Create cron trigger
-            trigger = CronTrigger(
-                minute=minute,
-                hour=hour,
-                day=day,
-                month=month,
-                day_of_week=day_of_week
-            )
-            
-            # Schedule the job
-            self.scheduler.add_job(
-                func=self._execute_job,
-                trigger=trigger,
-                id=job_id,
-                args=[job_id],
-                replace_existing=True
-            )
-            
-            self.logger.info(f"Job {job_id} scheduled with cron expression: {job['cron_expression']}")
-            return True
+            # Remove existing job if it exists; runs already queued still go ahead
+            self._unschedule(job_id)
+            return self._add_cron_job(job)
             
         except Exception as e:
             self.logger.error(f"Failed to schedule job {job_id}: {e}")
             return False
     
+    def schedule_jobs(self, jobs):
+        """Schedule several Job objects with a single scheduler wakeup; returns the ids that failed"""
+        # Each add_job wakes a running scheduler to recompute its next run;
+        # paused, it only does that once on resume
+        paused = self.scheduler.state == STATE_RUNNING
+        if paused:
+            self.scheduler.pause()
+        failed = []
+        try:
+            for job in jobs:
+                try:
+                    if not self._add_cron_job(job):
+                        failed.append(job.id)
+                except Exception as e:
+                    self.logger.error(f"Failed to schedule job {job.id}: {e}")
+                    failed.append(job.id)
+        finally:
+            if paused:
+                self.scheduler.resume()
+        self.logger.info(f"Scheduled {len(jobs) - len(failed)} of {len(jobs)} jobs in one batch")
+        return failed
+    
+    def _add_cron_job(self, job):
+        """Register a job's cron trigger, replacing any existing registration"""
+        try:
+            trigger = CronTrigger.from_crontab(job.cron_expression)
+        except ValueError:
+            self.logger.error(f"Invalid cron expression for job {job.id}: {job.cron_expression}")
+            return False
+        
+        self.scheduler.add_job(
+            func=self._run_scheduled_job,
+            trigger=trigger,
+            id=job.id,
+            args=[job.id],
+            kwargs={FIRE_TIME_KWARG: None},
+            replace_existing=True
+        )
+        
+        self.logger.info(f"Job {job.id} scheduled with cron expression: {job.cron_expression}")
+        return True
+    
     def remove_job(self, job_id):
-        """Remove a job from the scheduler"""
+        """Remove a job from the scheduler, dropping its runs still waiting on a host's limits"""
+        self._unschedule(job_id)
+        self._cancel_queued(job_id)
+    
+    def _unschedule(self, job_id):
+        """Remove a job's cron trigger"""
         try:
             self.scheduler.remove_job(job_id)
             self.logger.info(f"Job {job_id} removed from scheduler")
@@ -91,10 +185,26 @@ class CronScheduler:
             # Job might not exist, which is fine
             pass
     
+    def _cancel_queued(self, job_id):
+        """Drop a job's runs queued for a host slot or admitted but not started, passing their slots on"""
+        dropped = self.limiter.cancel(job_id)
+        for pending in self.scheduler.get_jobs():
+            if pending.func != self._run_admitted or pending.args[0] != job_id:
+                continue
+            try:
+                pending.remove()
+            except JobLookupError:
+                # It started meanwhile and releases its slot itself
+                continue
+            self.limiter.release(pending.args[1])
+            dropped += 1
+        if dropped:
+            self.logger.info(f"Dropped {dropped} queued runs of job {job_id}")
+    
     def get_running_jobs(self):
         """Get list of currently scheduled job IDs"""
         try:
-            return [job.id for job in self.scheduler.get_jobs()]
+            return [job.id for job in self.scheduler.get_jobs() if job.id != STORAGE_MAINTENANCE_JOB_ID]
         except Exception as e:
             self.logger.error(f"Failed to get running jobs: {e}")
             return []
@@ -107,6 +217,145 @@ class CronScheduler:
             self.logger.error(f"Failed to run job {job_id} immediately: {e}")
             return False
     
+    def _run_scheduled_job(self, job_id, fire_time=None):
+        """Run a cron firing unless another process sharing the job store already claimed it"""
+        key = self._claim_key(fire_time)
+        if not self.job_manager.claim_run(job_id, key):
+            self.logger.debug(f"Job {job_id} firing at {key} already claimed by another process")
+            return False
+        return self._dispatch(job_id)
+    
+    @staticmethod
+    def _claim_key(fire_time=None):
+        """Identify a firing by its scheduled time in UTC, so every process builds the same key however late it runs
+        
+        Without a fire time (a call from outside the executor), the current
+        minute stands in for it.
+        """
+        fire_time = fire_time or datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        return fire_time.astimezone(timezone.utc).isoformat()
+    
+    def _pending_job(self, job_id):
+        """The job a firing, retry or queued run belongs to, or None if it was deleted or deactivated meanwhile
+        
+        Retries and queued runs are one-shot scheduler jobs that removing
+        the cron job doesn't cancel, so they check again before running.
+        """
+        job = self.job_manager.get_job(job_id)
+        if not job or not job.active:
+            self.logger.info(f"Dropping pending run of job {job_id}: it was deleted or deactivated")
+            return None
+        return job
+    
+    def _dispatch(self, job_id, attempt=1, retry_of=None):
+        """Run a firing or retry now if its host has capacity, otherwise leave it waiting without a worker thread"""
+        queued_at = time.monotonic()
+        job = self._pending_job(job_id)
+        if not job:
+            return False
+        host = urlparse(job.url).hostname
+        if not host:
+            return self._execute_job(job_id, attempt, retry_of)
+        if not self.breaker.allow(host):
+            return self._short_circuit(job_id, host, attempt, retry_of)
+        
+        admit = functools.partial(self._schedule_admitted, job_id, host, queued_at, attempt=attempt, retry_of=retry_of)
+        delay = self.limiter.acquire(host, admit, owner=job_id)
+        if delay is None:
+            # A finishing run against the same host hands its slot over
+            self.logger.info(f"Job {job_id} queued: {host} is at its concurrency limit")
+            return None
+        if delay > 0:
+            self.logger.info(f"Job {job_id} delayed {delay:.2f}s by the {host} rate limit")
+            admit(delay)
+            return None
+        return self._run_admitted(job_id, host, queued_at, attempt, retry_of)
+    
+    def _schedule_admitted(self, job_id, host, queued_at, delay, attempt=1, retry_of=None):
+        """Start an admitted run as a one-shot job after its delay"""
+        try:
+            self.scheduler.add_job(
+                func=self._run_admitted,
+                trigger='date',
+                run_date=datetime.now() + timedelta(seconds=delay),
+                args=[job_id, host, queued_at, attempt, retry_of],
+                kwargs={'recheck': True},
+                misfire_grace_time=None
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to schedule queued run of job {job_id}: {e}")
+            self.limiter.release(host)
+    
+    def _run_admitted(self, job_id, host, queued_at, attempt=1, retry_of=None, recheck=False):
+        """Execute a run holding one of its host's slots, then pass the slot on
+        
+        With ``recheck`` the run waited, so it is dropped if its job was
+        deleted or deactivated in the meantime.
+        """
+        self.limiter.record_wait(host, time.monotonic() - queued_at)
+        try:
+            if recheck and not self._pending_job(job_id):
+                return False
+            return self._execute_job(job_id, attempt, retry_of)
+        finally:
+            self.limiter.release(host)
+    
+    def _short_circuit(self, job_id, host, attempt=1, retry_of=None):
+        """Record a run skipped because its host's circuit is open"""
+        self.logger.warning(f"Job {job_id} skipped: the circuit for {host} is open")
+        self.job_manager.record_execution(
+            job_id=job_id,
+            status_code=None,
+            execution_time=0,
+            success=False,
+            error_message=f"Circuit open: recent requests to {host} failed or were slow",
+            attempt=attempt,
+            retry_of=retry_of,
+            short_circuited=True
+        )
+        return False
+    
+    def _record_outcome(self, job, execution_time, status_code=None):
+        """Report a finished request to its host's circuit breaker; no status_code means a request error"""
+        failed = status_code is None or status_code >= 500
+        self.breaker.record(urlparse(job.url).hostname, failed, execution_time)
+    
+    def _schedule_retry(self, job, attempt, retry_of, status_code=None, error_kind=None):
+        """Schedule the next attempt of a failed execution as a one-shot job, if the job's policy allows one
+        
+        The retry goes through dispatch like a cron firing, so it waits for
+        its host's limits without holding a worker in the meantime.
+        """
+        if not job or not job.retry_policy:
+            return False
+        policy = RetryPolicy.from_dict(job.retry_policy)
+        if not policy.should_retry(attempt, status_code, error_kind):
+            return False
+        delay = policy.delay(attempt)
+        try:
+            self.scheduler.add_job(
+                func=self._dispatch,
+                trigger='date',
+                run_date=datetime.now() + timedelta(seconds=delay),
+                args=[job.id, attempt + 1, retry_of],
+                misfire_grace_time=None
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to schedule retry of job {job.id}: {e}")
+            return False
+        self.logger.info(f"Job {job.id} attempt {attempt} failed; attempt {attempt + 1} of {policy.max_attempts} "
+                         f"in {delay:.1f}s")
+        return True
+    
+    @staticmethod
+    def _error_kind(error):
+        """Classify a requests exception as one of retry_policy.ERROR_KINDS"""
+        if isinstance(error, requests.Timeout):
+            return 'timeout'
+        if isinstance(error, requests.ConnectionError):
+            return 'connection'
+        return 'request'
+    
     def _hex_to_bytes(self, hex_string):
         """Convert hex string to bytes"""
         try:
@@ -228,7 +477,7 @@ class CronScheduler:
             
             while redirect_count < max_redirects:
                 # Make request to current URL
-                response = session.get(current_url, headers=browser_headers, timeout=30)
+                response = session.get(current_url, headers=browser_headers, timeout=REQUEST_TIMEOUT)
                 
                 # Check if we got the anti-bot protection page
                 if 'aes.js' in response.text and '__test=' in response.text:
@@ -281,43 +530,63 @@ class CronScheduler:
             self.logger.error(f"Error handling InfinityFree protection: {e}")
             raise
     
-    def _execute_job(self, job_id):
-        """Execute a job by making HTTP request"""
+    def _new_session(self):
+        """Return a Session on the shared connection pool; it must not be closed"""
+        session = requests.Session()
+        session.mount('http://', self.http_pool)
+        session.mount('https://', self.http_pool)
+        return session
+    
+    def _prepare_request(self, job):
+        """Return (method, url, request kwargs) for a job; the kwargs hold headers and any json/data body"""
+        method = (job.method or 'GET').upper()
+        headers = dict(job.headers or {})
+        payload = job.payload
+        
+        # Set browser-like headers to avoid anti-bot detection
+        if 'User-Agent' not in headers:
+            headers['User-Agent'] = BROWSER_USER_AGENT
+        
+        request_kwargs = {'headers': headers}
+        
+        # Add payload for POST/PUT/PATCH requests
+        if method in ['POST', 'PUT', 'PATCH'] and payload:
+            if headers.get('Content-Type', '').startswith('application/json'):
+                request_kwargs['json'] = json.loads(payload)
+            else:
+                request_kwargs['data'] = payload
+        
+        return method, job.url, request_kwargs
+    
+    def _execute_job(self, job_id, attempt=1, retry_of=None):
+        """Execute a job by making HTTP request
+        
+        ``attempt`` and ``retry_of`` (the first attempt's record id) are set
+        when this run retries a failed one.
+        """
         start_time = datetime.now()
+        # The configuration this run used, recorded with its history row
+        job = None
+        revision_id = None
+        # Whether the host's circuit breaker has heard how this run went
+        reported = False
         
         try:
             job = self.job_manager.get_job(job_id)
             if not job:
                 self.logger.error(f"Job {job_id} not found during execution")
                 return False
+            revision_id = job.revision_id
             
-            self.logger.info(f"Executing job {job_id}: {job['name']}")
-            
-            # Prepare request parameters
-            method = job.get('method', 'GET').upper()
-            url = job['url']
-            headers = job.get('headers', {})
-            payload = job.get('payload')
-            
-            # Set browser-like headers to avoid anti-bot detection
-            if 'User-Agent' not in headers:
-                headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            self.logger.info(f"Executing job {job_id}: {job.name}")
             
-            # Use session to handle cookies and redirects
-            session = requests.Session()
+            method, url, request_kwargs = self._prepare_request(job)
+            headers = request_kwargs['headers']
+            request_kwargs['timeout'] = REQUEST_TIMEOUT
             
-            # Prepare request kwargs
-            request_kwargs = {
-                'timeout': 30,
-                'headers': headers
-            }
-            
-            # Add payload for POST/PUT/PATCH requests
-            if method in ['POST', 'PUT', 'PATCH'] and payload:
-                if headers.get('Content-Type', '').startswith('application/json'):
-                    request_kwargs['json'] = json.loads(payload)
-                else:
-                    request_kwargs['data'] = payload
+            # A fresh session per run keeps cookies to this execution, while
+            # its connections come from the scheduler-wide pool
+            session = self._new_session()
             
             # Make the request, handling potential anti-bot protection
             if method.upper() == 'GET':
@@ -329,6 +598,8 @@ class CronScheduler:
             
             # Calculate execution time
             execution_time = (datetime.now() - start_time).total_seconds()
+            self._record_outcome(job, execution_time, response.status_code)
+            reported = True
             
             # Log the result
             success = 200 <= response.status_code < 400
@@ -339,47 +610,63 @@ class CronScheduler:
                 self.logger.warning(f"Job {job_id} returned status {response.status_code}. Time: {execution_time:.2f}s")
             
             # Record execution history
-            self.job_manager.add_execution_history(
+            record_id = self.job_manager.record_execution(
                 job_id=job_id,
                 status_code=response.status_code,
                 execution_time=execution_time,
                 success=success,
                 error_message=None if success else f"HTTP {response.status_code}: {response.text[:200]}",
-                response_content=response.text if success else None
+                response_content=response.text if success else None,
+                revision_id=revision_id,
+                attempt=attempt,
+                retry_of=retry_of
             )
             
+            if not success:
+                self._schedule_retry(job, attempt, retry_of or record_id, status_code=response.status_code)
             return success
             
         except requests.RequestException as e:
             execution_time = (datetime.now() - start_time).total_seconds()
             error_message = f"Request failed: {str(e)}"
             self.logger.error(f"Job {job_id} failed: {error_message}")
+            self._record_outcome(job, execution_time)
             
             # Record failure in history
-            self.job_manager.add_execution_history(
+            record_id = self.job_manager.record_execution(
                 job_id=job_id,
                 status_code=None,
                 execution_time=execution_time,
                 success=False,
                 error_message=error_message,
-                response_content=None
+                response_content=None,
+                revision_id=revision_id,
+                attempt=attempt,
+                retry_of=retry_of
             )
             
+            self._schedule_retry(job, attempt, retry_of or record_id, error_kind=self._error_kind(e))
             return False
             
         except Exception as e:
             execution_time = (datetime.now() - start_time).total_seconds()
             error_message = f"Unexpected error: {str(e)}"
             self.logger.error(f"Job {job_id} failed with unexpected error: {error_message}")
+            # A half-open circuit waits on this run if it was a probe
+            if job and not reported:
+                self._record_outcome(job, execution_time)
             
             # Record failure in history
-            self.job_manager.add_execution_history(
+            self.job_manager.record_execution(
                 job_id=job_id,
                 status_code=None,
                 execution_time=execution_time,
                 success=False,
                 error_message=error_message,
-                response_content=None
+                response_content=None,
+                revision_id=revision_id,
+                attempt=attempt,
+                retry_of=retry_of
             )
             
             return False
@@ -0,0 +1,33 @@
+import sqlite3
+import threading
+
+
+def open_connection(db_file):
+    """Open a SQLite connection configured for WAL mode"""
+    conn = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ThreadConnections:
+    """Hand out one SQLite connection per thread for a database file"""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._local = threading.local()
+
+    def __call__(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = open_connection(self.db_file)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close the calling thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,439 @@
+import json
+import os
+import threading
+import time
+import logging
+from history_log import HistoryLog
+from job_table import read_table
+from runtime_state import RuntimeStateStore
+from job_revisions import RevisionStore
+from ids import uuid7
+from blob_store import FileBlobStore, SQLiteBlobStore
+from history_query import build_page, normalize_limit
+from sqlite_conn import ThreadConnections
+from storage_backend import StorageBackend
+from job_manager import JobManager
+from records import ExecutionRecord, Job
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    cron_expression TEXT NOT NULL,
+    method TEXT NOT NULL DEFAULT 'GET',
+    headers TEXT,
+    payload TEXT,
+    active INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT,
+    revision_id TEXT,
+    retry_policy TEXT
+);
+
+CREATE TABLE IF NOT EXISTS history (
+    id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status_code INTEGER,
+    execution_time REAL,
+    success INTEGER NOT NULL,
+    error_message TEXT,
+    response_content TEXT,
+    response_hash TEXT,
+    response_size INTEGER,
+    revision_id TEXT,
+    attempt INTEGER NOT NULL DEFAULT 1,
+    retry_of TEXT,
+    short_circuited INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_history_job_ts_id ON history (job_id, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_history_ts_id ON history (timestamp, id);
+DROP INDEX IF EXISTS idx_history_job_ts;
+DROP INDEX IF EXISTS idx_history_ts;
+
+-- One-time steps that have run, e.g. the JSON import
+CREATE TABLE IF NOT EXISTS store_metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# ExecutionRecord.ROW_FIELDS order, then the legacy inline body
+HISTORY_COLUMNS = ', '.join(ExecutionRecord.ROW_FIELDS + ('response_content',))
+HISTORY_INSERT = f"INSERT INTO history ({HISTORY_COLUMNS}) VALUES ({', '.join('?' * (len(ExecutionRecord.ROW_FIELDS) + 1))})"
+HISTORY_SELECT = f"SELECT {HISTORY_COLUMNS} FROM history"
+JOB_INSERT = f"INSERT INTO jobs ({', '.join(Job.DEFINITION_FIELDS)}) VALUES ({', '.join('?' * len(Job.DEFINITION_FIELDS))})"
+
+
+class SQLiteBackend(StorageBackend):
+    """Storage backend on a single SQLite database in WAL mode"""
+
+    name = 'sqlite'
+
+    def __init__(self, db_file='data/jobs.db', jobs_file='data/jobs.json', history_file='data/job_history.jsonl',
+                 blob_dir='data/blobs'):
+        self.db_file = db_file
+        self.logger = logging.getLogger(__name__)
+        self._commit_lock = threading.Lock()
+
+        # Ensure data directory exists
+        os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True)
+
+        self._conn = ThreadConnections(db_file)
+        self._migrate_history_columns()
+        self._migrate_revision_columns()
+        self._migrate_added_columns()
+        self._conn().executescript(SCHEMA)
+        self.blobs = SQLiteBlobStore(self._conn)
+
+        # Runtime state shares this database so executions commit atomically
+        self.state = RuntimeStateStore(connect=self._conn)
+        self.revisions = RevisionStore(connect=self._conn)
+        self._migrate_embedded_state()
+        self._import_json_files(jobs_file, history_file, blob_dir)
+        self._backfill_revisions()
+        self._move_inline_responses()
+        if not self.state.has_stats():
+            self._rebuild_stats()
+
+    def _migrate_history_columns(self):
+        """Add the response hash columns to history tables created by older versions"""
+        conn = self._conn()
+        columns = [row['name'] for row in conn.execute("PRAGMA table_info(history)")]
+        if columns and 'response_hash' not in columns:
+            with conn:
+                conn.execute("ALTER TABLE history ADD COLUMN response_hash TEXT")
+                conn.execute("ALTER TABLE history ADD COLUMN response_size INTEGER")
+
+    def _migrate_revision_columns(self):
+        """Add revision_id to job and history tables created by older versions"""
+        conn = self._conn()
+        with conn:
+            for table in ('jobs', 'history'):
+                columns = [row['name'] for row in conn.execute(f"PRAGMA table_info({table})")]
+                if columns and 'revision_id' not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN revision_id TEXT")
+
+    def _migrate_added_columns(self):
+        """Add the retry policy, attempt and short-circuit columns to tables created by older versions"""
+        conn = self._conn()
+        added = {
+            'jobs': ("retry_policy TEXT",),
+            'history': (
+                "attempt INTEGER NOT NULL DEFAULT 1", "retry_of TEXT", "short_circuited INTEGER NOT NULL DEFAULT 0"
+            )
+        }
+        with conn:
+            for table, definitions in added.items():
+                columns = [row['name'] for row in conn.execute(f"PRAGMA table_info({table})")]
+                for definition in definitions:
+                    if columns and definition.split()[0] not in columns:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {definition}")
+
+    def _backfill_revisions(self):
+        """Give jobs created before revisions existed their first revision"""
+        conn = self._conn()
+        jobs = [self._row_to_job(row) for row in conn.execute("SELECT * FROM jobs").fetchall()]
+        revisions = self.revisions.missing_revisions(jobs, uuid7)
+        if not revisions:
+            return
+        with conn:
+            self.revisions.add_many(revisions, commit=False)
+            conn.executemany(
+                "UPDATE jobs SET revision_id = ? WHERE id = ?",
+                [(revision.id, revision.job_id) for revision in revisions]
+            )
+        self.logger.info(f"Created initial revisions for {len(revisions)} jobs")
+
+    def _move_inline_responses(self):
+        """Move response bodies stored inline on history rows into the blob store"""
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT id, response_content FROM history WHERE response_content IS NOT NULL"
+        ).fetchall()
+        if not rows:
+            return
+        with conn:
+            for row in rows:
+                digest, size = self.blobs.put(row['response_content'], commit=False)
+                conn.execute(
+                    "UPDATE history SET response_content = NULL, response_hash = ?, response_size = ? WHERE id = ?",
+                    (digest, size, row['id'])
+                )
+        self.logger.info(f"Moved {len(rows)} inline response bodies into the blob store")
+
+    def _migrate_embedded_state(self):
+        """Move last_run/last_status columns from databases created by older versions"""
+        conn = self._conn()
+        columns = [row['name'] for row in conn.execute("PRAGMA table_info(jobs)")]
+        if 'last_run' not in columns:
+            return
+        with conn:
+            rows = conn.execute("SELECT id, last_run, last_status FROM jobs").fetchall()
+            self.state.import_from_jobs([dict(row) for row in rows], commit=False)
+            conn.execute("ALTER TABLE jobs DROP COLUMN last_run")
+            conn.execute("ALTER TABLE jobs DROP COLUMN last_status")
+
+    def _import_json_files(self, jobs_file, history_file, blob_dir):
+        """Seed a new database from the JSON files used by JobManager, once
+
+        The import is recorded in store_metadata, so deleting every job
+        later doesn't bring the old files back on the next start.
+        """
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM store_metadata WHERE key = 'json_import'").fetchone():
+            return
+
+        jobs, history = [], []
+        # Databases from before the marker existed that already hold data were seeded back then
+        if not (conn.execute("SELECT 1 FROM jobs LIMIT 1").fetchone()
+                or conn.execute("SELECT 1 FROM history LIMIT 1").fetchone()):
+            try:
+                jobs = list(read_table(jobs_file)[0].values())
+            except ValueError:
+                jobs = []
+            history = self._read_history_file(history_file)
+
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO store_metadata (key, value) VALUES ('json_import', ?)", (str(time.time()),))
+            if not jobs and not history:
+                return
+            conn.executemany(
+                JOB_INSERT.replace("INSERT", "INSERT OR IGNORE", 1), [self._job_to_row(job) for job in jobs]
+            )
+            self.state.import_from_jobs(jobs, commit=False)
+            conn.executemany(
+                HISTORY_INSERT.replace("INSERT", "INSERT OR IGNORE", 1),
+                [self._record_to_row(record) for record in history]
+            )
+            # Copy bodies referenced by the JSON store's file blobs
+            file_blobs = FileBlobStore(blob_dir) if os.path.isdir(blob_dir) else None
+            for digest in {record.response_hash for record in history} - {None}:
+                content = file_blobs.get(digest) if file_blobs else None
+                if content is not None:
+                    self.blobs.put(content, commit=False)
+        self.logger.info(f"Imported {len(jobs)} jobs and {len(history)} history records into {self.db_file}")
+
+    def _read_history_file(self, history_file):
+        """Read a JSON Lines history log, falling back to the legacy JSON array"""
+        try:
+            if history_file.endswith('.jsonl') and os.path.exists(history_file):
+                log = HistoryLog(history_file, maintenance_interval=0)
+                return list(log.iter_records())
+            with open(os.path.splitext(history_file)[0] + '.json', 'r') as f:
+                return [ExecutionRecord.from_dict(record) for record in json.load(f)]
+        except Exception:
+            return []
+
+    @staticmethod
+    def _job_to_row(job):
+        return (
+            job['id'],
+            job['name'],
+            job['url'],
+            job['cron_expression'],
+            job.get('method', 'GET'),
+            json.dumps(job.get('headers') or {}),
+            job.get('payload'),
+            1 if job.get('active', True) else 0,
+            job.get('created_at'),
+            job.get('revision_id'),
+            json.dumps(job['retry_policy']) if job.get('retry_policy') else None
+        )
+
+    @staticmethod
+    def _field_value(field, value):
+        """Column value of one job definition field"""
+        if field == 'headers':
+            return json.dumps(value or {})
+        if field == 'retry_policy':
+            return json.dumps(value) if value else None
+        return value
+
+    @staticmethod
+    def _row_to_job(row):
+        job = dict(row)
+        job['headers'] = json.loads(job['headers']) if job['headers'] else {}
+        job['retry_policy'] = json.loads(job['retry_policy']) if job['retry_policy'] else None
+        job['active'] = bool(job['active'])
+        return job
+
+    @staticmethod
+    def _record_to_row(record):
+        return record.to_row() + (record.response_content,)
+
+    @staticmethod
+    def _row_to_record(row):
+        return ExecutionRecord.from_row(row)
+
+    def list_jobs(self):
+        rows = self._conn().execute("SELECT * FROM jobs ORDER BY rowid").fetchall()
+        jobs = [self._row_to_job(row) for row in rows]
+        states = self.state.get_all()
+        for job in jobs:
+            self.state.merge(job, states.get(job['id']))
+        return jobs
+
+    def get_job(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        return self.state.merge(self._row_to_job(row), self.state.get(job_id))
+
+    def insert_job(self, job, revision):
+        self.insert_jobs([job], [revision])
+
+    def insert_jobs(self, jobs, revisions):
+        conn = self._conn()
+        with conn:
+            conn.executemany(JOB_INSERT, [self._job_to_row(job) for job in jobs])
+            self.revisions.add_many(revisions, commit=False)
+
+    def update_job(self, job_id, fields, revision):
+        """Store the revision and repoint the job in one transaction"""
+        values = [self._field_value(field, value) for field, value in fields.items()]
+        conn = self._conn()
+        with conn:
+            self.revisions.add_many([revision], commit=False)
+            conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?", values + [job_id]
+            )
+
+    def delete_job(self, job_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self.state.delete(job_id, commit=False)
+
+    def set_job_active(self, job_id, active):
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE jobs SET active = ? WHERE id = ?", (1 if active else 0, job_id))
+
+    def get_job_names(self, job_ids):
+        job_ids = list(set(job_ids))
+        if not job_ids:
+            return {}
+        rows = self._conn().execute(
+            f"SELECT id, name FROM jobs WHERE id IN ({', '.join('?' * len(job_ids))})", job_ids
+        ).fetchall()
+        return {row['id']: row['name'] for row in rows}
+
+    def get_revisions(self, revision_ids):
+        return self.revisions.get_many(revision_ids)
+
+    def list_revisions(self, job_id):
+        return self.revisions.list(job_id)
+
+    def set_state(self, job_id, state):
+        self.state.set_many({job_id: state})
+
+    def claim_run(self, job_id, fire_time):
+        """A SQLite file is only scheduled from one process, so every claim wins"""
+        return True
+
+    def get_stats(self, job_id):
+        return self.state.get_stats(job_id)
+
+    def get_all_stats(self):
+        return self.state.get_all_stats()
+
+    def get_rollups(self, job_id, granularity='hour', since=None, until=None):
+        return self.state.get_rollups(job_id, granularity, since, until)
+
+    def append_records(self, records):
+        """Insert a batch of execution records and their runtime state updates in one transaction"""
+        conn = self._conn()
+        with self._commit_lock, conn:
+            conn.executemany(HISTORY_INSERT, [self._record_to_row(record) for record in records])
+            self.state.apply_records(records, commit=False)
+
+    def _rebuild_stats(self):
+        """Backfill running stats from existing history rows"""
+        cursor = self._conn().execute(HISTORY_SELECT + " ORDER BY timestamp")
+        count = self.state.rebuild_stats(self._row_to_record(row) for row in cursor)
+        if count:
+            self.logger.info(f"Rebuilt execution stats for {count} jobs")
+
+    def tail(self, limit):
+        rows = self._conn().execute(
+            HISTORY_SELECT + " ORDER BY timestamp DESC, id DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def query_history(self, limit, cursor=None, job_id=None, success=None, since=None, until=None):
+        """Page through history by (timestamp, id) keyset
+
+        Pages are served from the history indexes, so a deep page costs
+        the same as the first one.
+        """
+        limit = normalize_limit(limit)
+
+        clauses, params = [], []
+        if job_id is not None:
+            clauses.append("job_id = ?")
+            params.append(job_id)
+        if success is not None:
+            clauses.append("success = ?")
+            params.append(1 if success else 0)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+
+        order = "DESC"
+        if cursor:
+            if cursor['d'] == 'next':
+                clauses.append("(timestamp, id) < (?, ?)")
+            else:
+                clauses.append("(timestamp, id) > (?, ?)")
+                order = "ASC"
+            params.extend(cursor['key'])
+
+        sql = HISTORY_SELECT
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY timestamp {order}, id {order} LIMIT ?"
+        rows = self._conn().execute(sql, params + [limit + 1]).fetchall()
+        return build_page([self._row_to_record(row) for row in rows], limit, cursor)
+
+    def clear_history(self):
+        conn = self._conn()
+        with self._commit_lock, conn:
+            conn.execute("DELETE FROM history")
+            self.state.clear_stats(commit=False)
+            self.blobs.sweep(commit=False)
+
+    def expire_history(self, history_cutoff, rollup_retention_days=None, now=None):
+        conn = self._conn()
+        with self._commit_lock, conn:
+            removed = conn.execute("DELETE FROM history WHERE timestamp < ?", (history_cutoff,)).rowcount
+            self.state.expire_rollups(rollup_retention_days, now, commit=False)
+            self.blobs.sweep(commit=False)
+        return removed
+
+    def put_blob(self, content):
+        return self.blobs.put(content)
+
+    def get_blob(self, digest):
+        return self.blobs.get(digest)
+
+    def close(self):
+        """Close the calling thread's database connection"""
+        self._conn.close()
+
+
+class SQLiteJobManager(JobManager):
+    """JobManager on the SQLite backend"""
+
+    def __init__(self, db_file='data/jobs.db', jobs_file='data/jobs.json', history_file='data/job_history.jsonl',
+                 flush_interval_ms=200, flush_batch_size=100, history_retention_days=30, rollup_retention_days=None,
+                 blob_dir='data/blobs'):
+        super().__init__(
+            flush_interval_ms=flush_interval_ms, flush_batch_size=flush_batch_size,
+            history_retention_days=history_retention_days, rollup_retention_days=rollup_retention_days,
+            backend=SQLiteBackend(db_file, jobs_file, history_file, blob_dir)
+        )
@@ -0,0 +1,119 @@
+class StorageBackend:
+    """Interface every JobManager storage backend implements
+
+    A backend persists five things: job definitions, immutable job
+    revisions, hot per-job state (last run, running stats, rollups),
+    execution history and response bodies. JobManager sits in front of it
+    and owns everything that is the same for every backend: building
+    records, the write-behind buffer and overlaying queued records on
+    reads. Jobs are plain dicts of Job.DEFINITION_FIELDS; revisions and
+    history records are the types in records.py; history cursors arrive
+    already decoded.
+    """
+
+    # Short name used by storage_kit.py and in logs
+    name = 'base'
+
+    # Jobs
+
+    def list_jobs(self):
+        """Return every job definition with its stored last_run/last_status, oldest first"""
+        raise NotImplementedError
+
+    def get_job(self, job_id):
+        """Return one job definition with its stored last_run/last_status, or None"""
+        raise NotImplementedError
+
+    def insert_job(self, job, revision):
+        """Insert a job together with its first JobRevision"""
+        raise NotImplementedError
+
+    def insert_jobs(self, jobs, revisions):
+        """Insert several jobs and their first revisions so that either all of them or none are stored"""
+        raise NotImplementedError
+
+    def update_job(self, job_id, fields, revision):
+        """Store a new JobRevision and apply the changed definition fields, revision_id included"""
+        raise NotImplementedError
+
+    def delete_job(self, job_id):
+        """Delete a job along with its runtime state, stats and rollups; its revisions stay for history"""
+        raise NotImplementedError
+
+    def set_job_active(self, job_id, active):
+        raise NotImplementedError
+
+    def get_job_names(self, job_ids):
+        """Map the given job IDs to job names, skipping unknown IDs"""
+        raise NotImplementedError
+
+    # Revisions
+
+    def get_revisions(self, revision_ids):
+        """Map the given revision IDs to JobRevisions, skipping unknown IDs"""
+        raise NotImplementedError
+
+    def list_revisions(self, job_id):
+        """Return every revision of a job, newest first"""
+        raise NotImplementedError
+
+    # Hot state
+
+    def set_state(self, job_id, state):
+        """Store last_run/last_status for a job"""
+        raise NotImplementedError
+
+    def claim_run(self, job_id, fire_time):
+        """Claim one cron firing of a job, keyed on its scheduled time as UTC ISO; only the first caller gets True"""
+        raise NotImplementedError
+
+    def get_stats(self, job_id):
+        """Return the running JobStats for a job"""
+        raise NotImplementedError
+
+    def get_all_stats(self):
+        """Return {job_id: JobStats} for every job that has run"""
+        raise NotImplementedError
+
+    def get_rollups(self, job_id, granularity='hour', since=None, until=None):
+        """Return rollup bucket summaries for a job, oldest first; ValueError for an unknown granularity"""
+        raise NotImplementedError
+
+    # History
+
+    def append_records(self, records):
+        """Append execution records and fold them into hot state, as one unit where the store allows"""
+        raise NotImplementedError
+
+    def tail(self, limit):
+        """Return up to limit records, most recent first"""
+        raise NotImplementedError
+
+    def query_history(self, limit, cursor=None, **filters):
+        """Return one page of records, most recent first, as built by history_query.build_page
+
+        ``filters`` are job_id, success, since and until as accepted by
+        history_query.matches.
+        """
+        raise NotImplementedError
+
+    def clear_history(self):
+        """Drop all history, stats, rollups and unreferenced response bodies"""
+        raise NotImplementedError
+
+    def expire_history(self, history_cutoff, rollup_retention_days=None, now=None):
+        """Drop history older than the ISO cutoff and rollups past their retention; return rows removed"""
+        raise NotImplementedError
+
+    # Response bodies
+
+    def put_blob(self, content):
+        """Store a response body and return (hash, size in bytes)"""
+        raise NotImplementedError
+
+    def get_blob(self, digest):
+        """Return a stored response body, or None"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+"""
+Conformance checks and a standard benchmark for the JobManager storage backends.
+
+    python storage_kit.py conformance [json jsonl sqlite postgres]
+    python storage_kit.py bench [json jsonl sqlite postgres] [--records 5000]
+    python storage_kit.py stress [json jsonl sqlite postgres] [--threads 200] [--executions 10]
+
+Every backend runs the same checks and the same workload against a fresh
+store in a temporary directory. The postgres backend needs --dsn or
+DATABASE_URL and works in a throwaway schema that is dropped afterwards.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime, timedelta, timezone
+from job_manager import JobManager
+from file_store import FileBackend
+from sqlite_store import SQLiteBackend
+
+BACKENDS = ('json', 'jsonl', 'sqlite', 'postgres')
+
+
+class StoreFactory:
+    """Opens JobManagers on one fresh backend location, possibly several times"""
+
+    def __init__(self, kind, dsn=None):
+        self.kind = kind
+        self.dsn = dsn
+        self.root = tempfile.mkdtemp(prefix=f'storage-kit-{kind}-')
+        self.schema = None
+        if kind == 'postgres':
+            self._create_schema()
+
+    def _create_schema(self):
+        import psycopg2
+        from psycopg2.extensions import make_dsn
+        if not self.dsn:
+            raise ValueError("The postgres backend needs --dsn or DATABASE_URL")
+        self.schema = f"storage_kit_{uuid.uuid4().hex[:12]}"
+        conn = psycopg2.connect(self.dsn)
+        with conn, conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {self.schema}")
+        conn.close()
+        self._schema_dsn = make_dsn(self.dsn, options=f"-c search_path={self.schema}")
+
+    def backend(self):
+        path = lambda name: os.path.join(self.root, name)
+        if self.kind == 'json':
+            return FileBackend(path('jobs.json'), path('job_history.json'), path('job_state.db'), path('blobs'))
+        if self.kind == 'jsonl':
+            return FileBackend(path('jobs.json'), path('job_history.jsonl'), path('job_state.db'), path('blobs'))
+        if self.kind == 'sqlite':
+            return SQLiteBackend(path('jobs.db'), path('jobs.json'), path('job_history.jsonl'), path('blobs'))
+        if self.kind == 'postgres':
+            from postgres_store import PostgresBackend
+            return PostgresBackend(self._schema_dsn, 10, path('jobs.json'), path('job_history.jsonl'), path('blobs'))
+        raise ValueError(f"Unknown backend: {self.kind}")
+
+    def open(self, **options):
+        return JobManager(backend=self.backend(), **options)
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        if self.schema:
+            import psycopg2
+            conn = psycopg2.connect(self.dsn)
+            with conn, conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA {self.schema} CASCADE")
+            conn.close()
+
+
+class ConformanceError(AssertionError):
+    pass
+
+
+def check(condition, message):
+    if not condition:
+        raise ConformanceError(message)
+
+
+def _record(manager, job_id, count, success=lambda i: True, content=None):
+    ids = []
+    for i in range(count):
+        ids.append(manager.record_execution(job_id, 200 if success(i) else 500, 0.01 * (i + 1), success(i),
+                                            None if success(i) else 'HTTP 500', content))
+    return ids
+
+
+def check_jobs(factory):
+    """Jobs CRUD round-trips and keeps insertion order"""
+    manager = factory.open()
+    try:
+        first = manager.add_job('first', 'https://example.com/a', '*/5 * * * *', 'POST',
+                                {'Content-Type': 'application/json'}, '{"a": 1}')
+        second = manager.add_job('second', 'https://example.com/b', '0 * * * *')
+        job = manager.get_job(first)
+        check(job is not None, "get_job returns an added job")
+        for field, value in (('name', 'first'), ('url', 'https://example.com/a'), ('method', 'POST'),
+                             ('headers', {'Content-Type': 'application/json'}), ('payload', '{"a": 1}'),
+                             ('active', True), ('last_run', None), ('last_status', None)):
+            check(getattr(job, field) == value, f"job field {field} round-trips, got {getattr(job, field)!r}")
+        check([j.id for j in manager.get_all_jobs()] == [first, second], "get_all_jobs lists jobs oldest first")
+        check(manager.get_job_names([first, 'missing']) == {first: 'first'}, "get_job_names skips unknown ids")
+
+        manager.update_job_status(first, False)
+        check(manager.get_job(first).active is False, "update_job_status deactivates a job")
+        manager.get_job(first).headers['X-Mutated'] = '1'
+        check('X-Mutated' not in manager.get_job(first).headers, "returned jobs are copies")
+
+        manager.delete_job(second)
+        check(manager.get_job(second) is None, "delete_job removes the job")
+        check(manager.get_job('missing') is None, "get_job returns None for unknown ids")
+
+        bulk = [job.id for job in manager.add_jobs([
+            {'name': f'bulk-{i}', 'url': 'https://example.com/bulk', 'cron_expression': '0 0 * * *', 'active': i != 1}
+            for i in range(3)
+        ])]
+        check([j.id for j in manager.get_all_jobs()] == [first] + bulk, "add_jobs stores every job, in order")
+        check(manager.get_job(bulk[1]).active is False, "add_jobs keeps each job's active flag")
+    finally:
+        manager.close()
+
+    manager = factory.open()
+    try:
+        check([j.id for j in manager.get_all_jobs()] == [first] + bulk, "jobs survive reopening the store")
+    finally:
+        manager.close()
+
+
+def check_revisions(factory):
+    """Edits add immutable revisions and history rows point at the revision that ran"""
+    manager = factory.open()
+    try:
+        job_id = manager.add_job('rev', 'https://example.com/v1', '*/5 * * * *', headers={'X-A': '1'})
+        first = manager.get_job(job_id).revision_id
+        check(first is not None, "add_job starts a job at a revision")
+        _record(manager, job_id, 2)
+
+        manager.update_job(job_id, url='https://example.com/v2', headers={'X-A': '2'})
+        job = manager.get_job(job_id)
+        check(job.url == 'https://example.com/v2' and job.headers == {'X-A': '2'}, "update_job changes the job")
+        check(job.revision_id not in (None, first), "update_job moves the job to a new revision")
+        check(manager.update_job(job_id, url='https://example.com/v2').revision_id == job.revision_id,
+              "an update that changes nothing keeps the revision")
+        _record(manager, job_id, 3)
+        manager.flush()
+
+        revisions = manager.list_revisions(job_id)
+        check([r.number for r in revisions] == [2, 1], "list_revisions returns revisions newest first")
+        check(revisions[1].url == 'https://example.com/v1' and revisions[1].headers == {'X-A': '1'},
+              "old revisions keep their configuration")
+        history = manager.get_job_history(10)
+        check([r.revision_id for r in history] == [job.revision_id] * 3 + [first] * 2,
+              "history rows carry the revision they ran with")
+        counts = [entry['stats']['total_executions'] for entry in manager.compare_revisions(job_id)]
+        check(counts == [3, 2], f"compare_revisions groups executions by revision, got {counts}")
+    finally:
+        manager.close()
+
+    manager = factory.open()
+    try:
+        check(manager.get_job(job_id).revision_id == job.revision_id, "the current revision survives reopening")
+        check(manager.get_revision(first).url == 'https://example.com/v1', "revisions survive reopening")
+        check(manager.get_job_history(1)[0].revision_id == job.revision_id, "history revision ids survive reopening")
+    finally:
+        manager.close()
+
+
+def check_retries(factory):
+    """Retry policies round-trip as revisioned configuration and retries link to their first attempt"""
+    manager = factory.open()
+    try:
+        job_id = manager.add_job('retry', 'https://example.com', '* * * * *', retry_policy={'max_attempts': 3})
+        job = manager.get_job(job_id)
+        check(job.retry_policy and job.retry_policy['max_attempts'] == 3, "retry_policy round-trips")
+        check(job.retry_policy['backoff'] == 10, "retry_policy defaults are filled in")
+        first_revision = job.revision_id
+        manager.update_job(job_id, retry_policy=dict(job.retry_policy, max_attempts=5))
+        job = manager.get_job(job_id)
+        check(job.retry_policy['max_attempts'] == 5 and job.revision_id != first_revision,
+              "changing retry_policy starts a new revision")
+        check(manager.get_revision(first_revision).retry_policy['max_attempts'] == 3,
+              "revisions keep their retry_policy")
+        try:
+            manager.update_job(job_id, retry_policy={'max_attempts': 0})
+            check(False, "update_job rejects an invalid retry_policy")
+        except ValueError:
+            pass
+
+        first = manager.record_execution(job_id, 503, 0.1, False, 'HTTP 503')
+        manager.record_execution(job_id, 503, 0.1, False, 'HTTP 503', attempt=2, retry_of=first)
+        manager.record_execution(job_id, 200, 0.1, True, attempt=3, retry_of=first)
+        manager.flush()
+        history = manager.get_job_history(10)
+        check([(r.attempt, r.retry_of) for r in history] == [(3, first), (2, first), (1, None)],
+              "history rows carry their attempt and first attempt")
+
+        manager.record_execution(job_id, None, 0, False, 'Circuit open', short_circuited=True)
+        manager.flush()
+        check(manager.get_job_history(1)[0].short_circuited, "short-circuited runs are flagged")
+        stats = manager.get_job_stats(job_id)
+        check(stats['total_executions'] == 3 and stats['failure_streak'] == 0,
+              "short-circuited runs are left out of stats")
+        check(sum(b['count'] for b in manager.get_job_rollups(job_id, 'day')) == 3,
+              "short-circuited runs are left out of rollups")
+        check(manager.get_job(job_id).last_status == 'short_circuited',
+              "short-circuited runs get their own last_status")
+    finally:
+        manager.close()
+
+    manager = factory.open()
+    try:
+        check(manager.get_job(job_id).retry_policy['max_attempts'] == 5, "retry_policy survives reopening")
+        history = manager.get_job_history(2)
+        check(history[0].short_circuited and not history[1].short_circuited, "short-circuit flags survive reopening")
+        check(history[1].retry_of == first, "attempt links survive reopening")
+    finally:
+        manager.close()
+
+
+def check_hot_state(factory):
+    """Executions update last_run/last_status, before and after they are flushed"""
+    manager = factory.open(flush_interval_ms=60000)
+    try:
+        job_id = manager.add_job('state', 'https://example.com', '* * * * *')
+        _record(manager, job_id, 1, success=lambda i: False)
+        check(manager.get_job(job_id).last_status == 'failed', "queued executions show in get_job")
+        manager.flush()
+        job = manager.get_job(job_id)
+        check(job.last_status == 'failed' and job.last_run, "flushed executions set last_run/last_status")
+        manager.update_job_last_run(job_id, 200, True)
+        check(manager.get_all_jobs()[0].last_status == 'success', "update_job_last_run sets last_status")
+        fire_time = datetime.now(timezone.utc).replace(second=0, microsecond=0).isoformat()
+        check(manager.claim_run(job_id, fire_time) is True, "the first claim on a firing wins")
+    finally:
+        manager.close()
+
+
+def check_history(factory):
+    """History appends, tails, pages and filters consistently"""
+    manager = factory.open()
+    try:
+        job_a = manager.add_job('a', 'https://example.com/a', '* * * * *')
+        job_b = manager.add_job('b', 'https://example.com/b', '* * * * *')
+        ids = []
+        for i in range(30):
+            ids += _record(manager, job_a if i % 3 else job_b, 1, success=lambda _: i % 5 != 0)
+
+        recent = manager.get_job_history(10)
+        check([r.id for r in recent] == ids[::-1][:10], "get_job_history returns the newest records first")
+        manager.flush()
+        check([r.id for r in manager.get_job_history(10)] == ids[::-1][:10], "tail matches after a flush")
+
+        seen, cursor, pages = [], None, []
+        while True:
+            page = manager.query_history(limit=7, cursor=cursor)
+            pages.append(page)
+            seen += [r.id for r in page['records']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        check(seen == ids[::-1], "next cursors visit every record exactly once, newest first")
+        back = manager.query_history(limit=7, cursor=pages[-1]['prev_cursor'])
+        check([r.id for r in back['records']] == [r.id for r in pages[-2]['records']],
+              "a prev cursor returns the previous page")
+
+        only_b = manager.query_history(job_id=job_b, limit=100)['records']
+        check(len(only_b) == 10 and all(r.job_id == job_b for r in only_b), "job_id filter")
+        failed = manager.query_history(success=False, limit=100)['records']
+        check(len(failed) == 6 and not any(r.success for r in failed), "success filter")
+        middle = manager.query_history(limit=100)['records'][10].timestamp
+        newer = manager.query_history(since=middle, limit=100)['records']
+        check(newer and all(r.timestamp >= middle for r in newer), "since filter is inclusive")
+        older = manager.query_history(until=middle, limit=100)['records']
+        check(all(r.timestamp < middle for r in older), "until filter is exclusive")
+        try:
+            manager.query_history(cursor='not-a-cursor')
+            check(False, "a malformed cursor raises ValueError")
+        except ValueError:
+            pass
+    finally:
+        manager.close()
+
+
+def check_stats_and_rollups(factory):
+    """Running stats and rollups agree with the recorded executions"""
+    manager = factory.open()
+    try:
+        job_id = manager.add_job('stats', 'https://example.com', '* * * * *')
+        _record(manager, job_id, 20, success=lambda i: i % 4 != 0)
+        stats = manager.get_job_stats(job_id)
+        check(stats['total_executions'] == 20 and stats['failed_executions'] == 5, "stats include queued records")
+        manager.flush()
+        stats = manager.get_all_job_stats()[job_id]
+        check(stats['total_executions'] == 20 and stats['success_rate'] == 75.0, "stats after a flush")
+        check(stats['p50_execution_time'] > 0, "latency percentiles are tracked")
+        rollups = manager.get_job_rollups(job_id, 'day')
+        check(sum(b['count'] for b in rollups) == 20, "day rollups count every execution")
+        try:
+            manager.get_job_rollups(job_id, 'week')
+            check(False, "an unknown granularity raises ValueError")
+        except ValueError:
+            pass
+    finally:
+        manager.close()
+
+
+def check_blobs_and_retention(factory):
+    """Response bodies are stored once, served by hash, and history can be expired and cleared"""
+    manager = factory.open()
+    try:
+        job_id = manager.add_job('blobs', 'https://example.com', '* * * * *')
+        _record(manager, job_id, 3, content='x' * 1500)
+        records = manager.get_job_history(3)
+        hashes = {r.response_hash for r in records}
+        check(len(hashes) == 1 and records[0].response_size == 1000, "identical bodies share one hash, truncated")
+        check(manager.get_response_content(hashes.pop()) == 'x' * 1000, "bodies load by hash")
+        check(manager.get_response_content('0' * 64) is None, "unknown hashes return None")
+
+        check(manager.expire_history() == 0, "expire_history keeps recent records")
+        check(len(manager.get_job_history(10)) == 3, "recent records survive expiry")
+        manager.expire_history(now=datetime.now() + timedelta(days=3650))
+        check(manager.get_job(job_id) is not None, "expiry leaves job definitions alone")
+
+        manager.clear_history()
+        check(manager.get_job_history(10) == [], "clear_history empties history")
+        check(manager.get_all_job_stats() == {}, "clear_history resets stats")
+    finally:
+        manager.close()
+
+
+CHECKS = (check_jobs, check_revisions, check_retries, check_hot_state, check_history, check_stats_and_rollups,
+          check_blobs_and_retention)
+
+
+def run_conformance(kind, dsn=None):
+    """Run every check on a fresh store per check; return the number of failures"""
+    failures = 0
+    for check_fn in CHECKS:
+        factory = StoreFactory(kind, dsn)
+        try:
+            check_fn(factory)
+            print(f"  ok    {check_fn.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"  FAIL  {check_fn.__name__}: {type(e).__name__}: {e}")
+        finally:
+            factory.cleanup()
+    return failures
+
+
+def _timed(name, fn):
+    """Run fn, which returns how many operations it did, and return (name, ops, seconds)"""
+    started = time.perf_counter()
+    count = fn()
+    return name, count, time.perf_counter() - started
+
+
+def run_benchmark(kind, dsn=None, records=5000, jobs=50):
+    """Run the standard workload on a fresh store and return [(operation, ops, seconds)]"""
+    factory = StoreFactory(kind, dsn)
+    manager = factory.open()
+    try:
+        job_ids = []
+
+        def add_jobs():
+            job_ids.extend(manager.add_job(f'bench-{i}', 'https://example.com', '* * * * *') for i in range(jobs))
+            return jobs
+
+        def record_all():
+            for i in range(records):
+                manager.record_execution(job_ids[i % jobs], 200, 0.05, i % 10 != 0, None,
+                                         f'body {i % 20}' if i % 2 else None)
+            manager.flush()
+            return records
+
+        def repeat(count, fn):
+            def run():
+                for i in range(count):
+                    fn(i)
+                return count
+            return run
+
+        def page_through(**filters):
+            pages, cursor = 0, None
+            while True:
+                page = manager.query_history(limit=100, cursor=cursor, **filters)
+                pages += 1
+                cursor = page['next_cursor']
+                if not cursor:
+                    return pages
+
+        return [
+            _timed('add_job', add_jobs),
+            _timed('record_execution', record_all),
+            _timed('get_job', repeat(records // 5, lambda i: manager.get_job(job_ids[i % jobs]))),
+            _timed('get_all_jobs', repeat(200, lambda i: manager.get_all_jobs())),
+            _timed('get_job_history(100)', repeat(200, lambda i: manager.get_job_history(100))),
+            _timed('get_all_job_stats', repeat(200, lambda i: manager.get_all_job_stats())),
+            _timed('query_history page', page_through),
+            _timed('query_history job page', lambda: page_through(job_id=job_ids[0]))
+        ]
+    finally:
+        manager.close()
+        factory.cleanup()
+
+
+def run_stress(kind, dsn=None, threads=200, executions=10, jobs=20, flush_interval_ms=200):
+    """Hammer one JobManager from many threads at once and check nothing was lost
+
+    Each worker records ``executions`` runs spread over the jobs while
+    reading jobs and stats, and every tenth worker also toggles a job and
+    sets its last run. Afterwards every recorded id must be in history,
+    per-job stats must count exactly the runs recorded, no job's last_run
+    may be older than its newest record and each job's active flag must
+    match the number of toggles. Returns (ops, seconds, problems).
+    """
+    factory = StoreFactory(kind, dsn)
+    manager = factory.open(flush_interval_ms=flush_interval_ms)
+    try:
+        job_ids = [manager.add_job(f'stress-{i}', 'https://example.com', '* * * * *') for i in range(jobs)]
+        recorded = {job_id: [] for job_id in job_ids}
+        failures = dict.fromkeys(job_ids, 0)
+        toggles = dict.fromkeys(job_ids, 0)
+        tally_lock = threading.Lock()
+        errors = []
+        start = threading.Barrier(threads)
+
+        def toggle(job_id):
+            with manager.job_lock(job_id):
+                manager.update_job_status(job_id, not manager.get_job(job_id).active)
+            with tally_lock:
+                toggles[job_id] += 1
+
+        def worker(n):
+            try:
+                start.wait()
+                for i in range(executions):
+                    job_id = job_ids[(n + i) % jobs]
+                    success = (n + i) % 4 != 0
+                    record_id = manager.record_execution(job_id, 200 if success else 500, 0.001 * (i + 1), success,
+                                                         None if success else 'HTTP 500', f'body {n % 3}')
+                    with tally_lock:
+                        recorded[job_id].append(record_id)
+                        failures[job_id] += not success
+                    manager.get_job(job_id)
+                    if i % 5 == 0:
+                        manager.get_job_stats(job_id)
+                    if n % 10 == 0:
+                        toggle(job_id)
+                        manager.update_job_last_run(job_id, 200, True)
+            except Exception as e:
+                errors.append(f"worker {n}: {type(e).__name__}: {e}")
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        started = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        manager.flush()
+        elapsed = time.perf_counter() - started
+
+        problems = list(errors)
+        history, cursor = {}, None
+        while True:
+            page = manager.query_history(limit=500, cursor=cursor)
+            history.update((r.id, r) for r in page['records'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        all_ids = {record_id for ids in recorded.values() for record_id in ids}
+        # The legacy JSON history only keeps its newest max_records entries
+        kept = getattr(manager.backend.history, 'max_records', None) if kind == 'json' else None
+        if kept is None and set(history) != all_ids:
+            problems.append(f"history has {len(history)} of {len(all_ids)} records")
+        elif kept is not None and (len(history) != min(kept, len(all_ids)) or not set(history) <= all_ids):
+            problems.append(f"history has {len(history)} records, expected the newest {min(kept, len(all_ids))}")
+
+        stats = manager.get_all_job_stats()
+        for job_id in job_ids:
+            job_stats = stats.get(job_id, {})
+            if job_stats.get('total_executions') != len(recorded[job_id]):
+                problems.append(f"job {job_id} counted {job_stats.get('total_executions')} "
+                                f"of {len(recorded[job_id])} executions")
+            elif job_stats.get('failed_executions') != failures[job_id]:
+                problems.append(f"job {job_id} counted {job_stats.get('failed_executions')} "
+                                f"of {failures[job_id]} failures")
+            job = manager.get_job(job_id)
+            newest = max((history[i].timestamp for i in recorded[job_id] if i in history), default=None)
+            if newest and (not job.last_run or job.last_run < newest):
+                problems.append(f"job {job_id} last_run {job.last_run} is older than its newest record {newest}")
+            if job.active != (toggles[job_id] % 2 == 0):
+                problems.append(f"job {job_id} active={job.active} after {toggles[job_id]} toggles")
+
+        ops = threads * executions
+        return ops, elapsed, problems
+    finally:
+        manager.close()
+        factory.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage backend conformance checks and benchmark")
+    parser.add_argument('command', choices=('conformance', 'bench', 'stress'))
+    parser.add_argument('backends', nargs='*', help=f"any of {', '.join(BACKENDS)} (default: all available)")
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'), help="Postgres DSN (default $DATABASE_URL)")
+    parser.add_argument('--records', type=int, default=5000, help="executions recorded by the benchmark")
+    parser.add_argument('--threads', type=int, default=200, help="concurrent worker threads for the stress test")
+    parser.add_argument('--executions', type=int, default=10, help="executions recorded per stress worker")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    unknown = set(args.backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(sorted(unknown))}")
+    backends = args.backends or [kind for kind in BACKENDS if kind != 'postgres' or args.dsn]
+
+    failed = False
+    for kind in backends:
+        print(f"{kind}:")
+        if args.command == 'conformance':
+            failed |= run_conformance(kind, args.dsn) > 0
+            continue
+        if args.command == 'stress':
+            # Once through the write-behind buffer and once committing every record inline
+            for mode, flush_interval_ms in (('buffered', 200), ('inline', 0)):
+                ops, elapsed, problems = run_stress(kind, args.dsn, args.threads, args.executions,
+                                                    flush_interval_ms=flush_interval_ms)
+                status = 'ok' if not problems else 'FAIL'
+                print(f"  {status:<5} {mode:<9} {args.threads} threads  {ops:>7} executions  {elapsed:8.3f}s  "
+                      f"{ops / elapsed if elapsed else 0:>8.0f} ops/s")
+                for problem in problems[:10]:
+                    print(f"        {problem}")
+                failed |= bool(problems)
+            continue
+        for name, count, elapsed in run_benchmark(kind, args.dsn, args.records):
+            print(f"  {name:<24} {count:>7} ops  {elapsed:8.3f}s  {count / elapsed if elapsed else 0:>10.0f} ops/s")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
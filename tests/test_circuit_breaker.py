@@ -0,0 +1,115 @@
+import pytest
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+HOST = 'api.example.com'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock that only moves when told to"""
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', lambda: now[0])
+
+    def advance(seconds):
+        now[0] += seconds
+    return advance
+
+
+def fail(breaker, times, host=HOST):
+    for _ in range(times):
+        breaker.record(host, True, 0.1)
+
+
+def test_opens_once_enough_recent_requests_failed(clock):
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=4)
+    fail(breaker, 3)
+    assert breaker.state(HOST) == CLOSED
+    breaker.record(HOST, False, 0.1)
+    assert breaker.state(HOST) == OPEN
+    assert breaker.state('other.example.com') == CLOSED
+
+
+def test_stays_closed_below_the_failure_rate(clock):
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=4)
+    for failed in (True, False, False, False, True, False, False):
+        breaker.record(HOST, failed, 0.1)
+    assert breaker.state(HOST) == CLOSED
+
+
+def test_slow_requests_count_towards_opening(clock):
+    breaker = CircuitBreaker(min_calls=2, slow_call_seconds=5)
+    breaker.record(HOST, False, 6)
+    breaker.record(HOST, False, 7)
+    assert breaker.state(HOST) == OPEN
+
+
+def test_outcomes_outside_the_window_expire(clock):
+    breaker = CircuitBreaker(min_calls=3, window_seconds=60)
+    fail(breaker, 2)
+    clock(61)
+    fail(breaker, 1)
+    assert breaker.state(HOST) == CLOSED
+
+
+def test_open_circuit_turns_runs_away_then_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=30)
+    fail(breaker, 1)
+    assert not breaker.allow(HOST)
+    clock(31)
+    assert breaker.allow(HOST)
+    assert breaker.state(HOST) == HALF_OPEN
+    assert not breaker.allow(HOST)
+    metrics = breaker.metrics()[0]
+    assert metrics['short_circuited'] == 2 and metrics['opened'] == 1
+
+
+def test_successful_probe_closes_the_circuit(clock):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=30)
+    fail(breaker, 1)
+    clock(31)
+    assert breaker.allow(HOST)
+    breaker.record(HOST, False, 0.1)
+    assert breaker.state(HOST) == CLOSED
+    assert breaker.allow(HOST) and breaker.allow(HOST)
+
+
+def test_failed_probe_reopens_the_circuit(clock):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=30)
+    fail(breaker, 1)
+    clock(31)
+    assert breaker.allow(HOST)
+    fail(breaker, 1)
+    assert breaker.state(HOST) == OPEN
+    assert breaker.metrics()[0]['opened'] == 2
+
+
+def test_probe_that_never_reports_back_is_replaced(clock):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=30)
+    fail(breaker, 1)
+    clock(31)
+    assert breaker.allow(HOST)
+    clock(10)
+    assert not breaker.allow(HOST)
+    clock(21)
+    assert breaker.allow(HOST)
+
+
+def test_results_of_runs_admitted_before_opening_are_ignored(clock):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=30)
+    fail(breaker, 1)
+    breaker.record(HOST, False, 0.1)
+    assert breaker.state(HOST) == OPEN
+
+
+def test_zero_failure_rate_disables_the_breaker(clock):
+    breaker = CircuitBreaker(failure_rate=0, min_calls=1)
+    fail(breaker, 5)
+    assert breaker.allow(HOST)
+    assert breaker.metrics() == []
+
+
+@pytest.mark.parametrize('options', [{'failure_rate': 1.5}, {'min_calls': 0}, {'open_seconds': 0}])
+def test_rejects_invalid_settings(options):
+    with pytest.raises(ValueError):
+        CircuitBreaker(**options)
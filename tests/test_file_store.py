@@ -0,0 +1,44 @@
+import pytest
+from file_store import FileBackend
+from job_manager import JobManager
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = lambda name: str(tmp_path / name)
+    backend = FileBackend(path('jobs.json'), path('job_history.jsonl'), path('job_state.db'), path('blobs'))
+    manager = JobManager(backend=backend, flush_interval_ms=60000)
+    yield backend, manager
+    manager.close()
+
+
+def fail_once(monkeypatch, target, name, error):
+    original = getattr(target, name)
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise error
+        return original(*args, **kwargs)
+    monkeypatch.setattr(target, name, flaky)
+
+
+@pytest.mark.parametrize('step', ['history', 'state'])
+def test_retried_flush_records_each_execution_once(store, monkeypatch, step):
+    backend, manager = store
+    job_id = manager.add_job('job', 'https://example.com', '* * * * *')
+    if step == 'history':
+        fail_once(monkeypatch, backend.history, 'append_many', OSError("No space left on device"))
+    else:
+        fail_once(monkeypatch, backend.state, 'apply_records', RuntimeError("database is locked"))
+
+    manager.record_execution(job_id, 200, 0.1, True)
+    manager.record_execution(job_id, 500, 0.1, False, 'HTTP 500')
+    manager.flush()
+    assert manager.get_write_metrics()['flush_errors'] == 1
+    manager.flush()
+
+    assert len(list(backend.history.iter_records())) == 2
+    stats = manager.get_job_stats(job_id)
+    assert stats['total_executions'] == 2 and stats['failed_executions'] == 1
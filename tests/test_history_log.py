@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+import pytest
+from history_index import SegmentIndex
+from history_log import HistoryLog
+from history_query import decode_cursor
+from records import ExecutionRecord
+
+START = datetime(2024, 1, 1)
+
+
+def record(i, minutes=None, job_id='job'):
+    timestamp = (START + timedelta(minutes=i if minutes is None else minutes)).isoformat()
+    return ExecutionRecord(f'rec-{i:05d}', job_id, timestamp, 200, 0.1, True)
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = HistoryLog(str(tmp_path / 'job_history.jsonl'), segment_max_bytes=4096, maintenance_interval=0,
+                     index_every=4)
+    yield log
+    log.close()
+
+
+def pages(log, limit, **filters):
+    seen, cursor = [], None
+    while True:
+        page = log.query(limit, decode_cursor(cursor) if cursor else None, **filters)
+        seen.append([r.id for r in page['records']])
+        cursor = page['next_cursor']
+        if not cursor:
+            return seen
+
+
+def test_segment_index_tracks_block_bounds():
+    buf = ''.join(f'{{"id":"r{i}","timestamp":"{ts}"}}\n' for i, ts in enumerate('13254768')).encode()
+    index = SegmentIndex(every=4)
+    # The last line is still being written
+    index.extend(buf, len(buf) - 1)
+    assert index.count == 7 and index.offsets[0] == 0
+    assert (index.min_ts, index.max_ts) == (['1', '4'], ['5', '7'])
+    index.extend(buf, len(buf))
+    assert index.count == 8 and index.max_ts[1] == '8'
+    assert index.block_of(index.offsets[1]) == 1 and index.block_of(index.offsets[1] - 1) == 0
+    assert index.ends_before(0, '6') and not index.ends_before(0, '5')
+    # Reading backwards from block 1's start skips only records newer than '3'
+    assert index.end_before('3', len(buf)) == index.offsets[1]
+    assert index.end_before('9', len(buf)) == len(buf)
+
+
+def test_pages_seek_through_rotated_segments(log):
+    ids = []
+    for batch in range(6):
+        records = [record(batch * 20 + i) for i in range(20)]
+        log.append_many(records)
+        ids += [r.id for r in records]
+        log.rotate()
+    assert len(log._sealed_segments()) > 1
+    assert sum(pages(log, 7), []) == ids[::-1]
+    assert [r.id for r in log.tail(5)] == ids[::-1][:5]
+
+
+def test_next_pages_resume_from_their_position_hint(log, monkeypatch):
+    log.append_many([record(i) for i in range(40)])
+    first = log.query(10)
+    cursor = decode_cursor(first['next_cursor'])
+    assert cursor['p']
+
+    starts = []
+    iter_reverse = log.iter_reverse
+
+    def spy(start=None, **kwargs):
+        starts.append(start)
+        return iter_reverse(start, **kwargs)
+    monkeypatch.setattr(log, 'iter_reverse', spy)
+    second = log.query(10, cursor)
+    assert starts == [tuple(cursor['p'])]
+    assert [r.id for r in second['records']] == [f'rec-{i:05d}' for i in range(29, 19, -1)]
+
+
+def test_time_bounds_skip_blocks_but_not_out_of_order_records(log):
+    # Records land in the log slightly out of time order
+    minutes = [i + (3 if i % 5 == 0 else 0) for i in range(60)]
+    log.append_many([record(i, m) for i, m in enumerate(minutes)])
+    since = (START + timedelta(minutes=30)).isoformat()
+    until = (START + timedelta(minutes=45)).isoformat()
+    expected = {f'rec-{i:05d}' for i, m in enumerate(minutes)
+                if since <= (START + timedelta(minutes=m)).isoformat() < until}
+    found = sum(pages(log, 4, since=since, until=until), [])
+    assert set(found) == expected and len(found) == len(expected)
+
+
+def test_prev_cursor_returns_the_newer_page(log):
+    log.append_many([record(i) for i in range(30)])
+    first = log.query(10)
+    second = log.query(10, decode_cursor(first['next_cursor']))
+    back = log.query(10, decode_cursor(second['prev_cursor']))
+    assert [r.id for r in back['records']] == [r.id for r in first['records']]
+
+
+def test_expire_before_drops_old_segments_and_counts_records(log):
+    log.append_many([record(i) for i in range(40)])
+    log.rotate()
+    log.append_many([record(i, minutes=1000 + i) for i in range(40, 50)])
+    cutoff = (START + timedelta(minutes=500)).isoformat()
+    assert log.expire_before(cutoff) == 40
+    assert [r.id for r in log.iter_records()] == [f'rec-{i:05d}' for i in range(40, 50)]
+
+
+def test_clear_leaves_open_readers_working(log):
+    log.append_many([record(i) for i in range(50)])
+    reader = log.iter_reverse()
+    assert next(reader).id == 'rec-00049'
+    log.clear()
+    # The reader still has the old segment mapped; truncating it would crash here
+    assert sum(1 for _ in reader) == 49
+    assert log.is_empty() and log.tail(10) == []
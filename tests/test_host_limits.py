@@ -0,0 +1,83 @@
+import pytest
+from host_limits import HostLimiter, TokenBucket, parse_host_limits
+
+
+def test_parse_host_limits():
+    assert parse_host_limits('api.example.com=2:0.5, .example.org=4,slow.example.net=:1') == {
+        'api.example.com': (2, 0.5),
+        '.example.org': (4, 0.0),
+        'slow.example.net': (0, 1.0)
+    }
+    assert parse_host_limits('') == {}
+
+
+@pytest.mark.parametrize('text', ['api.example.com', '=2', 'api.example.com=x', 'api.example.com=-1'])
+def test_parse_host_limits_rejects_bad_entries(text):
+    with pytest.raises(ValueError):
+        parse_host_limits(text)
+
+
+def test_token_bucket_reserves_tokens_ahead():
+    bucket = TokenBucket(rate=2, burst=1)
+    now = bucket.updated
+    assert bucket.reserve(now) == 0
+    assert bucket.reserve(now) == pytest.approx(0.5)
+    assert bucket.reserve(now) == pytest.approx(1.0)
+    assert bucket.reserve(now + 1.0) == pytest.approx(0.5)
+
+
+def test_runs_over_the_concurrency_cap_queue_in_order():
+    limiter = HostLimiter(max_concurrency=1)
+    started = []
+    assert limiter.acquire('a.example.com', None) == 0
+    assert limiter.acquire('a.example.com', lambda delay: started.append('second')) is None
+    assert limiter.acquire('a.example.com', lambda delay: started.append('third')) is None
+    # Other hosts have slots of their own
+    assert limiter.acquire('b.example.com', None) == 0
+    assert limiter.metrics()[0]['queued'] == 2
+
+    limiter.release('a.example.com')
+    assert started == ['second']
+    limiter.release('a.example.com')
+    limiter.release('a.example.com')
+    assert started == ['second', 'third']
+    assert limiter.metrics()[0]['in_flight'] == 0
+
+
+def test_handed_over_slots_still_respect_the_rate_limit():
+    limiter = HostLimiter(max_concurrency=1, rate=1, burst=1)
+    delays = []
+    assert limiter.acquire('a.example.com', delays.append) == 0
+    assert limiter.acquire('a.example.com', delays.append) is None
+    limiter.release('a.example.com')
+    assert len(delays) == 1 and 0.9 < delays[0] <= 1.0
+
+
+def test_cancel_drops_only_the_owners_queued_runs():
+    limiter = HostLimiter(max_concurrency=1)
+    started = []
+    limiter.acquire('a.example.com', None, owner='job-1')
+    limiter.acquire('a.example.com', lambda delay: started.append('job-1'), owner='job-1')
+    limiter.acquire('a.example.com', lambda delay: started.append('job-2'), owner='job-2')
+    assert limiter.cancel('job-1') == 1
+    limiter.release('a.example.com')
+    assert started == ['job-2']
+
+
+def test_domain_overrides_share_one_group():
+    limiter = HostLimiter(overrides={'.example.org': (1, 0)})
+    assert limiter.group_for('a.example.org') == limiter.group_for('example.org') == '.example.org'
+    assert limiter.group_for('example.com') == 'example.com'
+    assert limiter.acquire('a.example.org', None) == 0
+    assert limiter.acquire('b.example.org', lambda delay: None) is None
+    # Hosts without an override get the default, unlimited here
+    assert limiter.acquire('example.com', None) == 0 and limiter.acquire('example.com', None) == 0
+
+
+def test_waits_are_reported_per_group():
+    limiter = HostLimiter()
+    for seconds in (0.0, 0.01, 0.5, 2.0):
+        limiter.record_wait('a.example.com', seconds)
+    metrics = limiter.metrics()[0]
+    assert metrics['admitted'] == 4 and metrics['delayed'] == 2
+    assert metrics['max_wait'] == 2.0 and metrics['p95_wait'] == 0.5
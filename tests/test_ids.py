@@ -0,0 +1,44 @@
+import uuid
+from datetime import datetime
+import pytest
+import ids
+from ids import new_id_and_timestamp, uuid7
+
+
+@pytest.fixture(autouse=True)
+def restore_id_clock(monkeypatch):
+    # Tests below pass their own times; start each from a clean clock and
+    # don't leave later ids pinned to a time in the future
+    monkeypatch.setattr(ids, '_last_ms', 0)
+    monkeypatch.setattr(ids, '_last_seq', 0)
+
+
+def test_uuid7_layout():
+    value = uuid.UUID(uuid7(unix_ms=1700000000000))
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+    assert value.int >> 80 == 1700000000000
+
+
+def test_ids_strictly_increase_within_a_process():
+    ids = [uuid7() for _ in range(10000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert [uuid.UUID(i) for i in ids] == sorted(uuid.UUID(i) for i in ids)
+
+
+def test_ids_sort_by_creation_time():
+    assert uuid7(unix_ms=2000000000000) < uuid7(unix_ms=2000000000001) < uuid7(unix_ms=2000000001000)
+
+
+def test_a_clock_stepping_back_keeps_ids_increasing():
+    later = uuid7(unix_ms=2100000000000)
+    earlier = uuid7(unix_ms=2000000000000)
+    assert earlier > later
+    assert uuid.UUID(earlier).int >> 80 == 2100000000000
+
+
+def test_id_and_timestamp_come_from_the_same_instant():
+    record_id, timestamp = new_id_and_timestamp()
+    unix_ms = uuid.UUID(record_id).int >> 80
+    assert abs(datetime.fromisoformat(timestamp).timestamp() * 1000 - unix_ms) < 1
@@ -0,0 +1,78 @@
+import json
+import os
+import stat
+from job_table import JobTable, journal_path_for, read_table
+
+
+def job(job_id, name=None):
+    return {'id': job_id, 'name': name or job_id, 'url': 'https://example.com', 'headers': {}}
+
+
+def test_mutations_survive_a_restart_through_the_journal(tmp_path):
+    path = str(tmp_path / 'jobs.json')
+    table = JobTable(path)
+    table.put(job('a'))
+    table.put_many([job('b'), job('c')])
+    table.update('a', name='renamed')
+    table.delete('b')
+    # No close(): the snapshot is still empty and the journal holds every change
+    with open(path) as f:
+        assert json.load(f) == []
+
+    jobs, replayed = read_table(path)
+    assert replayed == 4
+    assert [j['id'] for j in jobs.values()] == ['a', 'c'] and jobs['a']['name'] == 'renamed'
+    assert [j['id'] for j in JobTable(path).list()] == ['a', 'c']
+
+
+def test_torn_final_journal_entry_is_dropped_and_repaired(tmp_path):
+    path = str(tmp_path / 'jobs.json')
+    table = JobTable(path)
+    table.put(job('a'))
+    table.put(job('b'))
+    journal = journal_path_for(path)
+    with open(journal, 'a') as f:
+        # A crash halfway through appending the next entry
+        f.write('{"op":"put","job":{"id":"c","na')
+    size = os.path.getsize(journal)
+
+    jobs, replayed = read_table(path)
+    assert list(jobs) == ['a', 'b'] and replayed == 2
+    assert os.path.getsize(journal) == size
+
+    read_table(path, repair=True)
+    with open(journal) as f:
+        assert f.read().endswith('}\n')
+    reopened = JobTable(path)
+    reopened.put(job('c'))
+    assert [j['id'] for j in reopened.list()] == ['a', 'b', 'c']
+
+
+def test_unreadable_entry_mid_journal_is_skipped(tmp_path):
+    path = str(tmp_path / 'jobs.json')
+    with open(path, 'w') as f:
+        json.dump([job('a')], f)
+    with open(journal_path_for(path), 'w') as f:
+        f.write('not json\n')
+        f.write(json.dumps({'op': 'put', 'job': job('b')}) + '\n')
+    jobs, replayed = read_table(path)
+    assert list(jobs) == ['a', 'b'] and replayed == 1
+
+
+def test_journal_is_folded_into_a_snapshot(tmp_path):
+    path = str(tmp_path / 'jobs.json')
+    table = JobTable(path, snapshot_every=3)
+    for job_id in 'abc':
+        table.put(job(job_id))
+    assert os.path.getsize(journal_path_for(path)) == 0
+    with open(path) as f:
+        assert [j['id'] for j in json.load(f)] == ['a', 'b', 'c']
+
+
+def test_snapshot_keeps_the_file_permissions(tmp_path):
+    path = str(tmp_path / 'jobs.json')
+    JobTable(path)
+    os.chmod(path, 0o640)
+    table = JobTable(path, snapshot_every=1)
+    table.put(job('a'))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
@@ -0,0 +1,46 @@
+import pytest
+import retry_policy
+from retry_policy import RetryPolicy
+
+
+def test_backoff_grows_and_is_capped():
+    policy = RetryPolicy(max_attempts=5, backoff=10, multiplier=2, max_backoff=25, jitter=0)
+    assert [policy.delay(attempt) for attempt in (1, 2, 3, 4)] == [10, 20, 25, 25]
+
+
+def test_jitter_only_shortens_the_delay(monkeypatch):
+    policy = RetryPolicy(backoff=10, multiplier=1, jitter=0.2)
+    monkeypatch.setattr(retry_policy.random, 'random', lambda: 1.0)
+    assert policy.delay(1) == pytest.approx(8)
+    monkeypatch.setattr(retry_policy.random, 'random', lambda: 0.0)
+    assert policy.delay(1) == 10
+
+
+def test_should_retry():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry(1, status_code=503)
+    assert not policy.should_retry(1, status_code=404)
+    assert policy.should_retry(2, error_kind='timeout')
+    assert not policy.should_retry(1, error_kind='request')
+    assert not policy.should_retry(3, status_code=503)
+
+
+def test_from_dict_fills_in_defaults_and_round_trips():
+    policy = RetryPolicy.from_dict({'max_attempts': 4, 'retry_statuses': [500]})
+    assert policy.max_attempts == 4 and policy.backoff == 10 and policy.retry_statuses == (500,)
+    assert RetryPolicy.from_dict(policy.to_dict()).to_dict() == policy.to_dict()
+
+
+@pytest.mark.parametrize('data', [
+    {'max_attempts': 0},
+    {'max_attempts': 2.5},
+    {'backoff': True},
+    {'jitter': 2},
+    {'retry_statuses': [99]},
+    {'retry_errors': ['dns']},
+    {'color': 'red'},
+    [],
+])
+def test_from_dict_rejects_invalid_policies(data):
+    with pytest.raises(ValueError):
+        RetryPolicy.from_dict(data)
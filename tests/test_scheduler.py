@@ -0,0 +1,212 @@
+import asyncio
+import functools
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from async_engine import AsyncCronScheduler, aiohttp
+from circuit_breaker import OPEN, CircuitBreaker
+from file_store import FileBackend
+from host_limits import HostLimiter
+from job_manager import JobManager
+from scheduler import CronScheduler
+
+ENGINES = [
+    pytest.param(CronScheduler, id='thread'),
+    pytest.param(AsyncCronScheduler, id='asyncio', marks=pytest.mark.skipif(aiohttp is None, reason="needs aiohttp")),
+]
+
+
+class Endpoint:
+    """Local HTTP server answering each path with its queued statuses (200 once they run out)"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.statuses = {}
+        self.hits = []
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                endpoint.hits.append(self.path)
+                time.sleep(endpoint.delay)
+                queued = endpoint.statuses.get(self.path)
+                self.send_response(queued.pop(0) if queued else 200)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'ok')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def endpoint():
+    endpoint = Endpoint()
+    yield endpoint
+    endpoint.close()
+
+
+@pytest.fixture
+def manager(tmp_path):
+    path = lambda name: str(tmp_path / name)
+    manager = JobManager(backend=FileBackend(path('jobs.json'), path('job_history.jsonl'), path('job_state.db'),
+                                             path('blobs')))
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def start_engine(manager):
+    engines = []
+
+    def start(engine_class, **options):
+        engine = engine_class(manager, **options)
+        engine.start()
+        engines.append(engine)
+        return engine
+    yield start
+    for engine in engines:
+        engine.shutdown()
+
+
+def dispatch(engine, job_id, wait=True):
+    """Send a job through the engine's dispatch path, as a cron firing would"""
+    if isinstance(engine, AsyncCronScheduler):
+        future = asyncio.run_coroutine_threadsafe(engine._dispatch(job_id), engine._loop)
+        return future.result(10) if wait else future
+    if wait:
+        return engine._dispatch(job_id)
+    threading.Thread(target=engine._dispatch, args=(job_id,), daemon=True).start()
+
+
+def wait_until(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+@pytest.mark.parametrize('engine_class', ENGINES)
+def test_retries_link_to_their_first_attempt(engine_class, endpoint, manager, start_engine):
+    engine = start_engine(engine_class)
+    endpoint.statuses['/flaky'] = [503, 503]
+    job_id = manager.add_job('flaky', endpoint.url + '/flaky', '0 0 1 1 *',
+                             retry_policy={'max_attempts': 3, 'backoff': 0.05, 'jitter': 0})
+    dispatch(engine, job_id)
+    assert wait_until(lambda: len(manager.get_job_history(10)) == 3)
+    history = manager.get_job_history(10)[::-1]
+    first = history[0].id
+    assert [(r.attempt, r.retry_of, r.status_code) for r in history] == [
+        (1, None, 503), (2, first, 503), (3, first, 200)
+    ]
+
+
+@pytest.mark.parametrize('engine_class', ENGINES)
+def test_pending_retry_of_a_deleted_job_is_dropped(engine_class, endpoint, manager, start_engine):
+    engine = start_engine(engine_class)
+    endpoint.statuses['/gone'] = [503]
+    job_id = manager.add_job('gone', endpoint.url + '/gone', '0 0 1 1 *',
+                             retry_policy={'max_attempts': 3, 'backoff': 0.3, 'jitter': 0})
+    dispatch(engine, job_id)
+    engine.remove_job(job_id)
+    manager.delete_job(job_id)
+    time.sleep(0.6)
+    assert endpoint.hits == ['/gone']
+
+
+@pytest.mark.parametrize('engine_class', ENGINES)
+def test_removing_a_job_drops_its_queued_runs_and_frees_the_slot(engine_class, endpoint, manager, start_engine):
+    engine = start_engine(engine_class, host_limiter=HostLimiter(max_concurrency=1))
+    endpoint.delay = 0.3
+    busy = manager.add_job('busy', endpoint.url + '/busy', '0 0 1 1 *')
+    queued = manager.add_job('queued', endpoint.url + '/queued', '0 0 1 1 *')
+    dispatch(engine, busy, wait=False)
+    assert wait_until(lambda: endpoint.hits == ['/busy'])
+    dispatch(engine, queued, wait=False)
+    assert wait_until(lambda: engine.limiter.metrics()[0]['queued'] == 1)
+
+    engine.remove_job(queued)
+    assert engine.limiter.metrics()[0]['queued'] == 0
+    assert wait_until(lambda: engine.limiter.metrics()[0]['in_flight'] == 0)
+    time.sleep(0.1)
+    assert endpoint.hits == ['/busy']
+
+
+@pytest.mark.parametrize('engine_class', ENGINES)
+def test_removing_a_job_frees_the_slot_of_a_rate_delayed_run(engine_class, endpoint, manager, start_engine):
+    engine = start_engine(engine_class, host_limiter=HostLimiter(rate=0.5, burst=1))
+    first = manager.add_job('first', endpoint.url + '/first', '0 0 1 1 *')
+    delayed = manager.add_job('delayed', endpoint.url + '/delayed', '0 0 1 1 *')
+    dispatch(engine, first)
+    dispatch(engine, delayed, wait=False)
+    assert wait_until(lambda: engine.limiter.metrics()[0]['in_flight'] == 1)
+
+    engine.remove_job(delayed)
+    assert wait_until(lambda: engine.limiter.metrics()[0]['in_flight'] == 0)
+    assert endpoint.hits == ['/first']
+
+
+@pytest.mark.parametrize('engine_class', ENGINES)
+def test_open_circuit_skips_runs_and_flags_them(engine_class, endpoint, manager, start_engine):
+    breaker = CircuitBreaker(min_calls=2, open_seconds=60)
+    engine = start_engine(engine_class, circuit_breaker=breaker)
+    endpoint.statuses['/down'] = [500, 500]
+    job_id = manager.add_job('down', endpoint.url + '/down', '0 0 1 1 *')
+    dispatch(engine, job_id)
+    dispatch(engine, job_id)
+    assert breaker.state('127.0.0.1') == OPEN
+
+    assert dispatch(engine, job_id) is False
+    assert endpoint.hits == ['/down', '/down']
+    skipped = manager.get_job_history(1)[0]
+    assert skipped.short_circuited and not skipped.success
+    assert manager.get_job(job_id).last_status == 'short_circuited'
+    assert manager.get_job_stats(job_id)['total_executions'] == 2
+
+
+@pytest.mark.parametrize('engine_class', ENGINES)
+def test_probe_failing_with_an_unexpected_error_reopens_the_circuit(engine_class, manager, start_engine):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=0.1)
+    engine = start_engine(engine_class, circuit_breaker=breaker)
+    # An invalid JSON payload fails the run before any request is sent
+    job_id = manager.add_job('bad', 'http://127.0.0.1:9/bad', '0 0 1 1 *', 'POST',
+                             {'Content-Type': 'application/json'}, '{not json')
+    breaker.record('127.0.0.1', True, 0.1)
+    time.sleep(0.15)
+    dispatch(engine, job_id)
+    assert manager.get_job_history(1)[0].error_message.startswith('Unexpected error')
+    assert breaker.state('127.0.0.1') == OPEN
+
+
+@pytest.mark.parametrize('engine_class', ENGINES)
+def test_delayed_firings_claim_their_own_scheduled_time(engine_class, endpoint, manager, start_engine, monkeypatch):
+    engine = start_engine(engine_class)
+    claims = []
+    monkeypatch.setattr(manager, 'claim_run', lambda job_id, fire_time: claims.append(fire_time) or True)
+    job_id = manager.add_job('late', endpoint.url + '/late', '* * * * *')
+    engine.schedule_job(job_id)
+    scheduled = engine.scheduler.get_job(job_id)
+    scheduled.misfire_grace_time = None
+
+    # Two firings from a few minutes ago, in a local timezone, running only now
+    noon = datetime(2024, 6, 1, 12, 0, tzinfo=timezone(timedelta(hours=2)))
+    submit = functools.partial(engine.scheduler._lookup_executor('default').submit_job, scheduled,
+                               [noon, noon + timedelta(minutes=1)])
+    if isinstance(engine, AsyncCronScheduler):
+        engine._loop.call_soon_threadsafe(submit)
+    else:
+        submit()
+    assert wait_until(lambda: len(endpoint.hits) == 2)
+    assert sorted(claims) == ['2024-06-01T10:00:00+00:00', '2024-06-01T10:01:00+00:00']
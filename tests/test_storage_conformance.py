@@ -0,0 +1,28 @@
+import os
+import pytest
+import storage_kit
+
+DSN = os.environ.get('DATABASE_URL')
+
+BACKENDS = [
+    pytest.param(kind, marks=pytest.mark.skipif(kind == 'postgres' and not DSN, reason="needs DATABASE_URL"))
+    for kind in storage_kit.BACKENDS
+]
+
+
+@pytest.mark.parametrize('kind', BACKENDS)
+@pytest.mark.parametrize('check_fn', storage_kit.CHECKS, ids=lambda check_fn: check_fn.__name__)
+def test_conformance(kind, check_fn):
+    factory = storage_kit.StoreFactory(kind, DSN)
+    try:
+        check_fn(factory)
+    finally:
+        factory.cleanup()
+
+
+@pytest.mark.parametrize('kind', BACKENDS)
+@pytest.mark.parametrize('flush_interval_ms', [200, 0], ids=['buffered', 'inline'])
+def test_concurrent_writers_lose_nothing(kind, flush_interval_ms):
+    _, _, problems = storage_kit.run_stress(kind, DSN, threads=20, executions=5, jobs=5,
+                                            flush_interval_ms=flush_interval_ms)
+    assert problems == []
@@ -0,0 +1,123 @@
+import threading
+import time
+import logging
+
+
+class WriteBehindBuffer:
+    """Queue writes from many threads and commit them in batches from one flusher thread
+
+    Items are handed to ``flush_fn`` as a list, oldest first, either every
+    ``flush_interval_ms`` milliseconds or as soon as ``max_batch`` items are
+    queued, whichever comes first. Items that are queued or being flushed
+    stay visible through ``pending()`` so readers can merge them in.
+    """
+
+    def __init__(self, flush_fn, flush_interval_ms=200, max_batch=100, name='write-behind'):
+        self.flush_fn = flush_fn
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.logger = logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._queue = []
+        self._inflight = []
+        self._closed = False
+
+        self._flushes = 0
+        self._items_flushed = 0
+        self._errors = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue an item for the next flush"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write-behind buffer is closed")
+            self._queue.append(item)
+            if len(self._queue) >= self.max_batch:
+                self._cond.notify()
+
+    def pending(self):
+        """Return the items not yet committed, oldest first"""
+        with self._cond:
+            return self._inflight + self._queue
+
+    def read_settled(self, read_fn):
+        """Call read_fn(pending items) while no flush is in progress and return its result
+
+        Use this when combining pending items with what the flush target has
+        already stored: mid-flush, a batch is both stored and still pending.
+        """
+        with self._flush_lock:
+            return read_fn(self.pending())
+
+    def flush(self):
+        """Commit everything queued so far on the calling thread"""
+        with self._flush_lock:
+            with self._cond:
+                batch = self._queue
+                self._queue = []
+                self._inflight = batch
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                self.flush_fn(batch)
+            except Exception as e:
+                self._errors += 1
+                self.logger.error(f"Write-behind flush of {len(batch)} items failed: {e}")
+                # Put the batch back so it is retried on the next flush
+                with self._cond:
+                    self._queue = batch + self._queue
+                    self._inflight = []
+                return 0
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._cond:
+                self._inflight = []
+                self._flushes += 1
+                self._items_flushed += len(batch)
+                self._last_flush_ms = elapsed_ms
+                self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+                self._total_flush_ms += elapsed_ms
+            return len(batch)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._queue) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def metrics(self):
+        """Return queue depth and flush latency counters"""
+        with self._cond:
+            return {
+                'queue_depth': len(self._queue) + len(self._inflight),
+                'flushes': self._flushes,
+                'items_flushed': self._items_flushed,
+                'flush_errors': self._errors,
+                'last_flush_ms': round(self._last_flush_ms, 3),
+                'max_flush_ms': round(self._max_flush_ms, 3),
+                'avg_flush_ms': round(self._total_flush_ms / self._flushes, 3) if self._flushes else 0.0
+            }
+
+    def close(self):
+        """Flush whatever is queued and stop the flusher thread"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=10)
+        self.flush()